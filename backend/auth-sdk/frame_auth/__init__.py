@@ -0,0 +1,19 @@
+from .exceptions import (
+    AuthError,
+    InvalidTokenError,
+    TokenExpiredError,
+    InsufficientRolesError,
+    KeySetUnavailableError,
+)
+from .jwks import JWKSClient
+from .verifier import TokenVerifier
+
+__all__ = [
+    'AuthError',
+    'InvalidTokenError',
+    'TokenExpiredError',
+    'InsufficientRolesError',
+    'KeySetUnavailableError',
+    'JWKSClient',
+    'TokenVerifier',
+]
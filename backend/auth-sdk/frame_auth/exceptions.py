@@ -0,0 +1,23 @@
+class AuthError(Exception):
+    """Базовая ошибка проверки токена"""
+    code = 'invalid_token'
+
+
+class InvalidTokenError(AuthError):
+    """Токен поврежден, подписан неизвестным ключом или не прошел проверку"""
+    code = 'invalid_token'
+
+
+class TokenExpiredError(AuthError):
+    """Срок действия токена истек"""
+    code = 'token_expired'
+
+
+class InsufficientRolesError(AuthError):
+    """У владельца токена нет требуемых ролей"""
+    code = 'insufficient_roles'
+
+
+class KeySetUnavailableError(AuthError):
+    """Не удалось получить набор публичных ключей"""
+    code = 'jwks_unavailable'
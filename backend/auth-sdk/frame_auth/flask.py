@@ -0,0 +1,27 @@
+from functools import wraps
+from typing import Iterable, Optional
+
+from flask import g, jsonify, request
+
+from .exceptions import AuthError, InsufficientRolesError, KeySetUnavailableError
+from .verifier import TokenVerifier
+
+
+def token_required(verifier: TokenVerifier, roles: Optional[Iterable[str]] = None):
+    """
+    Декоратор Flask view: проверяет токен локально и кладет claims в g.token_claims
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                g.token_claims = verifier.verify_header(request.headers.get('Authorization'), roles=roles)
+            except InsufficientRolesError as e:
+                return jsonify({"error": str(e), "code": e.code}), 403
+            except KeySetUnavailableError as e:
+                return jsonify({"error": "Authentication is temporarily unavailable", "code": e.code}), 503
+            except AuthError as e:
+                return jsonify({"error": str(e), "code": e.code}), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
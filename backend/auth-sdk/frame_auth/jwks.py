@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import jwt
+import requests
+
+from .exceptions import InvalidTokenError, KeySetUnavailableError
+
+
+class JWKSClient:
+    """
+    Кэширующий клиент набора публичных ключей auth-service.
+    Ключи хранятся в памяти процесса и обновляются раз в cache_ttl секунд;
+    при встрече неизвестного kid (ротация) набор перечитывается досрочно,
+    но не чаще раза в min_refresh_interval секунд.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        cache_ttl: float = 300,
+        min_refresh_interval: float = 10,
+        timeout: float = 2,
+        fetcher: Optional[Callable[[], dict]] = None
+    ):
+        self.jwks_url = jwks_url
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._fetcher = fetcher or self._fetch
+        self._session = requests.Session()
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> dict:
+        response = self._session.get(self.jwks_url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self) -> None:
+        """Загрузка набора ключей"""
+        try:
+            jwks = self._fetcher()
+        except Exception as e:
+            raise KeySetUnavailableError(f"Failed to fetch JWKS: {e}") from e
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            if jwk.get('use', 'sig') != 'sig' or 'kid' not in jwk:
+                continue
+            keys[jwk['kid']] = jwt.PyJWK(jwk)
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def get_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        """Публичный ключ по kid"""
+        now = time.monotonic()
+        if self._fetched_at is None or now - self._fetched_at >= self.cache_ttl:
+            with self._lock:
+                if self._fetched_at is None or now - self._fetched_at >= self.cache_ttl:
+                    self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None and now - self._fetched_at >= self.min_refresh_interval:
+            with self._lock:
+                if kid not in self._keys and time.monotonic() - self._fetched_at >= self.min_refresh_interval:
+                    self.refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
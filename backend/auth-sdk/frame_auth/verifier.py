@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import jwt
+
+from .exceptions import InsufficientRolesError, InvalidTokenError, TokenExpiredError
+from .jwks import JWKSClient
+
+# Алгоритмы, которые принимает верификатор (симметричные исключены намеренно)
+ASYMMETRIC_ALGORITHMS = ('EdDSA', 'RS256', 'RS512', 'PS256', 'ES256')
+
+
+class TokenVerifier:
+    """
+    Локальная проверка access токенов auth-service без сетевого запроса.
+    Подпись проверяется по ключам из JWKS, а расшифрованные claims
+    запоминаются для каждого токена до истечения его срока действия.
+    """
+
+    def __init__(
+        self,
+        jwks_url: Optional[str] = None,
+        jwks_client: Optional[JWKSClient] = None,
+        issuer: Optional[str] = 'frame-auth-service',
+        audience: Optional[str] = None,
+        leeway: float = 0,
+        token_type: Optional[str] = 'access',
+        cache_size: int = 10000
+    ):
+        if jwks_client is None and jwks_url is None:
+            raise ValueError("jwks_url or jwks_client is required")
+        self.jwks_client = jwks_client or JWKSClient(jwks_url)
+        self.issuer = issuer
+        self.audience = audience
+        self.leeway = leeway
+        self.token_type = token_type
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is None:
+                return None
+            if claims['exp'] + self.leeway <= time.time():
+                del self._cache[token]
+                raise TokenExpiredError("Token has expired")
+            self._cache.move_to_end(token)
+            return claims
+
+    def _remember(self, token: str, claims: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[token] = claims
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _decode(self, token: str) -> Dict[str, Any]:
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e)) from e
+        if header.get('alg') not in ASYMMETRIC_ALGORITHMS:
+            raise InvalidTokenError(f"Unsupported algorithm: {header.get('alg')}")
+
+        key = self.jwks_client.get_key(header.get('kid'))
+        try:
+            claims = jwt.decode(
+                token,
+                key.key,
+                algorithms=[key.algorithm_name],
+                issuer=self.issuer,
+                audience=self.audience,
+                leeway=self.leeway,
+                options={'require': ['exp', 'sub'], 'verify_aud': self.audience is not None}
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenExpiredError("Token has expired") from e
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e)) from e
+
+        if self.token_type and claims.get('type') != self.token_type:
+            raise InvalidTokenError(f"Expected {self.token_type} token")
+        return claims
+
+    def verify(self, token: str, roles: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Проверка токена
+
+        Args:
+            token: JWT без префикса "Bearer"
+            roles: Роли, которые должны быть у владельца токена
+
+        Returns:
+            Claims токена
+
+        Raises:
+            AuthError: Токен невалиден, истек или у пользователя нет нужных ролей
+        """
+        claims = self._cached(token)
+        if claims is None:
+            claims = self._decode(token)
+            self._remember(token, claims)
+
+        if roles:
+            missing = set(roles) - set(claims.get('roles', []))
+            if missing:
+                raise InsufficientRolesError(f"Missing roles: {', '.join(sorted(missing))}")
+        return claims
+
+    def verify_header(self, authorization: Optional[str], roles: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Проверка значения заголовка Authorization вида "Bearer <token>" """
+        if not authorization:
+            raise InvalidTokenError("Missing Authorization header")
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise InvalidTokenError("Invalid Authorization header format")
+        return self.verify(token.strip(), roles=roles)
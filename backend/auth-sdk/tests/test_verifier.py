@@ -0,0 +1,87 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from jwt.algorithms import OKPAlgorithm
+
+from frame_auth import (
+    InsufficientRolesError,
+    InvalidTokenError,
+    JWKSClient,
+    TokenExpiredError,
+    TokenVerifier,
+)
+
+
+@pytest.fixture
+def signing_key():
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+@pytest.fixture
+def jwks_calls():
+    return []
+
+
+@pytest.fixture
+def verifier(signing_key, jwks_calls):
+    def fetch():
+        jwks_calls.append(1)
+        jwk = OKPAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+        return {'keys': [dict(jwk, kid='key-1', alg='EdDSA', use='sig')]}
+
+    return TokenVerifier(jwks_client=JWKSClient('http://auth/jwks', fetcher=fetch, min_refresh_interval=0))
+
+
+def make_token(signing_key, kid='key-1', **overrides):
+    claims = {
+        'sub': '42',
+        'type': 'access',
+        'roles': ['user'],
+        'iss': 'frame-auth-service',
+        'exp': int(time.time()) + 60,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, signing_key, algorithm='EdDSA', headers={'kid': kid})
+
+
+def test_verify_valid_token(verifier, signing_key):
+    """Тест проверки валидного токена"""
+    claims = verifier.verify(make_token(signing_key), roles=['user'])
+    assert claims['sub'] == '42'
+
+
+def test_claims_are_memoized(verifier, signing_key, jwks_calls, monkeypatch):
+    """Тест кэширования claims до истечения токена"""
+    token = make_token(signing_key)
+    verifier.verify(token)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("token decoded twice")
+    monkeypatch.setattr(jwt, 'decode', fail)
+
+    assert verifier.verify(token)['sub'] == '42'
+    assert len(jwks_calls) == 1
+
+
+def test_expired_token(verifier, signing_key):
+    """Тест отклонения истекшего токена"""
+    with pytest.raises(TokenExpiredError):
+        verifier.verify(make_token(signing_key, exp=int(time.time()) - 1))
+
+
+def test_missing_role(verifier, signing_key):
+    """Тест проверки ролей"""
+    with pytest.raises(InsufficientRolesError):
+        verifier.verify(make_token(signing_key), roles=['admin'])
+
+
+def test_unknown_key_and_symmetric_tokens_rejected(verifier, signing_key):
+    """Тест отклонения токенов с неизвестным ключом или HS256 подписью"""
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(make_token(ed25519.Ed25519PrivateKey.generate(), kid='other'))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(jwt.encode({'sub': '42'}, 'shared-secret-that-is-long-enough!', algorithm='HS256'))
+    with pytest.raises(InvalidTokenError):
+        verifier.verify_header('Token abc')
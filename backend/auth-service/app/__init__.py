@@ -1,15 +1,39 @@
-from flask import Flask, request
+from flask import Flask, g, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-import redis
+from jwt import DecodeError
 from .services.log_service import LogService
+from .services.redis_client import RedisClient
+from .services.password_hasher import PasswordHasher, HashingPoolBusy
+from .services.key_manager import KeyManager, is_asymmetric
+from .services.token_revocation import TokenRevocation
+from .services.profile_cache import ProfileCache
+from .services.cors_policy import CorsPolicy
+from .services.rate_limiter import RateLimiter, RateLimitExceeded
+from .services.last_login import LastLoginBuffer
+from .services.oauth_providers import OAuthProviders
+from .services.request_metrics import RequestMetrics
+from .services.metrics import multiprocess_metrics
+from .services.profiler import SamplingProfiler
+from .services.tracing import Tracer
 from flask_cors import CORS
 
 # Инициализация глобальных объектов
 db = SQLAlchemy()
 jwt = JWTManager()
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = RedisClient()
 logger = LogService()
+password_hasher = PasswordHasher()
+key_manager = KeyManager()
+token_revocation = TokenRevocation()
+profile_cache = ProfileCache()
+cors_policy = CorsPolicy()
+rate_limiter = RateLimiter()
+last_login_buffer = LastLoginBuffer()
+oauth_providers = OAuthProviders()
+request_metrics = RequestMetrics()
+profiler = SamplingProfiler()
+tracer = Tracer()
 
 def create_app(config_object='app.config.Config'):
     """Создание и конфигурация Flask приложения"""
@@ -21,50 +45,74 @@ def create_app(config_object='app.config.Config'):
     # Инициализация расширений
     db.init_app(app)
     jwt.init_app(app)
+    # Первым из before_request: время запроса включает проверки CORS и лимитов
+    request_metrics.init_app(app)
+    multiprocess_metrics.init_app(app)
+    # Участок запроса открывается до остальных обработчиков, чтобы их записи лога попали в трассу
+    tracer.init_app(app, logger)
+    redis_client.init_app(app)
+    logger.init_app(app, redis_client)
+    password_hasher.init_app(app)
+    token_revocation.init_app(app, redis_client)
+    profile_cache.init_app(app, redis_client)
+    rate_limiter.init_app(app, redis_client)
+    last_login_buffer.init_app(app)
+    oauth_providers.init_app(app, tracer)
+    profiler.init_app(app, redis_client)
 
-    # Настройка CORS с помощью встроенного механизма Flask
-    @app.after_request
-    def after_request(response):
-        origin = request.headers.get('Origin')
-        
-        # Определяем, является ли текущий эндпоинт публичным
-        is_public_endpoint = any(
-            request.path.startswith(endpoint) 
-            for endpoint in app.config['CORS_PUBLIC_ENDPOINTS']
-        )
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return token_revocation.is_revoked(jwt_payload)
 
-        # Для публичных эндпоинтов используем менее строгие правила
-        if is_public_endpoint:
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        
-        # Для защищенных эндпоинтов используем строгие правила
-        else:
-            # Проверяем, разрешен ли origin
-            if origin in app.config['CORS_ALLOWED_ORIGINS'] or app.config['CORS_ALLOWED_ORIGINS'] == ['*']:
-                response.headers['Access-Control-Allow-Origin'] = origin
-                response.headers['Access-Control-Allow-Credentials'] = 'true'
-                response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-                response.headers['Access-Control-Allow-Headers'] = (
-                    'Content-Type, Authorization, X-Requested-With'
-                )
-                # Добавляем дополнительные заголовки безопасности
-                if not app.config['DEBUG']:
-                    response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-                    response.headers['X-Content-Type-Options'] = 'nosniff'
-                    response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-                    response.headers['X-XSS-Protection'] = '1; mode=block'
-            else:
-                # Если origin не разрешен, удаляем CORS заголовки и возвращаем 403
-                response.headers.pop('Access-Control-Allow-Origin', None)
-                response.status_code = 403
+    # Асимметричная подпись токенов с ротацией ключей по kid
+    if is_asymmetric(app.config['JWT_ALGORITHM']):
+        key_manager.init_app(app)
 
-        # Для OPTIONS запросов возвращаем пустой ответ
-        if request.method == 'OPTIONS':
-            return response
+        # Заголовки запрашиваются до ключа подписи: пара (kid, ключ), выбранная для
+        # заголовка, сохраняется в g, чтобы перечитывание ключей между вызовами
+        # не дало токен с kid одного ключа и подписью другого
+        @jwt.additional_headers_loader
+        def additional_headers(identity):
+            g.jwt_signing_key = key_manager.signing_key()
+            return {'kid': g.jwt_signing_key[0]}
 
-        return response
+        @jwt.encode_key_loader
+        def encode_key(identity):
+            signing_key = g.pop('jwt_signing_key', None) or key_manager.signing_key()
+            return signing_key[1]
+
+        @jwt.decode_key_loader
+        def decode_key(jwt_header, jwt_data):
+            public_key = key_manager.public_key(jwt_header.get('kid'))
+            if public_key is None:
+                raise DecodeError("Unknown signing key")
+            return public_key
+
+    @app.errorhandler(HashingPoolBusy)
+    def hashing_pool_busy(error):
+        # Быстрый отказ вместо ожидания в очереди bcrypt
+        logger.warning("Password hashing pool is busy",
+                       action="hashing_pool_busy",
+                       metadata={"path": request.path})
+        response = jsonify({"error": "Service is temporarily overloaded, please retry later"})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+
+    @app.errorhandler(RateLimitExceeded)
+    def rate_limit_exceeded(error):
+        # INFO, а не WARNING: при подборе паролей таких записей много, их можно сэмплировать
+        logger.info("Rate limit exceeded",
+                    action="rate_limited",
+                    metadata={"endpoint": error.endpoint, "scope": error.scope})
+        response = jsonify({"error": "Too many requests, please retry later"})
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 429
+
+    # CORS и заголовки безопасности: политика компилируется один раз, preflight отвечается до маршрутизации
+    cors_policy.init_app(app)
+
+    from .models.session import SessionManager
+    SessionManager.configure(app)
 
     # Регистрация блюпринтов
     from .controllers.auth import auth_bp
@@ -0,0 +1,228 @@
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import anyio
+from flask_jwt_extended import decode_token
+from sqlalchemy.orm import selectinload
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from app import create_app, cors_policy, logger, profile_cache, profiler, request_metrics, token_revocation, tracer
+from app.services.metrics import multiprocess_metrics
+from app.models.session import SessionManager
+from app.models.user import User
+from app.services.auth_service import AuthService
+from app.services.redis_client import create_async_redis_client
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+
+def _create_async_engine(config):
+    """Асинхронный движок БД или None, если URL не задан или драйвер не установлен"""
+    url = config.get('ASYNC_DATABASE_URL')
+    if not url:
+        return None
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        return create_async_engine(url, pool_size=config.get('ASYNC_DATABASE_POOL_SIZE', 20), pool_pre_ping=True)
+    except ImportError:
+        return None
+
+
+class _Delegate:
+    """Передача запроса Flask приложению с повтором уже прочитанного тела"""
+
+    def __init__(self, wsgi_app, body: Optional[bytes]):
+        self.wsgi_app = wsgi_app
+        self.body = body
+
+    async def __call__(self, scope, receive, send):
+        if self.body is not None:
+            original_receive, body, self.body = receive, self.body, None
+
+            async def receive():
+                nonlocal body
+                if body is None:
+                    return await original_receive()
+                message, body = {'type': 'http.request', 'body': body, 'more_body': False}, None
+                return message
+        await self.wsgi_app(scope, receive, send)
+
+
+class AsyncEndpoints:
+    """
+    ASGI режим сервиса.
+
+    /auth/validate, /auth/validate/batch и /auth/me обслуживаются в цикле событий:
+    отзыв токенов и кеш профилей читаются асинхронным клиентом Redis, профиль -
+    асинхронным драйвером БД. Остальные запросы, а также ошибки этих эндпоинтов
+    (нет токена, токен невалиден или отозван, пользователь не найден) передаются
+    Flask приложению, поэтому контракты ответов совпадают с WSGI режимом.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi_app = WSGIMiddleware(flask_app)
+        self.redis = None
+        self.engine = None
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        # Асинхронные клиенты привязаны к циклу событий воркера
+        self.redis = create_async_redis_client(self.flask_app.config)
+        # Снимки метрик воркера пишутся, даже если он обслуживает только маршруты без Flask
+        multiprocess_metrics.start()
+        self.engine = _create_async_engine(self.flask_app.config)
+        try:
+            yield
+        finally:
+            await self.redis.aclose()
+            if self.engine is not None:
+                await self.engine.dispose()
+
+    def routes(self):
+        return [
+            Route('/auth/validate', self._timed(self.validate), methods=['POST']),
+            Route('/auth/validate/batch', self._timed(self.validate_batch), methods=['POST']),
+            Route('/auth/me', self._timed(self.me), methods=['GET']),
+            Mount('/', app=self.wsgi_app),
+        ]
+
+    def _timed(self, endpoint):
+        """Учет и трассировка ответов, сформированных без Flask; переданные во Flask запросы учитывает он сам"""
+        async def handler(request: Request):
+            started_at = time.perf_counter()
+            span = tracer.start(f'{request.method} {request.url.path}', request.headers.get('traceparent'),
+                                request.headers.get('tracestate')) if tracer.enabled else None
+            # Стек цикла событий снимается профилировщиком, пока выполняется эндпоинт
+            profiler_key = await profiler.track_async(f'{request.method} {request.url.path}',
+                                                      request.headers.get(profiler.header), self.redis)
+            response = None
+            try:
+                response = await endpoint(request)
+            finally:
+                profiler.untrack(profiler_key)
+                if span is not None:
+                    # Переданный во Flask запрос получит участок там же
+                    tracer.finish(span, error=response is None, record=not isinstance(response, _Delegate))
+            if not isinstance(response, _Delegate):
+                if span is not None:
+                    response.headers['traceresponse'] = span.traceparent()
+                request_metrics.observe('auth', request.url.path, request.method, response.status_code,
+                                        time.perf_counter() - started_at)
+            return response
+        return handler
+
+    def _delegate(self, body: Optional[bytes] = None) -> _Delegate:
+        return _Delegate(self.wsgi_app, body)
+
+    async def _access_claims(self, request: Request) -> Optional[Dict[str, Any]]:
+        """Claims валидного неотозванного access токена из заголовка; None - ответ сформирует Flask"""
+        config = self.flask_app.config
+        header = request.headers.get(config['JWT_HEADER_NAME'])
+        if not header:
+            return None
+        parts = header.split()
+        if len(parts) != 2 or parts[0] != config['JWT_HEADER_TYPE']:
+            return None
+        try:
+            with self.flask_app.app_context():
+                claims = decode_token(parts[1])
+        except Exception:
+            return None
+        if claims.get('type') != 'access':
+            return None
+        if (await token_revocation.revoked_many_async([claims], self.redis))[0]:
+            return None
+        return claims
+
+    async def validate(self, request: Request):
+        """Валидация токена для других сервисов"""
+        headers = cors_policy.response_headers(request.url.path, request.headers.get('Origin'))
+        claims = await self._access_claims(request) if headers is not None else None
+        if claims is None:
+            return self._delegate()
+
+        user_id = claims['sub']
+        await SessionManager.touch_async(user_id, claims.get('did'))
+        logger.debug("Token validated",
+                     user_id=user_id,
+                     action="validate_token",
+                     metadata=lambda: {"roles": claims.get('roles', [])})
+        return JSONResponse({
+            "valid": True,
+            "user_id": user_id,
+            "roles": claims.get('roles', [])
+        }, headers=dict(headers))
+
+    async def validate_batch(self, request: Request):
+        """Пакетная валидация токенов для шлюзов и фоновых задач"""
+        body = await request.body()
+        headers = cors_policy.response_headers(request.url.path, request.headers.get('Origin'))
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        tokens = data.get('tokens') if isinstance(data, dict) else None
+        if (headers is None or not isinstance(tokens, list) or not tokens
+                or len(tokens) > self.flask_app.config['VALIDATE_BATCH_MAX_TOKENS']):
+            return self._delegate(body)
+
+        with self.flask_app.app_context():
+            results, decoded = AuthService.decode_access_tokens(tokens)
+        revoked = await token_revocation.revoked_many_async(
+            [claims for _index, claims in decoded], self.redis) if decoded else []
+        results = AuthService.apply_revocations(results, decoded, revoked)
+
+        logger.debug("Tokens batch validated",
+                     action="validate_token_batch",
+                     metadata=lambda: {"count": len(results), "valid": sum(1 for r in results if r['valid'])})
+        return JSONResponse({"results": results}, headers=dict(headers))
+
+    async def me(self, request: Request):
+        """Получение информации о текущем пользователе"""
+        headers = cors_policy.response_headers(request.url.path, request.headers.get('Origin'))
+        claims = await self._access_claims(request) if headers is not None else None
+        if claims is None:
+            return self._delegate()
+
+        user_id = claims['sub']
+        await SessionManager.touch_async(user_id, claims.get('did'))
+        profile = await profile_cache.get_async(user_id, self._load_profile, self.redis)
+        if not profile:
+            return self._delegate()
+
+        logger.debug("User info requested",
+                     user_id=user_id,
+                     action="get_user_info")
+        return JSONResponse(profile, headers=dict(headers))
+
+    async def _load_profile(self, user_id) -> Optional[Dict[str, Any]]:
+        """Профиль из БД: асинхронным драйвером или, без него, в пуле потоков"""
+        if self.engine is None:
+            return await anyio.to_thread.run_sync(self._load_profile_sync, user_id)
+
+        from sqlalchemy.ext.asyncio import AsyncSession
+        async with AsyncSession(self.engine) as session:
+            user = await session.get(User, int(user_id), options=[selectinload(User.roles)])
+            return user.to_dict() if user else None
+
+    def _load_profile_sync(self, user_id) -> Optional[Dict[str, Any]]:
+        with self.flask_app.app_context():
+            user = User.get_with_roles(int(user_id))
+            return user.to_dict() if user else None
+
+
+def create_asgi_app(config_object='app.config.Config'):
+    """Создание ASGI приложения поверх Flask приложения"""
+    endpoints = AsyncEndpoints(create_app(config_object))
+    app = Starlette(routes=endpoints.routes(), lifespan=endpoints.lifespan)
+    app.state.flask_app = endpoints.flask_app
+    return app
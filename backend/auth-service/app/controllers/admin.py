@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify
+import json
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from app import db, logger
+from sqlalchemy import select, exists, or_, func
+from sqlalchemy.orm import selectinload
+from app import db, logger, profile_cache, profiler
 from app.models.role import Role, Permission
-from app.models.user import User
+from app.models.user import User, user_roles
+from app.services.role_service import RoleService
+from app.services.log_service import LogLevel
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -24,7 +30,7 @@ def get_roles():
     if error:
         return error
     
-    roles = Role.query.all()
+    roles = Role.list_with_permissions()
     logger.debug("Roles list requested",
                 user_id=get_jwt_identity(),
                 action="get_roles")
@@ -46,7 +52,7 @@ def create_role():
                       metadata={"received_fields": list(data.keys()) if data else None})
         return jsonify({"error": "Role name is required"}), 400
 
-    if Role.query.filter_by(name=data['name']).first():
+    if Role.name_exists(data['name']):
         logger.info("Role creation attempt with existing name",
                    user_id=get_jwt_identity(),
                    action="create_role",
@@ -97,7 +103,7 @@ def create_permission():
                       metadata={"received_fields": list(data.keys()) if data else None})
         return jsonify({"error": "Permission name is required"}), 400
 
-    if Permission.query.filter_by(name=data['name']).first():
+    if Permission.name_exists(data['name']):
         logger.info("Permission creation attempt with existing name",
                    user_id=get_jwt_identity(),
                    action="create_permission",
@@ -146,6 +152,9 @@ def update_role_permissions(role_id):
 
     role.permissions = permissions
     db.session.commit()
+    # Профили всех пользователей роли сбрасываются одним запросом id, без загрузки моделей
+    profile_cache.invalidate(*(user_id for user_id, in db.session.query(user_roles.c.user_id)
+                               .filter(user_roles.c.role_id == role_id)))
 
     logger.info("Role permissions updated",
                 user_id=get_jwt_identity(),
@@ -182,6 +191,7 @@ def update_user_roles(user_id):
 
     user.roles = roles
     db.session.commit()
+    profile_cache.invalidate(user.id)
 
     logger.info("User roles updated",
                 user_id=get_jwt_identity(),
@@ -193,3 +203,323 @@ def update_user_roles(user_id):
         "username": user.username,
         "roles": [role.name for role in user.roles]
     }), 200
+
+def _escape_like(value):
+    """Экранирование спецсимволов LIKE"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+# Фильтры пользователей для GET /users, выгрузки и массового изменения ролей
+_USER_FILTERS = ('role', 'provider', 'created_after', 'created_before', 'q')
+
+def _users_query(args):
+    """
+    Запрос пользователей по фильтрам из query string или JSON тела
+
+    Args:
+        args: role, provider, created_after, created_before, q (префикс username или email)
+
+    Returns:
+        (select, None) или (None, сообщение об ошибке)
+    """
+    # В JSON фильтре значения могут быть любого типа
+    if not all(isinstance(args.get(name), (str, type(None))) for name in _USER_FILTERS):
+        return None, f"Filter values must be strings: {', '.join(_USER_FILTERS)}"
+
+    query = select(User).order_by(User.id)
+
+    role = args.get('role')
+    if role:
+        query = query.where(exists().where(
+            user_roles.c.user_id == User.id,
+            user_roles.c.role_id == Role.id,
+            Role.name == role
+        ))
+
+    provider = args.get('provider')
+    if provider:
+        query = query.where(User.provider == provider)
+
+    try:
+        created_after = _parse_datetime(args.get('created_after'))
+        created_before = _parse_datetime(args.get('created_before'))
+    except ValueError:
+        return None, "created_after and created_before must be ISO 8601 dates"
+    if created_after:
+        query = query.where(User.created_at >= created_after)
+    if created_before:
+        query = query.where(User.created_at < created_before)
+
+    prefix = args.get('q', '').strip().lower()
+    if prefix:
+        # Шаблон собирается заранее, чтобы планировщик видел константный префикс и использовал индекс
+        pattern = _escape_like(prefix) + '%'
+        query = query.where(or_(
+            func.lower(User.username).like(pattern, escape='\\'),
+            func.lower(User.email).like(pattern, escape='\\')
+        ))
+
+    return query, None
+
+@admin_bp.route('/users', methods=['GET'])
+@jwt_required()
+def list_users():
+    """Список пользователей с пагинацией по курсору (id последнего пользователя страницы)"""
+    error = require_admin()
+    if error:
+        return error
+
+    query, message = _users_query(request.args)
+    try:
+        limit = int(request.args.get('limit', current_app.config['ADMIN_USERS_PAGE_SIZE']))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        message = message or "limit and cursor must be integers"
+    if message:
+        return jsonify({"error": message}), 400
+    limit = max(1, min(limit, current_app.config['ADMIN_USERS_PAGE_MAX']))
+
+    # Keyset: WHERE id > cursor вместо OFFSET, стоимость страницы не зависит от ее номера
+    if cursor is not None:
+        query = query.where(User.id > cursor)
+    users = db.session.scalars(query.options(selectinload(User.roles)).limit(limit + 1)).all()
+    has_more = len(users) > limit
+    users = users[:limit]
+
+    logger.debug("Users list requested",
+                user_id=get_jwt_identity(),
+                action="list_users",
+                metadata={"filters": request.args.to_dict()})
+
+    return jsonify({
+        "users": [user.to_dict() for user in users],
+        "next_cursor": str(users[-1].id) if has_more else None
+    }), 200
+
+@admin_bp.route('/users/export', methods=['GET'])
+@jwt_required()
+def export_users():
+    """Потоковая выгрузка пользователей в NDJSON с теми же фильтрами, что и у списка"""
+    error = require_admin()
+    if error:
+        return error
+
+    query, message = _users_query(request.args)
+    if message:
+        return jsonify({"error": message}), 400
+    batch_size = current_app.config['ADMIN_USERS_EXPORT_BATCH']
+
+    logger.info("Users export started",
+                user_id=get_jwt_identity(),
+                action="export_users",
+                metadata={"filters": request.args.to_dict()})
+
+    def generate():
+        # yield_per читает строки серверным курсором пакетами, роли подгружаются на каждый пакет
+        result = db.session.scalars(
+            query.options(selectinload(User.roles)).execution_options(yield_per=batch_size))
+        try:
+            for user in result:
+                yield json.dumps(user.to_dict(), ensure_ascii=False) + '\n'
+                # Выгруженные объекты не накапливаются в сессии
+                db.session.expunge(user)
+        finally:
+            result.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename=users.ndjson'
+    })
+
+def _names_list(data, key):
+    """Список имен из тела запроса; None, если значение некорректно"""
+    value = data.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        return None
+    return value
+
+@admin_bp.route('/users/roles/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_user_roles():
+    """
+    Массовое добавление и удаление ролей.
+    Пользователи задаются списком user_ids или фильтром как у GET /users.
+    """
+    error = require_admin()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    add, remove = _names_list(data, 'add'), _names_list(data, 'remove')
+    if add is None or remove is None or not (add or remove):
+        return jsonify({"error": "Non-empty add or remove roles list is required"}), 400
+
+    user_ids, filters = data.get('user_ids'), data.get('filter')
+    if user_ids is not None:
+        if (not isinstance(user_ids, list) or not all(isinstance(user_id, int) for user_id in user_ids)
+                or len(user_ids) > current_app.config['ADMIN_BULK_MAX_USER_IDS']):
+            return jsonify({"error": "user_ids must be a list of at most "
+                                     f"{current_app.config['ADMIN_BULK_MAX_USER_IDS']} integers"}), 400
+        target_users = select(User.id).where(User.id.in_(user_ids))
+    elif isinstance(filters, dict) and filters:
+        # Опечатка в имени фильтра не должна превращать запрос в изменение всех пользователей
+        unknown = sorted(set(filters) - set(_USER_FILTERS))
+        if unknown:
+            return jsonify({"error": f"Unknown filters: {', '.join(unknown)}"}), 400
+        query, message = _users_query(filters)
+        if message:
+            return jsonify({"error": message}), 400
+        target_users = query.with_only_columns(User.id).order_by(None)
+    else:
+        return jsonify({"error": "user_ids or non-empty filter is required"}), 400
+
+    add_ids, unknown_add = RoleService.resolve_ids(Role, add)
+    remove_ids, unknown_remove = RoleService.resolve_ids(Role, remove)
+    if unknown_add or unknown_remove:
+        logger.warning("Bulk roles update with non-existent roles",
+                      user_id=get_jwt_identity(),
+                      action="bulk_update_user_roles",
+                      metadata={"invalid_roles": sorted(unknown_add | unknown_remove)})
+        return jsonify({"error": "Some roles do not exist"}), 400
+
+    summary = RoleService.bulk_update_user_roles(target_users, add_ids, remove_ids)
+
+    logger.info("User roles bulk updated",
+                user_id=get_jwt_identity(),
+                action="bulk_update_user_roles",
+                metadata={"add": add, "remove": remove, **summary})
+
+    return jsonify(summary), 200
+
+@admin_bp.route('/roles/permissions/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_role_permissions():
+    """Массовое добавление и удаление прав у набора ролей"""
+    error = require_admin()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    roles, add, remove = _names_list(data, 'roles'), _names_list(data, 'add'), _names_list(data, 'remove')
+    if not roles or add is None or remove is None or not (add or remove):
+        return jsonify({"error": "Roles list and non-empty add or remove permissions list are required"}), 400
+
+    role_ids, unknown_roles = RoleService.resolve_ids(Role, roles)
+    add_ids, unknown_add = RoleService.resolve_ids(Permission, add)
+    remove_ids, unknown_remove = RoleService.resolve_ids(Permission, remove)
+    if unknown_roles or unknown_add or unknown_remove:
+        logger.warning("Bulk permissions update with non-existent roles or permissions",
+                      user_id=get_jwt_identity(),
+                      action="bulk_update_role_permissions",
+                      metadata={"invalid_roles": sorted(unknown_roles),
+                                "invalid_permissions": sorted(unknown_add | unknown_remove)})
+        return jsonify({"error": "Some roles or permissions do not exist"}), 400
+
+    summary = RoleService.bulk_update_role_permissions(role_ids, add_ids, remove_ids)
+
+    logger.info("Role permissions bulk updated",
+                user_id=get_jwt_identity(),
+                action="bulk_update_role_permissions",
+                metadata={"roles": roles, "add": add, "remove": remove, **summary})
+
+    return jsonify(summary), 200
+
+@admin_bp.route('/logging', methods=['GET'])
+@jwt_required()
+def get_logging_settings():
+    """Текущие уровень логирования и доли сэмплирования"""
+    error = require_admin()
+    if error:
+        return error
+    return jsonify(logger.settings()), 200
+
+@admin_bp.route('/logging', methods=['PUT'])
+@jwt_required()
+def update_logging_settings():
+    """Изменение уровня логирования и сэмплирования по action без перезапуска"""
+    error = require_admin()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    level, sampling = data.get('level'), data.get('sampling') or {}
+    if level is not None and str(level).upper() not in LogLevel.__members__:
+        return jsonify({"error": f"Level must be one of {', '.join(LogLevel.__members__)}"}), 400
+    if not isinstance(sampling, dict) or not all(
+            rate is None or (isinstance(rate, (int, float)) and 0 <= rate <= 1) for rate in sampling.values()):
+        return jsonify({"error": "Sampling rates must be numbers between 0 and 1 or null"}), 400
+
+    settings = logger.update_settings(level, sampling)
+
+    logger.info("Logging settings updated",
+                user_id=get_jwt_identity(),
+                action="update_logging_settings",
+                metadata=settings)
+
+    return jsonify(settings), 200
+
+@admin_bp.route('/profiler', methods=['GET'])
+@jwt_required()
+def get_profiler():
+    """Активная сессия профилирования"""
+    error = require_admin()
+    if error:
+        return error
+    session = profiler.current_session()
+    return jsonify({"active": session is not None, "session": session}), 200
+
+@admin_bp.route('/profiler', methods=['POST'])
+@jwt_required()
+def start_profiler():
+    """Включение профилирования во всех воркерах на время или для запросов с заголовком"""
+    error = require_admin()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    duration, interval_ms = data.get('duration', 30), data.get('interval_ms')
+    if not isinstance(duration, (int, float)) or duration <= 0:
+        return jsonify({"error": "duration must be a positive number of seconds"}), 400
+    if interval_ms is not None and (not isinstance(interval_ms, (int, float)) or interval_ms < 1):
+        return jsonify({"error": "interval_ms must be a number not less than 1"}), 400
+
+    session = profiler.start(duration, header_only=bool(data.get('header_only')),
+                             interval=interval_ms / 1000 if interval_ms else None)
+
+    logger.info("Profiler started",
+                user_id=get_jwt_identity(),
+                action="start_profiler",
+                metadata={"session": session['id'], "until": session['until'],
+                          "header_only": session['token'] is not None})
+
+    response = {"active": True, "session": session}
+    if session['token']:
+        response["header"] = profiler.header
+    return jsonify(response), 200
+
+@admin_bp.route('/profiler', methods=['DELETE'])
+@jwt_required()
+def stop_profiler():
+    """Досрочное выключение профилирования"""
+    error = require_admin()
+    if error:
+        return error
+    profiler.stop()
+    logger.info("Profiler stopped",
+                user_id=get_jwt_identity(),
+                action="stop_profiler")
+    return jsonify({"active": False, "session": None}), 200
+
+@admin_bp.route('/profiler/profile', methods=['GET'])
+@jwt_required()
+def get_profile():
+    """Профиль сессии (параметр session, по умолчанию последняя) в формате collapsed stacks"""
+    error = require_admin()
+    if error:
+        return error
+    profile = profiler.profile(request.args.get('session'))
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(profile, mimetype='text/plain'), 200
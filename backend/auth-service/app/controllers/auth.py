@@ -1,13 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
-from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError
+from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError, RevokedTokenError
+from sqlalchemy.exc import IntegrityError
 from app.models.user import User
+from app.models.session import SessionManager
 from app.services.auth_service import AuthService
-from app import db, logger
+from app import db, logger, key_manager, token_revocation, profile_cache, rate_limiter
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limiter.limit('register')
 def register():
     """Регистрация пользователя"""
     data = request.get_json()
@@ -18,34 +21,38 @@ def register():
                       metadata={"received_fields": list(data.keys()) if data else None})
         return jsonify({"error": "Username, email and password are required"}), 400
     
-    # Проверка существования пользователя
-    if User.query.filter_by(email=data['email']).first():
-        logger.info("Registration attempt with existing email",
-                   metadata={"email": data['email']})
-        return jsonify({"error": "User with this email already exists"}), 409
-    if User.query.filter_by(username=data['username']).first():
-        logger.info("Registration attempt with existing username",
-                   metadata={"username": data['username']})
-        return jsonify({"error": "User with this username already exists"}), 409
-    
-    # Создание нового пользователя
+    # Создание нового пользователя одной вставкой: занятость username и email
+    # проверяют уникальные индексы, без отдельных запросов и гонок между ними
     new_user = User(
         username=data['username'],
         email=data['email']
     )
     new_user.set_password(data['password'])
     
-    db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.add(new_user)
+        db.session.flush()
+        user_id = new_user.id
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        field = User.conflicting_field(e)
+        if field is None:
+            raise
+        logger.info(f"Registration attempt with existing {field}",
+                   metadata={field: data[field]})
+        return jsonify({"error": f"User with this {field} already exists"}), 409
+    profile_cache.invalidate(user_id)
     
     logger.info("New user registered", 
-                user_id=new_user.id,
+                user_id=user_id,
                 action="user_registered",
-                metadata={"username": new_user.username, "email": new_user.email})
+                metadata={"username": data['username'], "email": data['email']})
     
     return jsonify({"message": "User successfully registered"}), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limiter.limit('login')
 def login():
     """Аутентификация пользователя"""
     data = request.get_json()
@@ -61,21 +68,24 @@ def login():
                       metadata={"username": data.get('username')})
         return jsonify({"error": "Invalid username or password"}), 401
     
-    # Генерация токенов
-    access_token, refresh_token = AuthService.create_tokens(user)
+    # Генерация токенов и сессии устройства
+    device_id = AuthService.normalize_device_id(data.get('device_id') or request.headers.get('X-Device-Id'))
+    access_token, refresh_token = AuthService.create_tokens(user, device_id)
     
     logger.info("User logged in",
                 user_id=user.id,
                 action="user_login",
-                metadata={"username": user.username})
+                metadata={"username": user.username, "device_id": device_id})
     
     return jsonify({
         "access_token": access_token,
         "refresh_token": refresh_token,
+        "device_id": device_id,
         "user": user.to_dict()
     }), 200
 
 @auth_bp.route('/refresh', methods=['POST'])
+@rate_limiter.limit('refresh')
 def refresh():
     """Обновление access токена"""
     refresh_token = request.json.get('refresh_token')
@@ -83,14 +93,11 @@ def refresh():
         logger.warning("Token refresh attempt without refresh token")
         return jsonify({"error": "Refresh token is required"}), 400
 
-    user = AuthService.validate_refresh_token(refresh_token)
-    if not user:
+    tokens = AuthService.refresh_tokens(refresh_token)
+    if not tokens:
         logger.warning("Token refresh attempt with invalid token")
         return jsonify({"error": "Invalid refresh token"}), 401
-
-    # Отзываем старый refresh токен и создаем новые токены
-    AuthService.revoke_token(refresh_token)
-    access_token, new_refresh_token = AuthService.create_tokens(user)
+    user, access_token, new_refresh_token = tokens
 
     logger.info("Tokens refreshed",
                 user_id=user.id,
@@ -106,9 +113,13 @@ def refresh():
 def logout():
     """Выход из системы"""
     user_id = get_jwt_identity()
+    claims = get_jwt()
     refresh_token = request.json.get('refresh_token')
     if refresh_token:
         AuthService.revoke_token(refresh_token)
+    if claims.get('did'):
+        AuthService.revoke_session(user_id, claims['did'])
+    token_revocation.revoke(claims)
     
     logger.info("User logged out",
                 user_id=user_id,
@@ -116,13 +127,66 @@ def logout():
     
     return jsonify({"message": "Successfully logged out"}), 200
 
+@auth_bp.route('/logout/all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    """Выход со всех устройств: отзыв всех выпущенных токенов пользователя"""
+    user_id = get_jwt_identity()
+    AuthService.revoke_all_tokens(user_id)
+
+    logger.info("User logged out from all devices",
+                user_id=user_id,
+                action="user_logout_all")
+
+    return jsonify({"message": "Successfully logged out from all devices"}), 200
+
+@auth_bp.route('/sessions', methods=['GET'])
+@jwt_required()
+def get_sessions():
+    """Список активных сессий текущего пользователя по устройствам"""
+    user_id = get_jwt_identity()
+    current_device_id = get_jwt().get('did')
+    SessionManager.flush_last_seen()
+    sessions = [
+        {
+            "device_id": session['device_id'],
+            "issued_at": session['issued_at'],
+            "last_seen_at": session['last_seen_at'],
+            "expires_at": session['expires_at'],
+            "current": session['device_id'] == current_device_id
+        }
+        for session in SessionManager.get_sessions(user_id)
+    ]
+
+    logger.debug("Sessions list requested",
+                 user_id=user_id,
+                 action="get_sessions")
+
+    return jsonify({"sessions": sessions}), 200
+
+@auth_bp.route('/sessions/<device_id>', methods=['DELETE'])
+@jwt_required()
+def revoke_session(device_id):
+    """Завершение сессии на одном из устройств пользователя"""
+    user_id = get_jwt_identity()
+    if not AuthService.revoke_session(user_id, device_id):
+        return jsonify({"error": "Session not found"}), 404
+
+    logger.info("Session revoked",
+                user_id=user_id,
+                action="revoke_session",
+                metadata={"device_id": device_id})
+
+    return jsonify({"message": "Session revoked"}), 200
+
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     """Получение информации о текущем пользователе"""
     user_id = get_jwt_identity()
-    user = db.session.get(User, user_id)
-    if not user:
+    SessionManager.touch(user_id, get_jwt().get('did'))
+    profile = AuthService.get_user_profile(user_id)
+    if not profile:
         logger.error("User not found for token",
                     user_id=user_id,
                     action="get_user_info")
@@ -132,7 +196,7 @@ def get_current_user():
                 user_id=user_id,
                 action="get_user_info")
     
-    return jsonify(user.to_dict()), 200
+    return jsonify(profile), 200
 
 @auth_bp.route('/validate', methods=['POST'])
 def validate_token():
@@ -142,11 +206,12 @@ def validate_token():
         verify_jwt_in_request()
         claims = get_jwt()
         user_id = get_jwt_identity()
+        SessionManager.touch(user_id, claims.get('did'))
 
         logger.debug("Token validated",
                      user_id=user_id,
                      action="validate_token",
-                     metadata={"roles": claims.get('roles', [])})
+                     metadata=lambda: {"roles": claims.get('roles', [])})
         
         return jsonify({
             "valid": True,
@@ -163,6 +228,10 @@ def validate_token():
                        metadata={"error": str(e)},
                        action="validate_token")
         return jsonify({"valid": False, "error": "Invalid Authorization header format"}), 401
+    except RevokedTokenError:
+        logger.info("Revoked token presented",
+                    action="validate_token")
+        return jsonify({"valid": False, "error": "Token has been revoked"}), 401
     except Exception as e:
         if type(e).__name__ in ("InvalidSubjectError", "DecodeError"):
             logger.warning("Invalid JWT format",
@@ -174,6 +243,39 @@ def validate_token():
                        action="validate_token")
         return jsonify({"valid": False, "error": "Unexpected error"}), 500
 
+@auth_bp.route('/validate/batch', methods=['POST'])
+def validate_tokens_batch():
+    """Пакетная валидация токенов для шлюзов и фоновых задач"""
+    data = request.get_json(silent=True)
+    tokens = data.get('tokens') if isinstance(data, dict) else None
+
+    if not isinstance(tokens, list) or not tokens:
+        logger.warning("Batch token validation with invalid data",
+                       action="validate_token_batch")
+        return jsonify({"error": "Non-empty tokens list is required"}), 400
+
+    max_tokens = current_app.config['VALIDATE_BATCH_MAX_TOKENS']
+    if len(tokens) > max_tokens:
+        logger.warning("Batch token validation limit exceeded",
+                       action="validate_token_batch",
+                       metadata={"count": len(tokens)})
+        return jsonify({"error": f"At most {max_tokens} tokens per request"}), 400
+
+    results = AuthService.validate_tokens(tokens)
+
+    logger.debug("Tokens batch validated",
+                 action="validate_token_batch",
+                 metadata=lambda: {"count": len(results), "valid": sum(1 for r in results if r['valid'])})
+
+    return jsonify({"results": results}), 200
+
+@auth_bp.route('/.well-known/jwks.json', methods=['GET'])
+def jwks():
+    """Публичные ключи подписи токенов для локальной проверки в других сервисах"""
+    response = jsonify(key_manager.jwks())
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['JWKS_CACHE_MAX_AGE']}"
+    return response, 200
+
 @auth_bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy"}), 200
@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, abort, current_app, jsonify
 from datetime import datetime
+from app.services.metrics import CONTENT_TYPE, multiprocess_metrics
 
 health_bp = Blueprint('health', __name__)
 
@@ -10,3 +11,10 @@ def ping():
         "timestamp": datetime.utcnow().isoformat(),
         "service": "auth-service"
     }), 200
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики всех воркеров (или процесса без METRICS_MULTIPROC_DIR) в текстовом формате Prometheus"""
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(multiprocess_metrics.render(), content_type=CONTENT_TYPE)
@@ -1,55 +1,57 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token
-import requests
+from sqlalchemy.exc import IntegrityError
 from app.models.user import User
-from app import db, config
+from app.services.auth_service import AuthService
+from app.services.oauth_providers import OAuthProviderError
+from app import logger, oauth_providers
 
 oauth_bp = Blueprint('oauth', __name__)
 
-def get_github_access_token(code):
-    """Получение access токена от GitHub"""
-    params = {
-        'client_id': config.Config.GITHUB_CLIENT_ID,
-        'client_secret': config.Config.GITHUB_CLIENT_SECRET,
-        'code': code
-    }
-    headers = {'Accept': 'application/json'}
-    response = requests.post('https://github.com/login/oauth/access_token', params=params, headers=headers)
-    return response.json().get('access_token')
-
-def get_github_user_info(access_token):
-    """Получение информации о пользователе от GitHub"""
-    headers = {'Authorization': f'token {access_token}'}
-    response = requests.get('https://api.github.com/user', headers=headers)
-    return response.json()
-
-@oauth_bp.route('/github/callback', methods=['POST'])
-def github_callback():
-    """Обработка OAuth колбэка от GitHub"""
-    code = request.json.get('code')
-    
-    # Получение токена доступа
-    github_access_token = get_github_access_token(code)
-    
-    # Получение информации о пользователе
-    github_user = get_github_user_info(github_access_token)
-    
-    # Поиск или создание пользователя
-    user = db.session.query(User).filter_by(email=github_user['email']).first()
-    
-    if not user:
-        user = User(
-            username=github_user['login'],
-            email=github_user['email']
-        )
-        db.session.add(user)
-        db.session.commit()
-    
-    # Генерация токенов
-    access_token = create_access_token(identity=user.id)
-    refresh_token = create_refresh_token(identity=user.id)
-    
+@oauth_bp.route('/<provider_name>/callback', methods=['POST'])
+def provider_callback(provider_name):
+    """Обработка OAuth колбэка от провайдера (github, yandex)"""
+    provider = oauth_providers.get(provider_name)
+    if provider is None:
+        return jsonify({"error": "Unknown OAuth provider"}), 404
+
+    data = request.get_json(silent=True) or {}
+    code = data.get('code')
+    if not code:
+        return jsonify({"error": "Authorization code is required"}), 400
+
+    # Обмен кода и чтение профиля через общий пул соединений с таймаутами
+    try:
+        identity = provider.authenticate(code, data.get('redirect_uri'))
+    except OAuthProviderError as e:
+        logger.warning("OAuth provider request failed",
+                      action="oauth_callback",
+                      metadata={"provider": e.provider, "error": e.message})
+        return jsonify({"error": "OAuth provider error"}), e.status_code
+
+    # Upsert по (provider, provider_user_id) с привязкой к аккаунту с тем же email
+    try:
+        user = AuthService.authenticate_oauth(identity)
+    except IntegrityError as e:
+        field = User.conflicting_field(e)
+        logger.warning("OAuth account conflicts with existing user",
+                      action="oauth_login",
+                      metadata={"provider": identity['provider'], "field": field})
+        if field is None:
+            return jsonify({"error": "User already exists"}), 409
+        return jsonify({"error": f"User with this {field} already exists"}), 409
+
+    # Генерация токенов и сессии устройства
+    device_id = AuthService.normalize_device_id(data.get('device_id') or request.headers.get('X-Device-Id'))
+    access_token, refresh_token = AuthService.create_tokens(user, device_id)
+
+    logger.info("User logged in via OAuth",
+                user_id=user.id,
+                action="oauth_login",
+                metadata={"provider": identity['provider'], "device_id": device_id})
+
     return jsonify({
         "access_token": access_token,
-        "refresh_token": refresh_token
+        "refresh_token": refresh_token,
+        "device_id": device_id,
+        "user": user.to_dict()
     }), 200
@@ -0,0 +1,145 @@
+import hashlib
+import time
+from app import redis_client
+
+# Ключи содержат {user_id} как hash tag, чтобы скрипты работали и в Redis Cluster
+TOKEN_KEY = 'refresh_token:{{{user_id}}}:{token_id}'
+INDEX_KEY = 'refresh_tokens:{{{user_id}}}'
+GRACE_KEY = 'refresh_token_grace:{{{user_id}}}:{token_id}'
+# Токенов за один вызов скрипта отзыва
+_REVOKE_BATCH = 500
+
+# Атомарная ротация: старый токен помечается использованным, новый регистрируется.
+# Повтор старого токена в пределах окна возвращает уже выпущенную пару токенов,
+# а повтор после окна считается признаком кражи токена.
+_ROTATE_SCRIPT = redis_client.register_script("""
+local current = redis.call('HMGET', KEYS[1], 'user_id', 'rotated_at')
+if not current[1] or current[1] ~= ARGV[3] then
+    return {'missing'}
+end
+if current[2] then
+    local successor = redis.call('HMGET', KEYS[4], 'access_token', 'refresh_token')
+    if successor[1] then
+        return {'reused', successor[1], successor[2]}
+    end
+    return {'reuse_detected'}
+end
+redis.call('HSET', KEYS[1], 'rotated_at', ARGV[4])
+redis.call('HSET', KEYS[4], 'access_token', ARGV[8], 'refresh_token', ARGV[9])
+redis.call('EXPIRE', KEYS[4], ARGV[7])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[2], 'user_id', ARGV[3], 'created_at', ARGV[4], 'expires_at', ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+redis.call('ZADD', KEYS[3], ARGV[5], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[6])
+return {'rotated'}
+""")
+
+# Регистрация токена вместе с записью в индексе: токен вне индекса не отозвал бы revoke_all
+_ADD_SCRIPT = redis_client.register_script("""
+redis.call('HSET', KEYS[1], 'user_id', ARGV[2], 'created_at', ARGV[3], 'expires_at', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+""")
+
+# Отзыв токенов: KEYS[1] - индекс, KEYS[2..] - ключи токенов с id из ARGV в том же порядке.
+# Все ключи передаются явно, поэтому Redis Cluster проверяет, что они в одном слоте
+_REVOKE_SCRIPT = redis_client.register_script("""
+for i, token_id in ipairs(ARGV) do
+    redis.call('DEL', KEYS[i + 1])
+    redis.call('ZREM', KEYS[1], token_id)
+end
+return #ARGV
+""")
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class RefreshTokenStore:
+    """Хранилище refresh токенов в Redis с индексом по пользователю"""
+
+    @staticmethod
+    def token_id(refresh_token):
+        """Ключ фиксированной длины вместо полного JWT"""
+        return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def add(user_id, refresh_token, expires_at):
+        """Регистрация нового refresh токена"""
+        token_id = RefreshTokenStore.token_id(refresh_token)
+        now = int(time.time())
+        ttl = max(1, int(expires_at) - now)
+        _ADD_SCRIPT(
+            keys=[TOKEN_KEY.format(user_id=user_id, token_id=token_id), INDEX_KEY.format(user_id=user_id)],
+            args=[token_id, str(user_id), now, int(expires_at), ttl]
+        )
+        return token_id
+
+    @staticmethod
+    def rotate(user_id, refresh_token, new_refresh_token, new_access_token, new_expires_at, grace):
+        """
+        Атомарная замена refresh токена
+
+        Returns:
+            ('rotated', None, None) - новый токен зарегистрирован;
+            ('reused', access_token, refresh_token) - повтор в окне, выдается та же пара;
+            ('reuse_detected', None, None) - повтор использованного токена после окна;
+            ('missing', None, None) - токен неизвестен или отозван
+        """
+        token_id = RefreshTokenStore.token_id(refresh_token)
+        new_token_id = RefreshTokenStore.token_id(new_refresh_token)
+        now = int(time.time())
+        result = _ROTATE_SCRIPT(
+            keys=[
+                TOKEN_KEY.format(user_id=user_id, token_id=token_id),
+                TOKEN_KEY.format(user_id=user_id, token_id=new_token_id),
+                INDEX_KEY.format(user_id=user_id),
+                GRACE_KEY.format(user_id=user_id, token_id=token_id)
+            ],
+            args=[
+                token_id, new_token_id, str(user_id), now, int(new_expires_at),
+                max(1, int(new_expires_at) - now), grace, new_access_token, new_refresh_token
+            ]
+        )
+        result = [_decode(value) for value in result]
+        return result[0], (result[1] if len(result) > 1 else None), (result[2] if len(result) > 2 else None)
+
+    @staticmethod
+    def revoke(user_id, refresh_token):
+        """Отзыв одного refresh токена"""
+        RefreshTokenStore.revoke_by_id(user_id, RefreshTokenStore.token_id(refresh_token))
+
+    @staticmethod
+    def revoke_by_id(user_id, token_id):
+        """Отзыв refresh токена по его id"""
+        RefreshTokenStore._revoke_ids(user_id, [token_id])
+
+    @staticmethod
+    def revoke_all(user_id):
+        """
+        Отзыв всех refresh токенов пользователя ("выход со всех устройств").
+        Скрипт удаляет только прочитанные из индекса токены, поэтому индекс перечитывается,
+        пока не опустеет: токен, выданный во время отзыва, тоже будет отозван
+        """
+        index_key = INDEX_KEY.format(user_id=user_id)
+        revoked = 0
+        while True:
+            token_ids = [_decode(token_id) for token_id in redis_client.zrange(index_key, 0, _REVOKE_BATCH - 1)]
+            if not token_ids:
+                return revoked
+            revoked += RefreshTokenStore._revoke_ids(user_id, token_ids)
+
+    @staticmethod
+    def _revoke_ids(user_id, token_ids):
+        return _REVOKE_SCRIPT(
+            keys=[INDEX_KEY.format(user_id=user_id)]
+                 + [TOKEN_KEY.format(user_id=user_id, token_id=token_id) for token_id in token_ids],
+            args=token_ids
+        )
+
@@ -1,6 +1,7 @@
 from app import db
 from sqlalchemy import Column, Integer, String, Table, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, selectinload
+from sqlalchemy import select, exists
 
 # Таблица связи ролей и прав
 role_permissions = Table(
@@ -18,6 +19,11 @@ class Permission(db.Model):
     name = Column(String(50), unique=True, nullable=False)
     description = Column(String)
 
+    @classmethod
+    def name_exists(cls, name):
+        """Проверка занятости имени права без загрузки права"""
+        return db.session.execute(select(exists().where(cls.name == name))).scalar()
+
     def to_dict(self):
         """Сериализация прав"""
         return {
@@ -34,10 +40,20 @@ class Role(db.Model):
     name = Column(String(50), unique=True, nullable=False)
     description = Column(String)
 
-    # Отношение к правам
-    permissions = relationship('Permission', secondary=role_permissions, lazy='joined',
+    # Отношение к правам; способ загрузки задается явно в каждом сценарии
+    permissions = relationship('Permission', secondary=role_permissions, lazy='select',
                              backref=db.backref('roles', lazy=True))
 
+    @classmethod
+    def name_exists(cls, name):
+        """Проверка занятости имени роли без загрузки роли"""
+        return db.session.execute(select(exists().where(cls.name == name))).scalar()
+
+    @classmethod
+    def list_with_permissions(cls):
+        """Все роли с правами: один дополнительный запрос вместо декартова JOIN"""
+        return cls.query.options(selectinload(cls.permissions)).order_by(cls.id).all()
+
     def to_dict(self):
         """Сериализация роли"""
         return {
@@ -1,43 +1,243 @@
-import json
+import atexit
+import struct
+import threading
+import time
 from app import redis_client
-from datetime import timedelta
+from app.models.refresh_token import INDEX_KEY, TOKEN_KEY
+
+# Ключи содержат {user_id} как hash tag, чтобы все данные пользователя были в одном слоте
+SESSIONS_KEY = 'sessions:{{{user_id}}}'
+LAST_SEEN_KEY = 'sessions_seen:{{{user_id}}}'
+
+# Запись сессии устройства: issued_at, expires_at (uint32) и id refresh токена (16 байт)
+_ENTRY = struct.Struct('>II16s')
+
+# Вход на устройство с уже открытой сессией: запись заменяется, только если она не изменилась
+# с момента чтения (ARGV[2]), и refresh токен прежней сессии отзывается в том же скрипте
+_REPLACE_SCRIPT = redis_client.register_script("""
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if (current or '') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+if ARGV[6] ~= '' then
+    redis.call('DEL', KEYS[4])
+    redis.call('ZREM', KEYS[3], ARGV[6])
+end
+return 1
+""")
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _LastSeenBuffer:
+    """
+    Буфер обновлений last-seen в памяти процесса.
+    Одно устройство обновляется не чаще раза в interval секунд, а накопленные
+    обновления записываются в Redis одним конвейером.
+    """
+
+    def __init__(self):
+        self.interval = 60
+        self.flush_interval = 5
+        self.max_batch = 500
+        self._pending = {}
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, interval, flush_interval, max_batch):
+        with self._lock:
+            self.interval = interval
+            self.flush_interval = flush_interval
+            self.max_batch = max_batch
+            self._touched = {}
+
+    def touch(self, user_id, device_id):
+        """Запись отметки в буфер; True, если буфер пора записать в Redis"""
+        now = time.time()
+        key = (str(user_id), device_id)
+        with self._lock:
+            if now - self._touched.get(key, 0) < self.interval:
+                return False
+            self._touched[key] = now
+            self._pending[key] = now
+            return (len(self._pending) >= self.max_batch
+                    or time.monotonic() - self._flushed_at >= self.flush_interval)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+            # Забываем устройства, для которых окно троттлинга уже прошло
+            cutoff = time.time() - self.interval
+            self._touched = {key: ts for key, ts in self._touched.items() if ts > cutoff}
+        if not pending:
+            return 0
+        # XX: не воскрешаем сессии, удаленные после последнего запроса
+        redis_client.pipeline_map(pending.items(), lambda pipe, item: pipe.zadd(
+            LAST_SEEN_KEY.format(user_id=item[0][0]), {item[0][1]: int(item[1])}, xx=True))
+        return len(pending)
+
+
+_last_seen = _LastSeenBuffer()
+
+
+@atexit.register
+def _flush_last_seen_at_exit():
+    try:
+        _last_seen.flush()
+    except Exception:
+        pass
+
 
 class SessionManager:
-    """Менеджер сессий с использованием Redis"""
-    
-    @staticmethod
-    def create_session(user_id, access_token, refresh_token):
-        """Создание новой сессии"""
-        session_data = {
-            'user_id': user_id,
-            'access_token': access_token,
-            'refresh_token': refresh_token
-        }
-        
-        # Храним сессию в Redis с TTL
-        redis_client.setex(
-            f'session:{user_id}', 
-            timedelta(days=30),  # Срок жизни сессии
-            json.dumps(session_data)
+    """Реестр сессий пользователя по устройствам в Redis"""
+
+    @staticmethod
+    def configure(app):
+        """Настройка троттлинга обновлений last-seen"""
+        _last_seen.configure(
+            app.config['SESSION_LAST_SEEN_INTERVAL'],
+            app.config['SESSION_LAST_SEEN_FLUSH_INTERVAL'],
+            app.config['SESSION_LAST_SEEN_BATCH_SIZE']
         )
-    
-    @staticmethod
-    def get_session(user_id):
-        """Получение данных сессии"""
-        session_json = redis_client.get(f'session:{user_id}')
-        return json.loads(session_json) if session_json else None
-    
-    @staticmethod
-    def invalidate_session(user_id):
-        """Инвалидация сессии"""
-        redis_client.delete(f'session:{user_id}')
-    
-    @staticmethod
-    def is_token_blacklisted(token):
-        """Проверка токена в черном списке"""
-        return redis_client.sismember('blacklisted_tokens', token)
-    
-    @staticmethod
-    def blacklist_token(token):
-        """Добавление токена в черный список"""
-        redis_client.sadd('blacklisted_tokens', token)
+
+    @staticmethod
+    def create_session(user_id, device_id, refresh_token_id, expires_at, issued_at=None):
+        """
+        Создание сессии устройства при входе.
+        Повторный вход с тем же device_id заменяет сессию и отзывает ее refresh токен,
+        иначе удаление сессии не завершало бы вход, выполненный раньше на этом устройстве.
+        """
+        now = int(time.time())
+        entry = _ENTRY.pack(int(issued_at or now), int(expires_at), bytes.fromhex(refresh_token_id))
+        ttl = max(1, int(expires_at) - now)
+        sessions_key = SESSIONS_KEY.format(user_id=user_id)
+
+        while True:
+            current = redis_client.hget(sessions_key, device_id) or b''
+            previous_token_id = _ENTRY.unpack(current)[2].hex() if current else ''
+            if previous_token_id == refresh_token_id:
+                previous_token_id = ''
+            replaced = _REPLACE_SCRIPT(
+                keys=[
+                    sessions_key,
+                    LAST_SEEN_KEY.format(user_id=user_id),
+                    INDEX_KEY.format(user_id=user_id),
+                    TOKEN_KEY.format(user_id=user_id, token_id=previous_token_id or refresh_token_id)
+                ],
+                args=[device_id, current, entry, now, ttl, previous_token_id]
+            )
+            if replaced:
+                return
+
+    @staticmethod
+    def _update_session(user_id, device_id, refresh_token_id, expires_at, issued_at):
+        """Запись сессии устройства без отзыва прежнего refresh токена"""
+        now = int(time.time())
+        entry = _ENTRY.pack(int(issued_at or now), int(expires_at), bytes.fromhex(refresh_token_id))
+        ttl = max(1, int(expires_at) - now)
+
+        # Ключи пользователя в одном слоте; без MULTI, который RedisCluster не поддерживает
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(SESSIONS_KEY.format(user_id=user_id), device_id, entry)
+        pipe.zadd(LAST_SEEN_KEY.format(user_id=user_id), {device_id: now})
+        # Все сессии пользователя истекают вместе, если он не появлялся дольше срока жизни токена
+        pipe.expire(SESSIONS_KEY.format(user_id=user_id), ttl)
+        pipe.expire(LAST_SEEN_KEY.format(user_id=user_id), ttl)
+        pipe.execute()
+
+    @staticmethod
+    def rotate_session(user_id, device_id, refresh_token_id, expires_at):
+        """
+        Привязка сессии устройства к новому refresh токену с сохранением времени входа.
+        Прежний токен уже помечен использованным ротацией и остается для окна повтора
+        """
+        session = SessionManager.get_session(user_id, device_id)
+        issued_at = session['issued_at'] if session else None
+        SessionManager._update_session(user_id, device_id, refresh_token_id, expires_at, issued_at)
+
+    @staticmethod
+    def get_session(user_id, device_id):
+        """Получение данных сессии устройства"""
+        entry = redis_client.hget(SESSIONS_KEY.format(user_id=user_id), device_id)
+        if not entry:
+            return None
+        issued_at, expires_at, refresh_token_id = _ENTRY.unpack(entry)
+        return {
+            'device_id': device_id,
+            'issued_at': issued_at,
+            'expires_at': expires_at,
+            'refresh_token_id': refresh_token_id.hex()
+        }
+
+    @staticmethod
+    def get_sessions(user_id):
+        """Список сессий пользователя; истекшие записи удаляются пакетно"""
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(SESSIONS_KEY.format(user_id=user_id))
+        pipe.zrange(LAST_SEEN_KEY.format(user_id=user_id), 0, -1, withscores=True)
+        entries, last_seen = pipe.execute()
+        last_seen = {_decode(device_id): int(score) for device_id, score in last_seen}
+
+        now = int(time.time())
+        sessions, expired = [], []
+        for device_id, entry in entries.items():
+            device_id = _decode(device_id)
+            issued_at, expires_at, refresh_token_id = _ENTRY.unpack(entry)
+            if expires_at <= now:
+                expired.append(device_id)
+                continue
+            sessions.append({
+                'device_id': device_id,
+                'issued_at': issued_at,
+                'expires_at': expires_at,
+                'last_seen_at': last_seen.get(device_id, issued_at),
+                'refresh_token_id': refresh_token_id.hex()
+            })
+        if expired:
+            SessionManager.invalidate_sessions(user_id, expired)
+        return sorted(sessions, key=lambda session: session['last_seen_at'], reverse=True)
+
+    @staticmethod
+    def invalidate_session(user_id, device_id):
+        """Инвалидация сессии устройства"""
+        SessionManager.invalidate_sessions(user_id, [device_id])
+
+    @staticmethod
+    def invalidate_sessions(user_id, device_ids):
+        """Пакетная инвалидация сессий устройств"""
+        # Ключи пользователя в одном слоте; без MULTI, который RedisCluster не поддерживает
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hdel(SESSIONS_KEY.format(user_id=user_id), *device_ids)
+        pipe.zrem(LAST_SEEN_KEY.format(user_id=user_id), *device_ids)
+        pipe.execute()
+
+    @staticmethod
+    def invalidate_all(user_id):
+        """Инвалидация всех сессий пользователя"""
+        redis_client.delete(SESSIONS_KEY.format(user_id=user_id), LAST_SEEN_KEY.format(user_id=user_id))
+
+    @staticmethod
+    def touch(user_id, device_id):
+        """Отметка активности устройства (с троттлингом и пакетной записью)"""
+        if device_id and _last_seen.touch(user_id, device_id):
+            _last_seen.flush()
+
+    @staticmethod
+    async def touch_async(user_id, device_id):
+        """То же, что touch, для ASGI режима: запись пакета в Redis не блокирует цикл событий"""
+        if device_id and _last_seen.touch(user_id, device_id):
+            import anyio
+            await anyio.to_thread.run_sync(_last_seen.flush)
+
+    @staticmethod
+    def flush_last_seen():
+        """Принудительная запись накопленных обновлений last-seen"""
+        return _last_seen.flush()
@@ -1,15 +1,17 @@
-from app import db
-from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Table, ForeignKey, Date, JSON
+from app import db, password_hasher
+from sqlalchemy.orm import relationship, selectinload
+from sqlalchemy import select, update, Index, Column, Integer, String, DateTime, Boolean, Table, ForeignKey, Date, JSON
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.sql import func
-import bcrypt
 
 # Таблица связи пользователей и ролей
 user_roles = Table(
     'user_roles',
     db.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True)
+    Column('role_id', Integer, ForeignKey('roles.id'), primary_key=True),
+    # Фильтр пользователей по роли: первичный ключ (user_id, role_id) для него не подходит
+    Index('ix_user_roles_role_id_user_id', 'role_id', 'user_id')
 )
 
 class User(db.Model):
@@ -17,8 +19,9 @@ class User(db.Model):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    username = Column(String(255), nullable=False)  # Убрали unique=True
-    email = Column(String(255), unique=True, nullable=False)
+    # Уникальность username и email без учета регистра задается индексами по lower(...)
+    username = Column(String(255), nullable=False)
+    email = Column(String(255), nullable=False)
     email_verified = Column(Boolean, default=False, nullable=False)
     password_hash = Column(String(255))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -31,19 +34,81 @@ class User(db.Model):
     provider_user_id = Column(String(255))
     provider_data = Column(JSON)
 
-    # Отношение к ролям
-    roles = relationship('Role', secondary=user_roles, lazy='joined',
+    __table_args__ = (
+        # Уникальность без учета регистра; тот же индекс обслуживает вход по username
+        # и поиск по префиксу (LIKE 'prefix%' по lower(...) с text_pattern_ops)
+        Index('uq_users_username_lower', func.lower(username).label('username_lower'), unique=True,
+              postgresql_ops={'username_lower': 'text_pattern_ops'}),
+        Index('uq_users_email_lower', func.lower(email).label('email_lower'), unique=True,
+              postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        Index('ix_users_provider_id', 'provider', 'id'),
+        # Вход через OAuth: поиск и upsert по идентификатору у провайдера
+        Index('uq_users_provider_user', 'provider', 'provider_user_id', unique=True),
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+
+    # Отношение к ролям; способ загрузки задается явно в каждом сценарии
+    roles = relationship('Role', secondary=user_roles, lazy='select',
                         backref=db.backref('users', lazy=True))
 
+    @staticmethod
+    def conflicting_field(error):
+        """Поле ('username' или 'email'), уникальность которого нарушена при вставке, или None"""
+        message = str(getattr(error, 'orig', error))
+        for field in ('username', 'email'):
+            if f'uq_users_{field}_lower' in message:
+                return field
+        return None
+
+    @classmethod
+    def get_credentials(cls, username):
+        """Только id и хеш пароля для проверки при входе (поиск по уникальному индексу lower(username))"""
+        return db.session.execute(
+            select(cls.id, cls.password_hash).where(func.lower(cls.username) == func.lower(username))
+        ).first()
+
+    @classmethod
+    def upsert_provider_identity(cls, values):
+        """
+        Вставка пользователя OAuth провайдера или обновление provider_data у существующего
+        одним INSERT ... ON CONFLICT (provider, provider_user_id). Возвращает id пользователя;
+        конфликт по username или email поднимает IntegrityError.
+        """
+        dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(cls).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.provider, cls.provider_user_id],
+            set_={'provider_data': statement.excluded.provider_data}
+        ).returning(cls.id)
+        return db.session.execute(statement).scalar_one()
+
+    @classmethod
+    def link_provider_identity(cls, email, provider, provider_user_id, provider_data):
+        """
+        Привязка провайдера к аккаунту с этим email без другого провайдера; id или None.
+        Аккаунт с неподтвержденным email не привязывается: иначе зарегистрированный
+        заранее на чужой адрес аккаунт (с паролем злоумышленника) получил бы вход владельца.
+        """
+        return db.session.execute(
+            update(cls)
+            .where(func.lower(cls.email) == func.lower(email), cls.provider.is_(None),
+                   cls.email_verified.is_(True))
+            .values(provider=provider, provider_user_id=provider_user_id, provider_data=provider_data)
+            .returning(cls.id)
+        ).scalar_one_or_none()
+
+    @classmethod
+    def get_with_roles(cls, user_id):
+        """Пользователь с ролями (без прав ролей) для токенов и профиля"""
+        return db.session.get(cls, user_id, options=[selectinload(cls.roles)])
+
     def set_password(self, password):
-        """Хеширование пароля"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(12)).decode('utf-8')
+        """Хеширование пароля в пуле bcrypt"""
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Проверка пароля"""
-        if not self.password_hash:
-            return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Проверка пароля в пуле bcrypt"""
+        return password_hasher.verify(password, self.password_hash)
 
     def to_dict(self):
         """Сериализация пользователя"""
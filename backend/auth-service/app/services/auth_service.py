@@ -1,59 +1,234 @@
-from datetime import datetime, timezone
-import json
-from flask_jwt_extended import create_access_token, create_refresh_token
-from app import db, redis_client
+import re
+import secrets
+import time
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy.exc import IntegrityError
+from app import db, logger, token_revocation, profile_cache, password_hasher, last_login_buffer
 from app.models.user import User
+from app.models.refresh_token import RefreshTokenStore
+from app.models.session import SessionManager
+
+_DEVICE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
 
 class AuthService:
     @staticmethod
-    def create_tokens(user):
-        """Создание access и refresh токенов"""
-        # Добавляем роли в claims токена
-        additional_claims = {'roles': user.get_roles()}
+    def _mint_tokens(user, device_id):
+        """Подпись пары токенов без регистрации в хранилище"""
+        # Добавляем роли, эпоху отзыва пользователя и устройство в claims токена
+        epoch = token_revocation.current_epoch(user.id)
+        additional_claims = {'roles': user.get_roles(), 'epoch': epoch, 'did': device_id}
         
         # Создаем токены
         access_token = create_access_token(
             identity=str(user.id),
             additional_claims=additional_claims
         )
-        refresh_token = create_refresh_token(identity=str(user.id))
-
-        # Сохраняем информацию о refresh токене в Redis
-        session_data = {
-            'user_id': user.id,
-            'created_at': datetime.now(timezone.utc).isoformat()
-        }
-        redis_client.setex(
-            f'{user.id}:refresh_token:{refresh_token}',
-            60 * 60 * 24 * 30,  # 30 дней
-            json.dumps(session_data)
+        refresh_token = create_refresh_token(
+            identity=str(user.id),
+            additional_claims={'epoch': epoch, 'did': device_id}
         )
+        expires_at = time.time() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds()
+        return access_token, refresh_token, expires_at
 
+    @staticmethod
+    def normalize_device_id(device_id):
+        """Идентификатор устройства от клиента или новый, если он не передан или некорректен"""
+        if isinstance(device_id, str) and _DEVICE_ID_RE.match(device_id):
+            return device_id
+        return secrets.token_hex(8)
+
+    @staticmethod
+    def create_tokens(user, device_id=None):
+        """Создание access и refresh токенов и сессии устройства"""
+        device_id = AuthService.normalize_device_id(device_id)
+        access_token, refresh_token, expires_at = AuthService._mint_tokens(user, device_id)
+        token_id = RefreshTokenStore.add(user.id, refresh_token, expires_at)
+        SessionManager.create_session(user.id, device_id, token_id, expires_at)
         return access_token, refresh_token
 
     @staticmethod
-    def validate_refresh_token(refresh_token):
-        """Проверка refresh токена в Redis"""
-        session_key = f'refresh_token:{refresh_token}'
-        session_data = redis_client.get(session_key)
-        if not session_data:
+    def _decode_refresh_token(refresh_token):
+        """Проверка подписи, срока действия, типа и отзыва refresh токена"""
+        try:
+            claims = decode_token(refresh_token)
+        except InvalidTokenError:
             return None
-        
-        session = json.loads(session_data)
-        return db.session.get(User, session['user_id'])
+        if claims.get('type') != 'refresh' or token_revocation.is_revoked(claims):
+            return None
+        return claims
+
+    @staticmethod
+    def refresh_tokens(refresh_token):
+        """
+        Ротация refresh токена.
+        Возвращает (user, access_token, refresh_token) или None, если токен невалиден.
+        Параллельные запросы с одним токеном в пределах окна повтора получают одну и ту же пару.
+        """
+        claims = AuthService._decode_refresh_token(refresh_token)
+        if not claims:
+            return None
+        user = User.get_with_roles(int(claims['sub']))
+        if not user:
+            return None
+
+        device_id = AuthService.normalize_device_id(claims.get('did'))
+        access_token, new_refresh_token, expires_at = AuthService._mint_tokens(user, device_id)
+        status, reused_access_token, reused_refresh_token = RefreshTokenStore.rotate(
+            user.id, refresh_token, new_refresh_token, access_token, expires_at,
+            current_app.config['REFRESH_TOKEN_REUSE_GRACE']
+        )
+        if status == 'rotated':
+            SessionManager.rotate_session(
+                user.id, device_id, RefreshTokenStore.token_id(new_refresh_token), expires_at)
+            return user, access_token, new_refresh_token
+        if status == 'reused':
+            return user, reused_access_token, reused_refresh_token
+        if status == 'reuse_detected':
+            # Повторное использование после ротации: отзываем все сессии пользователя
+            logger.warning("Refresh token reuse detected",
+                           user_id=user.id,
+                           action="token_refresh")
+            AuthService.revoke_all_tokens(user.id)
+        return None
 
     @staticmethod
     def revoke_token(refresh_token):
-        """Отзыв refresh токена"""
-        session_key = f'refresh_token:{refresh_token}'
-        redis_client.delete(session_key)
+        """Отзыв refresh токена и сессии его устройства"""
+        claims = AuthService._decode_refresh_token(refresh_token)
+        if claims:
+            RefreshTokenStore.revoke(claims['sub'], refresh_token)
+            if claims.get('did'):
+                SessionManager.invalidate_session(claims['sub'], claims['did'])
+
+    @staticmethod
+    def revoke_session(user_id, device_id):
+        """Завершение сессии устройства; False, если сессии нет"""
+        session = SessionManager.get_session(user_id, device_id)
+        if not session:
+            return False
+        RefreshTokenStore.revoke_by_id(user_id, session['refresh_token_id'])
+        SessionManager.invalidate_session(user_id, device_id)
+        return True
+
+    @staticmethod
+    def revoke_all_tokens(user_id):
+        """Отзыв всех токенов и сессий пользователя"""
+        RefreshTokenStore.revoke_all(user_id)
+        SessionManager.invalidate_all(user_id)
+        token_revocation.revoke_user(user_id)
+
+    @staticmethod
+    def validate_tokens(tokens):
+        """
+        Пакетная проверка access токенов.
+        Подпись и срок действия проверяются локально, а проверка отзыва
+        выполняется не более чем одним конвейерным запросом к Redis для всего пакета.
+        """
+        results, decoded = AuthService.decode_access_tokens(tokens)
+        revoked = token_revocation.revoked_many([claims for _index, claims in decoded]) if decoded else []
+        return AuthService.apply_revocations(results, decoded, revoked)
+
+    @staticmethod
+    def decode_access_tokens(tokens):
+        """
+        Локальная проверка подписи, срока действия и типа токенов пакета
+
+        Returns:
+            (результаты по токенам, список (индекс, claims) токенов, которые нужно проверить на отзыв)
+        """
+        results = []
+        decoded = []
+        for token in tokens:
+            if not isinstance(token, str) or not token:
+                results.append({"valid": False, "error": "invalid_token"})
+                continue
+            try:
+                claims = decode_token(token)
+            except ExpiredSignatureError:
+                results.append({"valid": False, "error": "token_expired"})
+                continue
+            except InvalidTokenError:
+                results.append({"valid": False, "error": "invalid_token"})
+                continue
+            if claims.get('type') != 'access':
+                results.append({"valid": False, "error": "wrong_token_type"})
+                continue
+            decoded.append((len(results), claims))
+            results.append({"valid": True, "user_id": claims['sub'], "roles": claims.get('roles', [])})
+        return results, decoded
+
+    @staticmethod
+    def apply_revocations(results, decoded, revoked):
+        """Отметка отозванных токенов в результатах пакетной проверки"""
+        for (index, _claims), is_revoked in zip(decoded, revoked):
+            if is_revoked:
+                results[index] = {"valid": False, "error": "token_revoked"}
+        return results
 
     @staticmethod
     def authenticate_user(username, password):
         """Аутентификация пользователя по username и паролю"""
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
-            user.last_login = datetime.now(timezone.utc)
-            db.session.commit()
-            return user
-        return None
+        # Для проверки пароля читаются только id и хеш; неудачный вход не загружает пользователя
+        credentials = User.get_credentials(username)
+        if not credentials or not credentials.password_hash or not password_hasher.verify(password, credentials.password_hash):
+            return None
+        # Время входа пишется в БД фоновым потоком пакетами, а не транзакцией на каждый вход
+        last_login_buffer.record(credentials.id)
+        return User.get_with_roles(credentials.id)
+
+    @staticmethod
+    def authenticate_oauth(identity):
+        """
+        Пользователь для профиля OAuth провайдера (см. OAuthProvider.authenticate).
+        Повторный вход - один INSERT ... ON CONFLICT по (provider, provider_user_id).
+        Первый вход привязывает провайдера к аккаунту с тем же подтвержденным email
+        или создает пользователя. Если email занят и не может быть привязан,
+        поднимается IntegrityError.
+        """
+        provider, provider_user_id = identity['provider'], identity['provider_user_id']
+        # Провайдер может скрыть email; колонка обязательна, поэтому используется
+        # уникальный адрес в зарезервированном домене .invalid
+        email = identity['email'] or f"{provider_user_id}@{provider}.oauth.invalid"
+        values = {
+            'username': identity['username'] or f"{provider}_{provider_user_id}",
+            'email': email,
+            'email_verified': bool(identity['email'] and identity['email_verified']),
+            'full_name': identity['full_name'],
+            'provider': provider,
+            'provider_user_id': provider_user_id,
+            'provider_data': identity['data'],
+        }
+        user_id = None
+        for _attempt in range(3):
+            try:
+                user_id = User.upsert_provider_identity(values)
+                db.session.commit()
+                break
+            except IntegrityError as e:
+                db.session.rollback()
+                field = User.conflicting_field(e)
+                if field == 'email' and values['email_verified']:
+                    user_id = User.link_provider_identity(email, provider, provider_user_id, identity['data'])
+                    if user_id is None:
+                        raise
+                    db.session.commit()
+                    profile_cache.invalidate(user_id)
+                    break
+                if field == 'username' and values['username'] != f"{provider}_{provider_user_id}":
+                    # Логин у провайдера занят локальным пользователем
+                    values['username'] = f"{provider}_{provider_user_id}"
+                    continue
+                raise
+
+        last_login_buffer.record(user_id)
+        return User.get_with_roles(user_id)
+
+    @staticmethod
+    def get_user_profile(user_id):
+        """Сериализованный профиль пользователя из кеша или БД"""
+        def load(user_id):
+            user = User.get_with_roles(int(user_id))
+            return user.to_dict() if user else None
+        return profile_cache.get(user_id, load)
@@ -0,0 +1,36 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Фильтр Блума в памяти процесса.
+    Ложноотрицательных ответов не бывает, ложноположительные возникают
+    с вероятностью около error_rate при заполнении до capacity элементов.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Двойное хеширование: k позиций из двух 64-битных хешей
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,150 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import jsonify, request
+
+# Заголовки, одинаковые для всех ответов своего класса, собираются один раз
+PUBLIC_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+)
+PROTECTED_HEADERS = (
+    ('Access-Control-Allow-Credentials', 'true'),
+    ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Requested-With'),
+)
+SECURITY_HEADERS = (
+    ('Strict-Transport-Security', 'max-age=31536000; includeSubDomains'),
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'SAMEORIGIN'),
+    ('X-XSS-Protection', '1; mode=block'),
+)
+
+
+class _PrefixTrie:
+    """Дерево префиксов пути по сегментам: проверка за O(глубина пути)"""
+
+    def __init__(self, prefixes: Iterable[str]):
+        self._root: Dict[str, dict] = {}
+        for prefix in prefixes:
+            node = self._root
+            for segment in prefix.strip('/').split('/'):
+                node = node.setdefault(segment, {})
+            node[''] = {}
+
+    def matches(self, path: str) -> bool:
+        node = self._root
+        for segment in path.strip('/').split('/'):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if '' in node:
+                return True
+        return False
+
+
+class _CompiledPolicy:
+    """Неизменяемый результат компиляции настроек CORS"""
+
+    def __init__(self, public_endpoints, allowed_origins, max_age, debug):
+        self.public = _PrefixTrie(public_endpoints)
+        self.allow_any_origin = list(allowed_origins) == ['*']
+        self.origins = frozenset(allowed_origins)
+        self.security_headers = () if debug else SECURITY_HEADERS
+        self.preflight_headers = (('Access-Control-Max-Age', str(max_age)),) if max_age else ()
+
+    def origin_allowed(self, origin: Optional[str]) -> bool:
+        return self.allow_any_origin or origin in self.origins
+
+
+class CorsPolicy:
+    """
+    Политика CORS и заголовков безопасности, скомпилированная при старте.
+
+    Публичные эндпоинты хранятся в дереве префиксов, разрешенные origins - во frozenset,
+    наборы заголовков - в готовых кортежах. Preflight запросы отвечаются в WSGI слое
+    до маршрутизации и представлений, с Access-Control-Max-Age для кеширования браузером.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._compiled: Optional[_CompiledPolicy] = None
+        self._sources: Tuple = ()
+
+    def init_app(self, app):
+        self.app = app
+        app.wsgi_app = self._preflight_middleware(app.wsgi_app)
+        app.before_request(self._reject_origin)
+        app.after_request(self._apply_headers)
+
+    def policy(self) -> _CompiledPolicy:
+        """Скомпилированная политика; перекомпилируется, только если настройки заменили"""
+        config = self.app.config
+        sources = (config['CORS_PUBLIC_ENDPOINTS'], config['CORS_ALLOWED_ORIGINS'],
+                   config.get('CORS_MAX_AGE', 0), config.get('DEBUG', False))
+        if self._compiled is None or any(a is not b for a, b in zip(sources, self._sources)):
+            self._compiled = _CompiledPolicy(*sources)
+            self._sources = sources
+        return self._compiled
+
+    def _preflight_middleware(self, wsgi_app):
+        def middleware(environ, start_response):
+            if (environ.get('REQUEST_METHOD') != 'OPTIONS'
+                    or 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' not in environ):
+                return wsgi_app(environ, start_response)
+
+            policy = self.policy()
+            path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+            if policy.public.matches(path):
+                headers = list(PUBLIC_HEADERS + policy.preflight_headers)
+                status = '200 OK'
+            else:
+                origin = environ.get('HTTP_ORIGIN')
+                if policy.origin_allowed(origin):
+                    headers = [('Access-Control-Allow-Origin', origin or ''), ('Vary', 'Origin')]
+                    headers.extend(PROTECTED_HEADERS + policy.preflight_headers)
+                    status = '200 OK'
+                else:
+                    headers, status = [('Vary', 'Origin')], '403 Forbidden'
+            headers.append(('Content-Length', '0'))
+            start_response(status, headers)
+            return [b'']
+        return middleware
+
+    def _reject_origin(self):
+        """Запрос с неразрешенным origin отклоняется до выполнения представления"""
+        origin = request.headers.get('Origin')
+        if origin is None:
+            return None
+        policy = self.policy()
+        if policy.public.matches(request.path) or policy.origin_allowed(origin):
+            return None
+        return jsonify({"error": "Origin is not allowed"}), 403
+
+    def response_headers(self, path: str, origin: Optional[str]) -> Optional[List[Tuple[str, str]]]:
+        """Заголовки CORS и безопасности для ответа; None, если origin не разрешен"""
+        policy = self.policy()
+        if policy.public.matches(path):
+            return list(PUBLIC_HEADERS)
+        headers = []
+        if origin is not None:
+            if not policy.origin_allowed(origin):
+                return None
+            headers.append(('Access-Control-Allow-Origin', origin))
+            headers.append(('Vary', 'Origin'))
+            headers.extend(PROTECTED_HEADERS)
+        headers.extend(policy.security_headers)
+        return headers
+
+    def _apply_headers(self, response):
+        headers = self.response_headers(request.path, request.headers.get('Origin'))
+        if headers is None:
+            response.headers.pop('Access-Control-Allow-Origin', None)
+            response.status_code = 403
+            return response
+        for name, value in headers:
+            if name == 'Vary':
+                response.vary.add(value)
+            else:
+                response.headers[name] = value
+        return response
@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jwt.algorithms import get_default_algorithms
+
+# Алгоритмы подписи и генераторы ключей для них
+_KEY_GENERATORS = {
+    'EdDSA': lambda: ed25519.Ed25519PrivateKey.generate(),
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'RS512': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'PS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+}
+
+
+def is_asymmetric(algorithm: str) -> bool:
+    """Проверка, что алгоритм подписи асимметричный"""
+    return algorithm in _KEY_GENERATORS
+
+
+def _thumbprint(jwk: Dict[str, str]) -> str:
+    """RFC 7638 thumbprint публичного ключа"""
+    required = {'OKP': ('crv', 'kty', 'x'), 'RSA': ('e', 'kty', 'n'), 'EC': ('crv', 'kty', 'x', 'y')}
+    members = {name: jwk[name] for name in required[jwk['kty']]}
+    digest = hashlib.sha256(json.dumps(members, separators=(',', ':'), sort_keys=True).encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+class KeyManager:
+    """
+    Набор асимметричных ключей подписи JWT.
+    Ключи читаются из каталога JWT_KEYS_DIR (один PEM файл на ключ, kid - имя файла),
+    активный ключ задается JWT_ACTIVE_KEY_ID (по умолчанию - последний по имени).
+    Каталог перечитывается не чаще раза в JWT_KEYS_RELOAD_INTERVAL секунд, поэтому
+    ротация не требует перезапуска: новый ключ добавляется в каталог, старый
+    остается опубликованным в JWKS, пока не истекут подписанные им токены.
+    """
+
+    def __init__(self, app=None):
+        self.algorithm = 'EdDSA'
+        self.keys_dir = None
+        self.allow_ephemeral = False
+        self.active_kid_setting = None
+        self.reload_interval = 60
+        self._private_keys: Dict[str, object] = {}
+        self._public_keys: Dict[str, object] = {}
+        # Активная пара (kid, приватный ключ) - один кортеж, заменяемый целиком,
+        # чтобы читатель без блокировки не увидел kid одного ключа и ключ другого
+        self._active: Optional[Tuple[str, object]] = None
+        self._jwks: Dict[str, list] = {'keys': []}
+        self._loaded_at = 0.0
+        self._dir_state = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Загрузка ключей согласно конфигурации приложения"""
+        self.algorithm = app.config['JWT_ALGORITHM']
+        self.keys_dir = app.config.get('JWT_KEYS_DIR')
+        self.allow_ephemeral = app.config.get('JWT_EPHEMERAL_KEY', False)
+        self.active_kid_setting = app.config.get('JWT_ACTIVE_KEY_ID')
+        self.reload_interval = app.config.get('JWT_KEYS_RELOAD_INTERVAL', self.reload_interval)
+        self._dir_state = None
+        self._private_keys = {}
+        self._load()
+
+    def _scan_dir(self):
+        entries = sorted(name for name in os.listdir(self.keys_dir) if name.endswith('.pem'))
+        return tuple((name, os.path.getmtime(os.path.join(self.keys_dir, name))) for name in entries)
+
+    def _load(self):
+        """Чтение ключей из каталога или генерация временного ключа"""
+        if self.keys_dir:
+            state = self._scan_dir()
+            if state == self._dir_state:
+                self._loaded_at = time.monotonic()
+                return
+            private_keys = {}
+            for name, _mtime in state:
+                with open(os.path.join(self.keys_dir, name), 'rb') as key_file:
+                    private_keys[name[:-len('.pem')]] = serialization.load_pem_private_key(
+                        key_file.read(), password=None)
+            self._dir_state = state
+        elif self._private_keys:
+            # Временный ключ уже сгенерирован
+            return
+        elif not self.allow_ephemeral:
+            # Ключ процесса не проверяется другими воркерами и теряется при перезапуске
+            raise RuntimeError("JWT_KEYS_DIR is not set; configure signing keys "
+                               "or set JWT_EPHEMERAL_KEY=true for development")
+        else:
+            # Ключи не настроены (разработка, тесты) - генерируем ключ на время жизни процесса
+            private_key = _KEY_GENERATORS[self.algorithm]()
+            jwk = self._to_jwk(private_key.public_key())
+            private_keys = {_thumbprint(jwk): private_key}
+
+        if not private_keys:
+            raise RuntimeError(f"No JWT signing keys found in {self.keys_dir}")
+        active_kid = self.active_kid_setting or max(private_keys)
+        if active_kid not in private_keys:
+            raise RuntimeError(f"Active JWT key {active_kid} not found")
+
+        public_keys = {kid: key.public_key() for kid, key in private_keys.items()}
+        jwks = {'keys': [
+            dict(self._to_jwk(public_key), kid=kid, alg=self.algorithm, use='sig')
+            for kid, public_key in public_keys.items()
+        ]}
+        with self._lock:
+            self._private_keys = private_keys
+            self._public_keys = public_keys
+            self._active = (active_kid, private_keys[active_kid])
+            self._jwks = jwks
+            self._loaded_at = time.monotonic()
+
+    def _to_jwk(self, public_key) -> Dict[str, str]:
+        return get_default_algorithms()[self.algorithm].to_jwk(public_key, as_dict=True)
+
+    def _maybe_reload(self):
+        if self.keys_dir and time.monotonic() - self._loaded_at >= self.reload_interval:
+            self._load()
+
+    def signing_key(self) -> Tuple[str, object]:
+        """
+        Активный ключ подписи: (kid, приватный ключ). Пара берется один раз на токен -
+        kid заголовка и ключ подписи из разных вызовов могут разойтись при ротации
+        """
+        self._maybe_reload()
+        return self._active
+
+    def public_key(self, kid: Optional[str]):
+        """Публичный ключ по kid; без kid - ключ активной пары"""
+        self._maybe_reload()
+        return self._public_keys.get(kid or self._active[0])
+
+    def jwks(self) -> Dict[str, list]:
+        """Опубликованный набор публичных ключей (JWKS)"""
+        self._maybe_reload()
+        return self._jwks
@@ -0,0 +1,151 @@
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict
+
+from sqlalchemy import DateTime, Integer, column, update, values
+
+from .metrics import registry
+
+flushed_counter = registry.counter(
+    'auth_last_login_flushed_total', 'Записанные в БД отметки времени входа')
+flush_errors_counter = registry.counter(
+    'auth_last_login_flush_errors_total', 'Ошибки записи отметок времени входа')
+pending_gauge = registry.gauge(
+    'auth_last_login_pending', 'Отметки времени входа, ожидающие записи в БД')
+
+
+class LastLoginBuffer:
+    """
+    Отложенная запись времени последнего входа.
+
+    Вход только запоминает время в памяти процесса; фоновый поток раз в
+    flush_interval секунд (или при накоплении batch_size пользователей) пишет
+    все отметки одним UPDATE ... FROM (VALUES ...) и инвалидирует профили.
+    last_login_at отстает от реального времени входа не больше чем на flush_interval.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 5.0
+        self.batch_size = 1000
+        self._pending: Dict[int, datetime] = {}
+        self._condition = threading.Condition()
+        self._worker_pid = None
+        self._worker = None
+        # Поколение настройки: поток записи завершается после повторного init_app
+        self._generation = 0
+        pending_gauge.set_function(lambda: len(self._pending))
+        atexit.register(self._flush_at_exit)
+
+    def init_app(self, app):
+        """Настройка из конфигурации приложения"""
+        self.app = app
+        self.flush_interval = app.config.get('LAST_LOGIN_FLUSH_INTERVAL', self.flush_interval)
+        self.batch_size = app.config.get('LAST_LOGIN_BATCH_SIZE', self.batch_size)
+        with self._condition:
+            self._pending = {}
+            self._generation += 1
+            self._condition.notify_all()
+        self._worker_pid = None
+
+    def record(self, user_id: int) -> None:
+        """Отметка входа пользователя; запись в БД выполняется позже"""
+        with self._condition:
+            self._pending[int(user_id)] = datetime.now(timezone.utc)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        """Запуск фонового потока записи в текущем процессе; при flush_interval=0 запись только по flush()"""
+        pid = os.getpid()
+        if not self.flush_interval or self._worker_pid == pid:
+            return
+        with self._condition:
+            if self._worker_pid != pid:
+                if self._worker_pid is not None:
+                    # Отметки родительского процесса запишет сам родитель
+                    self._pending = {}
+                self._worker = threading.Thread(target=self._run, args=(self._generation,),
+                                                name='last-login-writer', daemon=True)
+                self._worker.start()
+                self._worker_pid = pid
+
+    def stop(self, timeout=None):
+        """
+        Остановка потока записи без записи накопленных отметок (например, перед
+        удалением БД); ожидает завершения текущей записи
+        """
+        with self._condition:
+            self._pending = {}
+            self._generation += 1
+            self._condition.notify_all()
+            worker, self._worker, self._worker_pid = self._worker, None, None
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+
+    def _run(self, generation):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: generation != self._generation or len(self._pending) >= self.batch_size,
+                    self.flush_interval)
+                if generation != self._generation:
+                    return
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                flush_errors_counter.inc()
+
+    def _flush_at_exit(self):
+        if self.app is None or not self._pending:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            pass
+
+    def flush(self) -> int:
+        """
+        Запись накопленных отметок одним запросом (нужен контекст приложения)
+
+        Returns:
+            Количество обновленных пользователей
+        """
+        from app import db, profile_cache
+        from app.models.user import User
+
+        with self._condition:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                logins = values(
+                    column('id', Integer), column('last_login_at', DateTime(timezone=True)), name='logins'
+                ).data(list(pending.items()))
+                db.session.execute(
+                    update(User).where(User.id == logins.c.id).values(last_login_at=logins.c.last_login_at)
+                )
+            else:
+                # Без UPDATE ... FROM (VALUES) (например, SQLite) - пакетное обновление по первичному ключу
+                db.session.execute(update(User), [
+                    {'id': user_id, 'last_login_at': logged_in_at} for user_id, logged_in_at in pending.items()
+                ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Отметки возвращаются в буфер, если за это время не появились более новые
+            with self._condition:
+                for user_id, logged_in_at in pending.items():
+                    self._pending.setdefault(user_id, logged_in_at)
+            raise
+
+        flushed_counter.inc(len(pending))
+        profile_cache.invalidate(*pending)
+        return len(pending)
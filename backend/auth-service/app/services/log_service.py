@@ -1,7 +1,42 @@
+import atexit
+import collections
 import json
+import os
+import random
+import sys
+import threading
 import time
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable, Union
+
+from .metrics import registry
+from .tracing import Span, current_span
+
+records_sent_counter = registry.counter(
+    'auth_log_records_sent_total', 'Записи лога, доставленные в сервис логирования')
+records_dropped_counter = registry.counter(
+    'auth_log_records_dropped_total', 'Отброшенные записи лога по причине', ('reason',))
+records_retried_counter = registry.counter(
+    'auth_log_records_retried_total', 'Записи лога, отправленные повторно после ошибки')
+records_spilled_counter = registry.counter(
+    'auth_log_records_spilled_total', 'Записи лога, сброшенные на диск')
+records_sampled_counter = registry.counter(
+    'auth_log_records_sampled_out_total', 'Записи лога, отброшенные сэмплированием', ('action',))
+settings_errors_counter = registry.counter(
+    'auth_log_settings_errors_total', 'Ошибки обновления настроек логирования')
+buffer_size_gauge = registry.gauge(
+    'auth_log_buffer_records', 'Записи лога в буфере отправки')
+# Настройки уровня и сэмплирования, общие для всех воркеров
+LOG_SETTINGS_KEY = 'log_settings:{}'
+
+# Метаданные: словарь или функция, которая вызывается, только если запись пройдет фильтры
+Metadata = Union[Dict[str, Any], Callable[[], Dict[str, Any]], None]
+
+# Политики переполнения буфера
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+SPILL = 'spill'
+
 
 class LogLevel(Enum):
     DEBUG = 0
@@ -10,19 +45,379 @@ class LogLevel(Enum):
     ERROR = 3
     CRITICAL = 4
 
+
+_DEBUG = LogLevel.DEBUG.value
+
+
+class StdoutTransport:
+    """Вывод пакетов логов в консоль (разработка и тесты)"""
+
+    def send(self, records: List[Dict[str, Any]]) -> None:
+        sys.stdout.write(''.join(f"[LOG] {json.dumps(record)}\n" for record in records))
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        pass
+
+
+def _grpc_modules():
+    """
+    grpclib и модули из backend/log-service/proto/log_service.proto (лежат в proto/,
+    перегенерация - см. README); ImportError, если чего-то нет
+    """
+    from grpclib.client import Channel
+    from proto import log_service_pb2, log_service_grpc
+    return Channel, log_service_pb2, log_service_grpc
+
+
+class GrpcTransport:
+    """
+    Отправка пакетов логов в log-service по постоянному gRPC каналу.
+    Используется только из фонового потока отправки, у которого свой event loop.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        import asyncio
+        Channel, log_service_pb2, log_service_grpc = _grpc_modules()
+
+        self._pb2 = log_service_pb2
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._channel = Channel(host, port)
+        self._stub = log_service_grpc.LogServiceStub(self._channel)
+        self.timeout = timeout
+
+    def _message(self, record: Dict[str, Any]):
+        if 'user_id' in record:
+            record = dict(record, user_id=int(record['user_id']))
+        return self._pb2.LogMessage(**record)
+
+    def send(self, records: List[Dict[str, Any]]) -> None:
+        batch = self._pb2.LogBatch(logs=[self._message(record) for record in records])
+        response = self._loop.run_until_complete(self._stub.SendLogs(batch, timeout=self.timeout))
+        if not response.success:
+            raise RuntimeError(response.error or "log-service rejected the batch")
+
+    def close(self) -> None:
+        self._channel.close()
+        self._loop.close()
+
+
 class LogService:
     """
     Клиент для отправки логов в сервис логирования.
-    Пока что это заглушка, которая будет заменена на реальный GRPC клиент.
+
+    Записи кладутся в ограниченный буфер в памяти и отправляются пакетами
+    из фонового потока: при накоплении batch_size записей или раз в flush_interval.
+    Запрос никогда не ждет сеть; при переполнении буфера или недоступности
+    log-service записи отбрасываются или сбрасываются на диск согласно overflow_policy.
     """
     def __init__(self, service_name: str = "auth-service"):
         self.service_name = service_name
-        # TODO: Инициализация GRPC клиента
-        # self.stub = ...
+        self.transport_name = 'stdout'
+        self.host = 'localhost'
+        self.port = 50051
+        self.buffer_size = 10000
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.overflow_policy = DROP_OLDEST
+        self.spill_path = None
+        self.max_retries = 3
+        self.retry_backoff = 0.5
+        self.timeout = 2.0
+        self.redis = None
+        self.settings_refresh_interval = 10.0
+        self._min_level = LogLevel.DEBUG.value
+        self._sample_rates: Dict[str, float] = {}
+        self._settings_loaded_at = 0.0
+        self._buffer = collections.deque()
+        self._condition = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._transport = None
+        self._worker = None
+        self._worker_pid = None
+        self._inflight = 0
+        self._stopping = False
+        self._flush_requested = False
+        buffer_size_gauge.set_function(lambda: len(self._buffer))
+        atexit.register(self.shutdown)
+
+    def init_app(self, app, redis_client=None):
+        """Настройка из конфигурации приложения; настройки из Redis применяются поверх нее"""
+        self.redis = redis_client
+        self.settings_refresh_interval = app.config.get('LOG_SETTINGS_REFRESH_INTERVAL',
+                                                        self.settings_refresh_interval)
+        self.set_level(app.config.get('LOG_LEVEL', LogLevel.DEBUG.name))
+        self._sample_rates = dict(app.config.get('LOG_SAMPLE_RATES', {}))
+        self._settings_loaded_at = 0.0
+        self.service_name = app.config.get('LOG_SERVICE_NAME', self.service_name)
+        self.transport_name = app.config.get('LOG_TRANSPORT', self.transport_name)
+        self.host = app.config.get('LOG_SERVICE_HOST', self.host)
+        self.port = app.config.get('LOG_SERVICE_PORT', self.port)
+        self.buffer_size = app.config.get('LOG_BUFFER_SIZE', self.buffer_size)
+        self.batch_size = app.config.get('LOG_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('LOG_FLUSH_INTERVAL', self.flush_interval)
+        self.overflow_policy = app.config.get('LOG_OVERFLOW_POLICY', self.overflow_policy)
+        self.spill_path = app.config.get('LOG_SPILL_PATH', self.spill_path)
+        self.max_retries = app.config.get('LOG_SEND_RETRIES', self.max_retries)
+        self.timeout = app.config.get('LOG_SEND_TIMEOUT', self.timeout)
+        if self.overflow_policy == SPILL and not self.spill_path:
+            self.overflow_policy = DROP_OLDEST
+        if self.transport_name == 'grpc':
+            # Без gRPC модулей записи не дошли бы до log-service - не запускаемся,
+            # а не выводим логи молча в консоль
+            try:
+                _grpc_modules()
+            except ImportError as e:
+                raise RuntimeError(f"LOG_TRANSPORT=grpc but the gRPC client is unavailable ({e}); "
+                                   "install requirements.txt or set LOG_TRANSPORT=stdout") from e
 
     def _prepare_metadata(self, metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Подготовка метаданных для отправки"""
-        return json.dumps(metadata or {})
+        """Подготовка метаданных для отправки (в фоновом потоке)"""
+        return json.dumps(metadata or {}, default=str)
+
+    def set_level(self, level: Union[str, LogLevel]) -> None:
+        """Минимальный уровень записей; более низкие отбрасываются до форматирования"""
+        self._min_level = (level if isinstance(level, LogLevel) else LogLevel[str(level).upper()]).value
+
+    def set_sample_rate(self, action: str, rate: Optional[float]) -> None:
+        """Доля сохраняемых DEBUG/INFO записей действия; None - без сэмплирования"""
+        rates = dict(self._sample_rates)
+        if rate is None:
+            rates.pop(action, None)
+        else:
+            rates[action] = min(1.0, max(0.0, float(rate)))
+        # Замена словаря целиком: запросы читают его без блокировки
+        self._sample_rates = rates
+
+    def settings(self) -> Dict[str, Any]:
+        """Текущие уровень и доли сэмплирования"""
+        return {'level': LogLevel(self._min_level).name, 'sampling': dict(self._sample_rates)}
+
+    def update_settings(self, level: Optional[str] = None, sampling: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Изменение настроек без перезапуска: сразу в этом воркере,
+        в остальных - при следующем обновлении из Redis
+        """
+        if level is not None:
+            self.set_level(level)
+        for action, rate in (sampling or {}).items():
+            self.set_sample_rate(action, rate)
+        if self.redis is not None:
+            key = LOG_SETTINGS_KEY.format(self.service_name)
+            pipe = self.redis.pipeline(transaction=False)
+            if level is not None:
+                pipe.hset(key, 'level', LogLevel(self._min_level).name)
+            for action, rate in (sampling or {}).items():
+                if rate is None:
+                    pipe.hdel(key, f'sample:{action}')
+                else:
+                    pipe.hset(key, f'sample:{action}', self._sample_rates[action])
+            pipe.execute()
+        return self.settings()
+
+    def _refresh_settings(self) -> None:
+        """Загрузка общих настроек из Redis (в фоновом потоке)"""
+        if self.redis is None or time.monotonic() - self._settings_loaded_at < self.settings_refresh_interval:
+            return
+        self._settings_loaded_at = time.monotonic()
+        try:
+            stored = self.redis.hgetall(LOG_SETTINGS_KEY.format(self.service_name))
+        except Exception:
+            settings_errors_counter.inc()
+            return
+        if not stored:
+            return
+        stored = {key.decode('utf-8') if isinstance(key, bytes) else key:
+                  value.decode('utf-8') if isinstance(value, bytes) else value
+                  for key, value in stored.items()}
+        try:
+            if 'level' in stored:
+                self.set_level(stored['level'])
+            self._sample_rates = {key[len('sample:'):]: float(value)
+                                  for key, value in stored.items() if key.startswith('sample:')}
+        except (KeyError, ValueError):
+            settings_errors_counter.inc()
+
+    def _ensure_worker(self):
+        """Запуск фонового потока отправки в текущем процессе (в том числе после fork)"""
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            with self._condition:
+                if self._worker_pid != pid:
+                    if self._worker_pid is not None:
+                        # Записи родительского процесса отправит сам родитель
+                        self._buffer.clear()
+                    self._transport = None
+                    self._inflight = 0
+                    self._stopping = False
+                    self._worker = threading.Thread(target=self._run, name='log-sender', daemon=True)
+                    self._worker.start()
+                    self._worker_pid = pid
+
+    def _serialize(self, entry) -> Dict[str, Any]:
+        """Запись для отправки из элемента буфера"""
+        timestamp, level, message, user_id, action, metadata, trace = entry
+        record = {
+            "timestamp": timestamp,
+            "service_name": self.service_name,
+            "level": level,
+            "message": message,
+            "metadata": self._prepare_metadata(metadata),
+        }
+        if user_id is not None:
+            record["user_id"] = user_id
+        if action is not None:
+            record["action"] = action
+        if trace is not None:
+            record["trace_id"], record["span_id"] = trace[0], trace[1]
+            if len(trace) > 2:
+                # Запись о завершенном участке: место в дереве участков и тайминги
+                parent_span_id, record["span_name"], record["span_start_us"], record["span_duration_us"] = trace[2:]
+                if parent_span_id is not None:
+                    record["parent_span_id"] = parent_span_id
+        return record
+
+    def _enqueue(self, record) -> None:
+        self._ensure_worker()
+        spill = None
+        with self._condition:
+            if len(self._buffer) >= self.buffer_size:
+                if self.overflow_policy == DROP_NEWEST:
+                    records_dropped_counter.inc(reason='buffer_full')
+                    return
+                if self.overflow_policy == SPILL:
+                    spill = record
+                else:
+                    self._buffer.popleft()
+                    records_dropped_counter.inc(reason='buffer_full')
+            if spill is None:
+                self._buffer.append(record)
+                if len(self._buffer) >= self.batch_size:
+                    self._condition.notify()
+        if spill is not None:
+            self._spill([self._serialize(spill)])
+
+    def _take_batch(self) -> list:
+        """Ожидание заполнения пакета или истечения интервала и извлечение пакета"""
+        with self._condition:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._buffer) < self.batch_size and not (self._stopping or self._flush_requested):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(len(self._buffer), self.batch_size)
+            self._inflight = count
+            if not self._buffer:
+                self._flush_requested = False
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _make_transport(self):
+        if self.transport_name == 'grpc':
+            return GrpcTransport(self.host, self.port, self.timeout)
+        return StdoutTransport()
+
+    def _get_transport(self):
+        if self._transport is None:
+            self._transport = self._make_transport()
+        return self._transport
+
+    def _send(self, records: List[Dict[str, Any]]) -> bool:
+        """Отправка пакета с повторами; False, если пакет не доставлен"""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                records_retried_counter.inc(len(records))
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                self._get_transport().send(records)
+                records_sent_counter.inc(len(records))
+                return True
+            except Exception:
+                # Канал пересоздается при следующей попытке
+                self._close_transport()
+        return False
+
+    def _close_transport(self):
+        if self._transport is not None:
+            try:
+                self._transport.close()
+            except Exception:
+                pass
+            self._transport = None
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        """Сброс записей на диск в формате JSON Lines"""
+        try:
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as spill_file:
+                spill_file.write(''.join(json.dumps(record) + '\n' for record in records))
+            records_spilled_counter.inc(len(records))
+        except (OSError, TypeError):
+            records_dropped_counter.inc(len(records), reason='spill_failed')
+
+    def _replay_spilled(self) -> None:
+        """Досылка записей, сброшенных на диск, после восстановления связи"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replay_path = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path, encoding='utf-8') as replay_file:
+            records = [json.loads(line) for line in replay_file if line.strip()]
+        os.remove(replay_path)
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            if not self._send(batch):
+                self._spill(records[start:])
+                return
+
+    def _deliver(self, entries: list) -> None:
+        records = [self._serialize(entry) for entry in entries]
+        if self._send(records):
+            if self.overflow_policy == SPILL:
+                self._replay_spilled()
+        elif self.overflow_policy == SPILL:
+            self._spill(records)
+        else:
+            records_dropped_counter.inc(len(records), reason='send_failed')
+
+    def _run(self):
+        """Цикл фонового потока отправки; только он пользуется транспортом"""
+        while True:
+            self._refresh_settings()
+            entries = self._take_batch()
+            if entries:
+                self._deliver(entries)
+            with self._condition:
+                self._inflight = 0
+                self._condition.notify_all()
+                if self._stopping and not self._buffer:
+                    break
+        self._close_transport()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Ожидание отправки всех накопленных записей; False, если не успели за timeout"""
+        if self._worker_pid != os.getpid():
+            return not self._buffer
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._buffer or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Остановка фонового потока с отправкой оставшихся записей"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        worker = self._worker
+        if worker is not None and self._worker_pid == os.getpid():
+            worker.join(timeout)
 
     def send_log(
         self,
@@ -30,37 +425,51 @@ class LogService:
         level: LogLevel,
         user_id: Optional[int] = None,
         action: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Metadata = None,
+        span: Optional[Span] = None,
+        duration_us: Optional[int] = None
     ) -> None:
         """
-        Отправка лога в сервис логирования
-        
+        Постановка лога в очередь отправки в сервис логирования.
+        Уровень и сэмплирование проверяются до любого форматирования,
+        метаданные сериализуются в фоновом потоке при отправке пакета.
+        Запись получает trace_id и span_id текущего участка трассировки.
+
         Args:
             message: Сообщение лога
             level: Уровень логирования
             user_id: ID пользователя (если применимо)
             action: Действие пользователя (если применимо)
-            metadata: Дополнительные метаданные
+            metadata: Дополнительные метаданные или функция, возвращающая их
+            span: Участок трассировки вместо текущего
+            duration_us: Длительность участка; запись о завершенном участке
+                не фильтруется по уровню, ее сэмплирует Tracer на уровне трассы
         """
-        log_data = {
-            "timestamp": int(time.time()),
-            "service_name": self.service_name,
-            "level": level.value,
-            "message": message,
-            "metadata": self._prepare_metadata(metadata),
-        }
-        
-        if user_id is not None:
-            log_data["user_id"] = user_id
-        if action is not None:
-            log_data["action"] = action
+        if duration_us is None:
+            if level.value < self._min_level:
+                return
+            if action is not None and level.value < LogLevel.WARNING.value:
+                rate = self._sample_rates.get(action)
+                if rate is not None and random.random() >= rate:
+                    records_sampled_counter.inc(action=action)
+                    return
+        if callable(metadata):
+            metadata = metadata()
 
-        # TODO: Отправка через GRPC
-        # response = self.stub.SendLog(log_message)
-        # Пока просто выводим в консоль
-        print(f"[LOG] {json.dumps(log_data)}")
+        if span is None:
+            span = current_span()
+        if span is None:
+            trace = None
+        elif duration_us is None:
+            trace = (span.trace_id, span.span_id)
+        else:
+            trace = (span.trace_id, span.span_id, span.parent_span_id, span.name, span.start_us, duration_us)
+        self._enqueue((int(time.time()), level.value, message, user_id, action, metadata, trace))
 
     def debug(self, message: str, **kwargs):
+        # Самый частый случай в рабочем режиме: DEBUG выключен, выходим без вызовов
+        if self._min_level > _DEBUG:
+            return
         self.send_log(message, LogLevel.DEBUG, **kwargs)
 
     def info(self, message: str, **kwargs):
@@ -0,0 +1,344 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Формат выдачи /auth/metrics (текстовый формат Prometheus)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы бакетов гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """Базовый класс метрики с набором меток"""
+    type_name = 'untyped'
+
+    def __init__(self, name: str, description: str = '', labelnames: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, '')) for label in self.labelnames)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    type_name = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(_Metric):
+    """Мгновенное значение; может вычисляться функцией в момент чтения"""
+    type_name = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            return [((), self._function())]
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными бакетами"""
+    type_name = 'histogram'
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: [счетчики по бакетам + inf, сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def samples(self):
+        """Кумулятивные значения бакетов, сумма и количество для каждого набора меток"""
+        with self._lock:
+            result = []
+            for key, (counts, total, count) in self._values.items():
+                cumulative, running = [], 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    running += bucket_count
+                    cumulative.append((bound, running))
+                result.append((key, (cumulative, total, count)))
+            return result
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, description, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, description: str = '', labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str = '', labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, description, labelnames)
+
+    def histogram(self, name: str, description: str = '', labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, labelnames, buckets=buckets)
+
+    def collect(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Значения всех метрик процесса (сериализуемые в JSON) для объединения с другими воркерами"""
+        return {metric.name: {'type': metric.type_name, 'help': metric.description,
+                              'labelnames': list(metric.labelnames),
+                              'samples': [[list(key), value] for key, value in metric.samples()]}
+                for metric in self.collect()}
+
+    def render(self) -> str:
+        """Все метрики процесса в текстовом формате Prometheus"""
+        return render_families(self.snapshot())
+
+
+def render_families(families: Dict[str, dict]) -> str:
+    """Метрики в формате snapshot() в текстовом формате Prometheus"""
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {_escape(family['help'], help_text=True)}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key, value in family['samples']:
+            labels = list(zip(family['labelnames'], key))
+            if family['type'] != 'histogram':
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative, total, count = value
+            for bound, bucket_count in cumulative:
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {bucket_count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def merge_snapshots(snapshots: Iterable[Tuple[Dict[str, dict], bool]]) -> Dict[str, dict]:
+    """
+    Объединение снимков воркеров (snapshot, процесс жив). Счетчики и гистограммы
+    суммируются по всем снимкам, включая завершившиеся воркеры, чтобы суммы не убывали
+    при перезапуске воркера; gauge - только по живым процессам.
+    """
+    merged: Dict[str, dict] = {}
+    for snapshot, alive in snapshots:
+        for name, family in snapshot.items():
+            if family['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(family, samples={}))
+            if target['type'] != family['type']:
+                continue
+            for key, value in family['samples']:
+                key = tuple(key)
+                current = target['samples'].get(key)
+                if family['type'] != 'histogram':
+                    target['samples'][key] = (current or 0) + value
+                elif current is None:
+                    cumulative, total, count = value
+                    target['samples'][key] = [[list(bucket) for bucket in cumulative], total, count]
+                elif [bucket[0] for bucket in current[0]] == [bucket[0] for bucket in value[0]]:
+                    # Бакеты совпадают у воркеров одной версии кода
+                    for bucket, (_bound, running) in zip(current[0], value[0]):
+                        bucket[1] += running
+                    current[1] += value[1]
+                    current[2] += value[2]
+    for family in merged.values():
+        family['samples'] = list(family['samples'].items())
+    return merged
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MultiprocessMetrics:
+    """
+    Метрики всех воркеров сервера в одном ответе /auth/metrics.
+
+    Без METRICS_MULTIPROC_DIR отдается реестр принявшего запрос процесса. С каталогом
+    каждый воркер раз в METRICS_SNAPSHOT_INTERVAL секунд (и при выходе) записывает снимок
+    своего реестра в файл <pid>-<время запуска>.json, а ответ на запрос собирается из всех
+    файлов: ряды не зависят от того, какой воркер принял запрос скрапера, и rate() не видит
+    ложных сбросов. Каталог очищается при старте сервера (gunicorn.conf.py).
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.directory = None
+        self.interval = 5.0
+        self._path = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        atexit.register(self._write_at_exit)
+
+    def init_app(self, app):
+        """Настройка из конфигурации приложения"""
+        self.directory = app.config.get('METRICS_MULTIPROC_DIR')
+        self.interval = app.config.get('METRICS_SNAPSHOT_INTERVAL', self.interval)
+        self._path = None
+        self._worker_pid = None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            app.before_request(self.start)
+
+    def start(self) -> None:
+        """Запуск записи снимков в текущем процессе (в каждом воркере после fork)"""
+        pid = os.getpid()
+        if not self.directory or self._worker_pid == pid:
+            return
+        with self._lock:
+            if self._worker_pid == pid:
+                return
+            self._path = os.path.join(self.directory, f'{pid}-{time.time_ns()}.json')
+            self._worker_pid = pid
+            threading.Thread(target=self._run, args=(self._path,),
+                             name='metrics-snapshot', daemon=True).start()
+
+    def _run(self, path):
+        # Поток завершается после повторного init_app или смены процесса
+        while self._path == path:
+            try:
+                self.write()
+            except OSError:
+                pass
+            time.sleep(self.interval)
+
+    def write(self) -> None:
+        """Атомарная запись снимка реестра этого процесса"""
+        with self._lock:
+            path = self._path
+            if path is None or self._worker_pid != os.getpid():
+                return
+            with open(f'{path}.tmp', 'w') as snapshot_file:
+                json.dump(self.registry.snapshot(), snapshot_file)
+            os.replace(f'{path}.tmp', path)
+
+    def _write_at_exit(self):
+        try:
+            self.write()
+        except OSError:
+            pass
+
+    def render(self) -> str:
+        """Метрики процесса или, с каталогом снимков, сумма по всем воркерам"""
+        if not self.directory:
+            return self.registry.render()
+        self.start()
+        self.write()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+            except (OSError, ValueError):
+                # Файл удален при очистке каталога
+                continue
+            snapshots.append((snapshot, _alive(int(name.split('-', 1)[0]))))
+        return render_families(merge_snapshots(snapshots))
+
+
+def _escape(value: str, help_text: bool = False) -> str:
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    return value if help_text else value.replace('"', '\\"')
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels) + '}'
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    if value != value or value in (float('inf'), float('-inf')):
+        return {'nan': 'NaN', 'inf': '+Inf', '-inf': '-Inf'}[repr(value)]
+    return repr(value)
+
+
+registry = MetricsRegistry()
+multiprocess_metrics = MultiprocessMetrics(registry)
@@ -0,0 +1,224 @@
+import abc
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import registry
+from .tracing import Tracer
+
+request_duration_histogram = registry.histogram(
+    'auth_oauth_request_duration_seconds', 'Время запроса к OAuth провайдеру', ('provider', 'operation'),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+request_errors_counter = registry.counter(
+    'auth_oauth_request_errors_total', 'Ошибки запросов к OAuth провайдерам', ('provider', 'operation'))
+
+
+class OAuthProviderError(Exception):
+    """Провайдер отклонил код авторизации или не ответил вовремя"""
+
+    def __init__(self, provider: str, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.provider = provider
+        self.message = message
+        self.status_code = status_code
+
+
+class OAuthProvider(abc.ABC):
+    """
+    Базовый провайдер: обмен кода на токен и чтение профиля.
+    Адреса и учетные данные вычисляются один раз при init_app.
+    """
+    name = None
+
+    def __init__(self, client: 'OAuthProviders', client_id: str, client_secret: str,
+                 oauth_url: str, api_url: str):
+        self.client = client
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.oauth_url = oauth_url.rstrip('/')
+        self.api_url = api_url.rstrip('/')
+
+    def _request(self, operation: str, method: str, url: str, **kwargs) -> Any:
+        """HTTP запрос через общий пул соединений с таймаутами; тело ответа в JSON"""
+        started_at = time.perf_counter()
+        try:
+            with self.client.tracer.span(f'{self.name} {operation}') as span:
+                # Провайдер, поддерживающий W3C Trace Context, продолжит трассу
+                kwargs['headers'] = {**kwargs.get('headers', {}), **span.headers()}
+                response = self.client.session().request(method, url, timeout=self.client.timeout, **kwargs)
+            if response.status_code >= 400:
+                raise OAuthProviderError(self.name, f"{operation} failed with HTTP {response.status_code}",
+                                         400 if response.status_code in (400, 401) else 502)
+            return response.json()
+        except requests.Timeout:
+            request_errors_counter.inc(provider=self.name, operation=operation)
+            raise OAuthProviderError(self.name, f"{operation} timed out", 504)
+        except (requests.RequestException, ValueError):
+            request_errors_counter.inc(provider=self.name, operation=operation)
+            raise OAuthProviderError(self.name, f"{operation} failed")
+        except OAuthProviderError:
+            request_errors_counter.inc(provider=self.name, operation=operation)
+            raise
+        finally:
+            request_duration_histogram.observe(time.perf_counter() - started_at,
+                                               provider=self.name, operation=operation)
+
+    @abc.abstractmethod
+    def exchange_code(self, code: str, redirect_uri: Optional[str] = None) -> str:
+        """Обмен кода авторизации на access токен провайдера"""
+
+    @abc.abstractmethod
+    def fetch_identity(self, access_token: str) -> Dict[str, Any]:
+        """Профиль пользователя по access токену провайдера"""
+
+    def _user_id(self, user: Any) -> str:
+        """Идентификатор пользователя из ответа провайдера"""
+        user_id = user.get('id') if isinstance(user, dict) else None
+        if user_id is None or user_id == '':
+            raise OAuthProviderError(self.name, "profile response has no user id")
+        return str(user_id)
+
+    def authenticate(self, code: str, redirect_uri: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Профиль пользователя провайдера по коду авторизации
+
+        Returns:
+            provider, provider_user_id, username, email, email_verified, full_name, data
+        """
+        return self.fetch_identity(self.exchange_code(code, redirect_uri))
+
+
+class GitHubProvider(OAuthProvider):
+    name = 'github'
+
+    def exchange_code(self, code, redirect_uri=None):
+        payload = {'client_id': self.client_id, 'client_secret': self.client_secret, 'code': code}
+        if redirect_uri:
+            payload['redirect_uri'] = redirect_uri
+        data = self._request('token', 'POST', f'{self.oauth_url}/login/oauth/access_token',
+                             data=payload, headers={'Accept': 'application/json'})
+        if not data.get('access_token'):
+            # GitHub отвечает 200 с полем error на неверный или использованный код
+            raise OAuthProviderError(self.name, data.get('error', 'Invalid authorization code'), 400)
+        return data['access_token']
+
+    def fetch_identity(self, access_token):
+        headers = {'Authorization': f'Bearer {access_token}', 'Accept': 'application/vnd.github+json'}
+        # Профиль и список email запрашиваются параллельно
+        emails_future = self.client.executor().submit(
+            contextvars.copy_context().run, self._fetch_emails, f'{self.api_url}/user/emails', headers)
+        user = self._request('profile', 'GET', f'{self.api_url}/user', headers=headers)
+        emails = emails_future.result()
+
+        primary = next((item for item in emails if item.get('primary') and item.get('verified')), None)
+        email = primary['email'] if primary else user.get('email')
+        return {
+            'provider': self.name,
+            'provider_user_id': self._user_id(user),
+            'username': user.get('login'),
+            'email': email,
+            'email_verified': primary is not None,
+            'full_name': user.get('name'),
+            'data': {key: user.get(key) for key in ('login', 'avatar_url', 'html_url')},
+        }
+
+    def _fetch_emails(self, url, headers):
+        # Без scope user:email список недоступен - остается публичный email профиля
+        try:
+            emails = self._request('emails', 'GET', url, headers=headers)
+        except OAuthProviderError:
+            return []
+        return emails if isinstance(emails, list) else []
+
+
+class YandexProvider(OAuthProvider):
+    name = 'yandex'
+
+    def exchange_code(self, code, redirect_uri=None):
+        payload = {'grant_type': 'authorization_code', 'code': code,
+                   'client_id': self.client_id, 'client_secret': self.client_secret}
+        data = self._request('token', 'POST', f'{self.oauth_url}/token', data=payload)
+        if not data.get('access_token'):
+            raise OAuthProviderError(self.name, data.get('error', 'Invalid authorization code'), 400)
+        return data['access_token']
+
+    def fetch_identity(self, access_token):
+        # Яндекс отдает профиль и подтвержденные email одним запросом
+        user = self._request('profile', 'GET', f'{self.api_url}/info',
+                             params={'format': 'json'}, headers={'Authorization': f'OAuth {access_token}'})
+        email = user.get('default_email') or next(iter(user.get('emails') or []), None)
+        return {
+            'provider': self.name,
+            'provider_user_id': self._user_id(user),
+            'username': user.get('login'),
+            'email': email,
+            'email_verified': email is not None,
+            'full_name': user.get('real_name') or user.get('display_name'),
+            'data': {key: user.get(key) for key in ('login', 'display_name', 'default_avatar_id')},
+        }
+
+
+class OAuthProviders:
+    """
+    Реестр OAuth провайдеров с общим пулом HTTP соединений.
+
+    Сессия requests с keep-alive и пул потоков для параллельных запросов
+    создаются лениво в каждом процессе (в том числе после fork). Все запросы
+    ограничены таймаутами на подключение и чтение.
+    """
+
+    def __init__(self):
+        self.timeout = (2.0, 5.0)
+        self.pool_size = 20
+        self._providers: Dict[str, OAuthProvider] = {}
+        self._session = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.tracer = Tracer()
+
+    def init_app(self, app, tracer: Optional[Tracer] = None):
+        """Настройка провайдеров из конфигурации приложения"""
+        config = app.config
+        if tracer is not None:
+            self.tracer = tracer
+        self.timeout = (config.get('OAUTH_CONNECT_TIMEOUT', 2.0), config.get('OAUTH_READ_TIMEOUT', 5.0))
+        self.pool_size = config.get('OAUTH_POOL_SIZE', self.pool_size)
+        self._providers = {}
+        for provider_cls, prefix in ((GitHubProvider, 'GITHUB'), (YandexProvider, 'YANDEX')):
+            if config.get(f'{prefix}_CLIENT_ID'):
+                self._providers[provider_cls.name] = provider_cls(
+                    self, config[f'{prefix}_CLIENT_ID'], config.get(f'{prefix}_CLIENT_SECRET'),
+                    config[f'{prefix}_OAUTH_URL'], config[f'{prefix}_API_URL'])
+        self._pid = None
+
+    def get(self, name: str) -> Optional[OAuthProvider]:
+        """Настроенный провайдер по имени или None"""
+        return self._providers.get(name)
+
+    def _ensure_clients(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=len(self._providers) * 2 or 1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='oauth')
+                    self._pid = pid
+
+    def session(self) -> requests.Session:
+        self._ensure_clients()
+        return self._session
+
+    def executor(self) -> ThreadPoolExecutor:
+        self._ensure_clients()
+        return self._executor
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import bcrypt
+
+from .metrics import registry
+
+queue_depth_gauge = registry.gauge(
+    'auth_bcrypt_queue_depth', 'Операции bcrypt, ожидающие свободного воркера')
+in_flight_gauge = registry.gauge(
+    'auth_bcrypt_in_flight', 'Операции bcrypt в очереди и в работе')
+wait_time_histogram = registry.histogram(
+    'auth_bcrypt_queue_wait_seconds', 'Время ожидания операции bcrypt в очереди', ('operation',))
+duration_histogram = registry.histogram(
+    'auth_bcrypt_duration_seconds', 'Полное время операции bcrypt', ('operation',))
+rejected_counter = registry.counter(
+    'auth_bcrypt_rejected_total', 'Операции bcrypt, отклоненные из-за переполнения очереди', ('operation',))
+
+
+class HashingPoolBusy(Exception):
+    """Очередь хеширования переполнена или ответ не получен вовремя"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Password hashing pool is busy")
+        self.retry_after = retry_after
+
+
+def _hash_password(password: bytes, rounds: int):
+    """Хеширование в воркере; возвращает хеш и момент начала работы"""
+    started_at = time.time()
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)), started_at
+
+
+def _check_password(password: bytes, password_hash: bytes):
+    """Проверка пароля в воркере; возвращает результат и момент начала работы"""
+    started_at = time.time()
+    return bcrypt.checkpw(password, password_hash), started_at
+
+
+class PasswordHasher:
+    """
+    Выделенный пул для bcrypt с ограниченной очередью.
+    Хеширование выполняется вне потоков обработки запросов, а при
+    переполнении очереди запрос сразу отклоняется (HashingPoolBusy -> 503).
+    """
+
+    def __init__(self, app=None):
+        self.log_rounds = 12
+        self.pool_size = os.cpu_count() or 1
+        self.queue_size = 64
+        self.timeout = 5.0
+        self.executor_type = 'process'
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        queue_depth_gauge.set_function(self.queue_depth)
+        in_flight_gauge.set_function(lambda: self._in_flight)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Чтение настроек пула из конфигурации приложения"""
+        self.log_rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.log_rounds)
+        self.pool_size = app.config.get('BCRYPT_POOL_SIZE') or self.pool_size
+        self.queue_size = app.config.get('BCRYPT_QUEUE_SIZE', self.queue_size)
+        self.timeout = app.config.get('BCRYPT_QUEUE_TIMEOUT', self.timeout)
+        self.executor_type = app.config.get('BCRYPT_EXECUTOR', self.executor_type)
+        self.shutdown()
+
+    def _get_executor(self):
+        """Ленивое создание пула; после fork пул пересоздается в дочернем процессе"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    executor_cls = ProcessPoolExecutor if self.executor_type == 'process' else ThreadPoolExecutor
+                    self._executor = executor_cls(max_workers=self.pool_size)
+                    self._executor_pid = pid
+                    self._slots = threading.BoundedSemaphore(self.pool_size + self.queue_size)
+                    self._in_flight = 0
+        return self._executor
+
+    def queue_depth(self) -> int:
+        """Количество операций, ожидающих свободного воркера"""
+        return max(0, self._in_flight - self.pool_size)
+
+    def _release(self, slots):
+        with self._lock:
+            if slots is self._slots:
+                self._in_flight -= 1
+        slots.release()
+
+    def _run(self, operation: str, func, *args):
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            rejected_counter.inc(operation=operation)
+            raise HashingPoolBusy()
+        with self._lock:
+            self._in_flight += 1
+
+        submitted_at = time.time()
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            self._release(slots)
+            raise
+        future.add_done_callback(lambda _future: self._release(slots))
+
+        try:
+            result, started_at = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            rejected_counter.inc(operation=operation)
+            raise HashingPoolBusy()
+
+        wait_time_histogram.observe(max(0.0, started_at - submitted_at), operation=operation)
+        duration_histogram.observe(time.time() - submitted_at, operation=operation)
+        return result
+
+    def hash(self, password: str) -> str:
+        """Хеширование пароля"""
+        password_hash = self._run('hash', _hash_password, password.encode('utf-8'), self.log_rounds)
+        return password_hash.decode('utf-8')
+
+    def verify(self, password: str, password_hash: Optional[str]) -> bool:
+        """Проверка пароля по хешу"""
+        if not password_hash:
+            return False
+        return self._run('verify', _check_password, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def shutdown(self, wait: bool = False):
+        """Остановка пула"""
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            self._executor_pid = None
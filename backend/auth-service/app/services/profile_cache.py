@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import registry
+
+# Ключ сериализованного профиля, счетчик его инвалидаций (в том же слоте кластера)
+# и канал инвалидации между воркерами
+PROFILE_KEY = 'user_profile:{{{}}}'
+VERSION_KEY = 'user_profile_version:{{{}}}'
+PROFILE_CHANNEL = 'user_profile_invalidations'
+
+# Запись загруженного профиля, только если с начала загрузки не было инвалидации:
+# иначе профиль, прочитанный из БД до изменения ролей, прожил бы в кеше весь TTL
+_SET_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3], 'NX') and 1 or 0
+"""
+
+cache_requests_counter = registry.counter(
+    'auth_profile_cache_requests_total', 'Обращения к кешу профилей по уровню и результату', ('level', 'result'))
+cache_size_gauge = registry.gauge(
+    'auth_profile_cache_local_entries', 'Количество профилей в локальном кеше воркера')
+cache_errors_counter = registry.counter(
+    'auth_profile_cache_errors_total', 'Ошибки кеша профилей', ('operation',))
+
+
+class ProfileCache:
+    """
+    Двухуровневый кеш сериализованных профилей пользователей.
+
+    Первый уровень - LRU в памяти воркера с коротким TTL, второй - Redis.
+    Изменения профиля явно инвалидируют оба уровня: ключ в Redis удаляется,
+    а остальные воркеры получают id пользователей через pub/sub. Пока подписка
+    не работает, локальный уровень не используется.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self._set_script = None
+        self.enabled = True
+        self.ttl = 300
+        self.local_size = 10000
+        self.local_ttl = 30
+        self._local: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._version = 0
+        self._ready = threading.Event()
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        cache_size_gauge.set_function(lambda: len(self._local))
+
+    def init_app(self, app, redis_client):
+        """Настройка из конфигурации приложения"""
+        self.redis = redis_client
+        self._set_script = redis_client.register_script(_SET_SCRIPT)
+        self.enabled = app.config.get('PROFILE_CACHE_ENABLED', self.enabled)
+        self.ttl = app.config.get('PROFILE_CACHE_TTL', self.ttl)
+        self.local_size = app.config.get('PROFILE_CACHE_LOCAL_SIZE', self.local_size)
+        self.local_ttl = app.config.get('PROFILE_CACHE_LOCAL_TTL', self.local_ttl)
+        with self._lock:
+            self._local.clear()
+        self._ready = threading.Event()
+        self._listener_pid = None
+
+    def _local_ready(self) -> bool:
+        """Запуск подписки на инвалидации в текущем процессе; True, если локальному уровню можно доверять"""
+        if not self.local_size:
+            return False
+        pid = os.getpid()
+        if self._listener_pid != pid:
+            with self._lock:
+                if self._listener_pid != pid:
+                    self._local.clear()
+                    self._ready = threading.Event()
+                    threading.Thread(target=self._listen, name='profile-cache-sync', daemon=True).start()
+                    self._listener_pid = pid
+        return self._ready.is_set()
+
+    def _listen(self):
+        """Фоновая подписка на инвалидации; при сбое локальный уровень очищается"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(PROFILE_CHANNEL)
+                self._ready.set()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        data = message['data']
+                        self._drop_local((data.decode('utf-8') if isinstance(data, bytes) else data).split(','))
+            except Exception:
+                # Пропущенные инвалидации недопустимы: без подписки локальный уровень отключается
+                self._ready.clear()
+                self._drop_local(None)
+                cache_errors_counter.inc(operation='sync')
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _drop_local(self, user_ids):
+        """Удаление профилей из локального уровня; None - очистка целиком"""
+        with self._lock:
+            self._version += 1
+            if user_ids is None:
+                self._local.clear()
+                return
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+
+    def _get_local(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, profile = entry
+            if expires_at <= time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return profile
+
+    def _set_local(self, user_id: str, profile: Dict[str, Any], version: int):
+        with self._lock:
+            # Профиль, прочитанный до инвалидации, не должен попасть в кеш после нее
+            if version != self._version:
+                return
+            self._local[user_id] = (time.monotonic() + self.local_ttl, profile)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def get(self, user_id, loader: Callable[[Any], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Получение профиля пользователя из кеша или через loader
+
+        Args:
+            user_id: Идентификатор пользователя
+            loader: Функция loader(user_id), возвращающая сериализованный профиль или None
+
+        Returns:
+            Профиль пользователя или None, если пользователь не найден
+        """
+        if not self.enabled:
+            return loader(user_id)
+
+        user_id = str(user_id)
+        use_local = self._local_ready()
+        version = self._version
+        if use_local:
+            profile = self._get_local(user_id)
+            if profile is not None:
+                cache_requests_counter.inc(level='local', result='hit')
+                return profile
+            cache_requests_counter.inc(level='local', result='miss')
+
+        try:
+            # Версия читается до загрузки из БД и сверяется при записи
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(PROFILE_KEY.format(user_id))
+            pipe.get(VERSION_KEY.format(user_id))
+            cached, redis_version = pipe.execute()
+        except Exception:
+            # Недоступность Redis не должна ломать чтение профиля
+            cache_errors_counter.inc(operation='get')
+            cached = redis_version = None
+        if cached is not None:
+            cache_requests_counter.inc(level='redis', result='hit')
+            profile = json.loads(cached)
+        else:
+            cache_requests_counter.inc(level='redis', result='miss')
+            profile = loader(user_id)
+            if profile is None:
+                return None
+            try:
+                # NX: не перезаписываем профиль, уже сохраненный параллельным запросом
+                self._set_script(keys=[PROFILE_KEY.format(user_id), VERSION_KEY.format(user_id)],
+                                 args=[redis_version or '0', json.dumps(profile), self.ttl])
+            except Exception:
+                cache_errors_counter.inc(operation='set')
+
+        if use_local:
+            self._set_local(user_id, profile, version)
+        return profile
+
+    async def get_async(self, user_id, loader: Callable[[Any], Awaitable[Optional[Dict[str, Any]]]],
+                        redis) -> Optional[Dict[str, Any]]:
+        """То же, что get, через асинхронный клиент Redis и асинхронный loader (ASGI режим)"""
+        if not self.enabled:
+            return await loader(user_id)
+
+        user_id = str(user_id)
+        use_local = self._local_ready()
+        version = self._version
+        if use_local:
+            profile = self._get_local(user_id)
+            if profile is not None:
+                cache_requests_counter.inc(level='local', result='hit')
+                return profile
+            cache_requests_counter.inc(level='local', result='miss')
+
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.get(PROFILE_KEY.format(user_id))
+            pipe.get(VERSION_KEY.format(user_id))
+            cached, redis_version = await pipe.execute()
+        except Exception:
+            cache_errors_counter.inc(operation='get')
+            cached = redis_version = None
+        if cached is not None:
+            cache_requests_counter.inc(level='redis', result='hit')
+            profile = json.loads(cached)
+        else:
+            cache_requests_counter.inc(level='redis', result='miss')
+            profile = await loader(user_id)
+            if profile is None:
+                return None
+            try:
+                await redis.eval(_SET_SCRIPT, 2, PROFILE_KEY.format(user_id), VERSION_KEY.format(user_id),
+                                 redis_version or '0', json.dumps(profile), self.ttl)
+            except Exception:
+                cache_errors_counter.inc(operation='set')
+
+        if use_local:
+            self._set_local(user_id, profile, version)
+        return profile
+
+    def invalidate(self, *user_ids, chunk_size: int = 500) -> None:
+        """Инвалидация профилей во всех воркерах после изменения данных пользователей"""
+        user_ids = [str(user_id) for user_id in user_ids if user_id is not None]
+        if not user_ids or not self.enabled:
+            return
+        self._drop_local(user_ids)
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            pipe = self.redis.pipeline(transaction=False)
+            # По команде на ключ: ключи разных пользователей могут быть в разных слотах кластера.
+            # Версия увеличивается до удаления, чтобы загрузка, начатая раньше, не записала профиль
+            for user_id in chunk:
+                pipe.incr(VERSION_KEY.format(user_id))
+                pipe.expire(VERSION_KEY.format(user_id), self.ttl)
+                pipe.delete(PROFILE_KEY.format(user_id))
+            pipe.publish(PROFILE_CHANNEL, ','.join(chunk))
+            pipe.execute()
@@ -0,0 +1,271 @@
+import collections
+import json
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from flask import g, request
+
+from .metrics import registry
+
+samples_counter = registry.counter(
+    'auth_profiler_samples_total', 'Снятые профилировщиком стеки')
+overhead_histogram = registry.histogram(
+    'auth_profiler_sample_duration_seconds', 'Время одного снятия стеков',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+errors_counter = registry.counter(
+    'auth_profiler_errors_total', 'Ошибки обмена профилировщика с Redis')
+
+SESSION_KEY = 'profiler:session'
+LAST_SESSION_KEY = 'profiler:last_session'
+STACKS_KEY = 'profiler:stacks:{}'
+
+
+class SamplingProfiler:
+    """
+    Статистический профилировщик запросов по требованию.
+
+    Сессия профилирования хранится в Redis с TTL, равным ее длительности, поэтому
+    включается во всех воркерах (не позже чем через refresh_interval) и выключается
+    сама. Пока сессия активна, фоновый поток воркера периодически снимает стеки
+    потоков, обслуживающих отслеживаемые запросы: все запросы окна или только
+    запросы с заголовком header и токеном сессии. Стеки сворачиваются в формат
+    collapsed stacks ("маршрут;кадр;кадр N") и суммируются в Redis по всем воркерам.
+
+    Доля времени на снятие стеков ограничена max_overhead: после дорогого снятия
+    пауза увеличивается. Вне сессии запрос стоит одного сравнения времени.
+
+    Запросы Flask отслеживаются в своих потоках; эндпоинты ASGI режима, обслуживаемые
+    в цикле событий (app/asgi.py), - через track_async: снимается стек потока цикла.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.header = 'X-Profile-Token'
+        self.interval = 0.01
+        self.max_duration = 300
+        self.max_overhead = 0.02
+        self.max_stacks = 5000
+        self.max_depth = 64
+        self.result_ttl = 3600
+        self.refresh_interval = 1.0
+        self._session: Optional[Dict[str, Any]] = None
+        self._session_loaded_at = float('-inf')
+        # Отслеживаемый запрос -> (поток, который его обслуживает, маршрут)
+        self._active: Dict[object, Tuple[int, str]] = {}
+        self._counts = collections.Counter()
+        self._counts_session_id = None
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self._worker_running = False
+
+    def init_app(self, app, redis_client):
+        """Настройка из конфигурации и подключение к запросам приложения"""
+        self.redis = redis_client
+        self.header = app.config.get('PROFILER_HEADER', self.header)
+        self.interval = app.config.get('PROFILER_INTERVAL', self.interval)
+        self.max_duration = app.config.get('PROFILER_MAX_DURATION', self.max_duration)
+        self.max_overhead = app.config.get('PROFILER_MAX_OVERHEAD', self.max_overhead)
+        self.max_stacks = app.config.get('PROFILER_MAX_STACKS', self.max_stacks)
+        self.result_ttl = app.config.get('PROFILER_RESULT_TTL', self.result_ttl)
+        self.refresh_interval = app.config.get('PROFILER_REFRESH_INTERVAL', self.refresh_interval)
+        self._session = None
+        self._session_loaded_at = float('-inf')
+        self._active = {}
+        with self._lock:
+            self._counts.clear()
+
+        app.before_request(self._start_request)
+        app.teardown_request(self._end_request)
+
+    def _start_request(self):
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g._profiler_key = self._track(self.current_session(), f'{request.method} {route}',
+                                      request.headers.get(self.header))
+
+    def _end_request(self, exception=None):
+        self.untrack(g.pop('_profiler_key', None))
+
+    def _track(self, session, route: str, token: Optional[str]) -> Optional[object]:
+        if session is None:
+            return None
+        if session.get('token') and token != session['token']:
+            return None
+        key = object()
+        self._active[key] = (threading.get_ident(), route)
+        self._ensure_worker()
+        return key
+
+    async def track_async(self, route: str, token: Optional[str], redis) -> Optional[object]:
+        """
+        Отслеживание запроса, обслуживаемого в цикле событий: сессия читается асинхронным
+        клиентом Redis, снимается стек потока цикла. Ключ для untrack() или None
+        """
+        return self._track(await self.current_session_async(redis), route, token)
+
+    def untrack(self, key: Optional[object]) -> None:
+        if key is not None:
+            self._active.pop(key, None)
+
+    def _refresh_due(self) -> bool:
+        now = time.monotonic()
+        if now - self._session_loaded_at < self.refresh_interval:
+            return False
+        self._session_loaded_at = now
+        return True
+
+    def _loaded_session(self) -> Optional[Dict[str, Any]]:
+        session = self._session
+        if session is not None and time.time() >= session['until']:
+            return None
+        return session
+
+    def current_session(self) -> Optional[Dict[str, Any]]:
+        """Активная сессия; из Redis перечитывается не чаще раза в refresh_interval"""
+        if self._refresh_due():
+            try:
+                stored = self.redis.get(SESSION_KEY)
+                self._session = json.loads(stored) if stored else None
+            except Exception:
+                errors_counter.inc()
+        return self._loaded_session()
+
+    async def current_session_async(self, redis) -> Optional[Dict[str, Any]]:
+        """То же, что current_session, через асинхронный клиент Redis (без блокировки цикла событий)"""
+        if self._refresh_due():
+            try:
+                stored = await redis.get(SESSION_KEY)
+                self._session = json.loads(stored) if stored else None
+            except Exception:
+                errors_counter.inc()
+        return self._loaded_session()
+
+    def start(self, duration: float, header_only: bool = False, interval: Optional[float] = None) -> Dict[str, Any]:
+        """Включение профилирования во всех воркерах на duration секунд (не больше max_duration)"""
+        duration = max(0.1, min(float(duration), self.max_duration))
+        session = {
+            'id': secrets.token_hex(8),
+            'token': secrets.token_urlsafe(16) if header_only else None,
+            'interval': max(0.001, float(interval or self.interval)),
+            'until': time.time() + duration,
+        }
+        # Ключи в разных слотах Redis Cluster, поэтому без MULTI
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(SESSION_KEY, json.dumps(session), px=math.ceil(duration * 1000))
+        pipe.set(LAST_SESSION_KEY, session['id'], ex=self.result_ttl)
+        pipe.execute()
+        self._session, self._session_loaded_at = session, time.monotonic()
+        return session
+
+    def stop(self) -> None:
+        """Досрочное выключение; остальные воркеры остановятся при следующем чтении сессии"""
+        self.redis.delete(SESSION_KEY)
+        self._session, self._session_loaded_at = None, time.monotonic()
+
+    def profile(self, session_id: Optional[str] = None) -> Optional[str]:
+        """
+        Профиль сессии (по умолчанию последней) в формате collapsed stacks,
+        который читают flamegraph.pl, speedscope и inferno; None, если профиля нет
+        """
+        self._flush()
+        if session_id is None:
+            session_id = self.redis.get(LAST_SESSION_KEY)
+            if session_id is None:
+                return None
+            session_id = session_id.decode() if isinstance(session_id, bytes) else session_id
+        stacks = self.redis.hgetall(STACKS_KEY.format(session_id))
+        if not stacks:
+            return None
+        lines = sorted(((stack.decode() if isinstance(stack, bytes) else stack, int(count))
+                        for stack, count in stacks.items()), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in lines)
+
+    def _ensure_worker(self):
+        """Запуск потока снятия стеков в текущем процессе на время сессии"""
+        pid = os.getpid()
+        if self._worker_running and self._worker_pid == pid:
+            return
+        with self._lock:
+            if self._worker_running and self._worker_pid == pid:
+                return
+            if self._worker_pid != pid:
+                # Стеки родительского процесса не относятся к этому воркеру
+                self._counts.clear()
+            self._worker_running, self._worker_pid = True, pid
+        threading.Thread(target=self._run, name='profiler-sampler', daemon=True).start()
+
+    def _run(self):
+        session = self._session
+        flushed_at = time.monotonic()
+        try:
+            while session is not None and time.time() < session['until']:
+                started_at = time.perf_counter()
+                self._sample(session['id'])
+                cost = time.perf_counter() - started_at
+                overhead_histogram.observe(cost)
+                # Не больше max_overhead времени процесса на снятие стеков
+                time.sleep(max(session['interval'], cost / self.max_overhead))
+                if time.monotonic() - flushed_at >= 1.0:
+                    self._flush()
+                    flushed_at = time.monotonic()
+                current = self.current_session()
+                if current is None or current['id'] != session['id']:
+                    # Стеки прежней сессии не смешиваются с новой
+                    self._flush()
+                    session = current
+        finally:
+            self._flush()
+            with self._lock:
+                self._worker_running = False
+
+    def _sample(self, session_id: str) -> None:
+        """Снятие стеков отслеживаемых потоков (кроме самого потока профилировщика)"""
+        frames = sys._current_frames()
+        own_id = threading.get_ident()
+        # Поток цикла событий может обслуживать несколько запросов сразу: его стек
+        # снимается один раз, с маршрутом, если он у этих запросов общий
+        routes: Dict[int, str] = {}
+        for thread_id, route in list(self._active.values()):
+            routes[thread_id] = route if routes.get(thread_id, route) == route else 'event loop'
+        stacks = []
+        for thread_id, route in routes.items():
+            frame = frames.get(thread_id)
+            if frame is None or thread_id == own_id:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            names.append(route)
+            stacks.append(';'.join(reversed(names)))
+        if not stacks:
+            return
+        samples_counter.inc(len(stacks))
+        with self._lock:
+            self._counts_session_id = session_id
+            for stack in stacks:
+                if stack not in self._counts and len(self._counts) >= self.max_stacks:
+                    stack = stack.split(';', 1)[0] + ';[truncated]'
+                self._counts[stack] += 1
+
+    def _flush(self) -> None:
+        """Добавление накопленных стеков воркера к профилю сессии в Redis"""
+        with self._lock:
+            counts, self._counts = self._counts, collections.Counter()
+            session_id = self._counts_session_id
+        if not counts or session_id is None:
+            return
+        key = STACKS_KEY.format(session_id)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for stack, count in counts.items():
+                pipe.hincrby(key, stack, count)
+            pipe.expire(key, self.result_ttl)
+            pipe.execute()
+        except Exception:
+            errors_counter.inc()
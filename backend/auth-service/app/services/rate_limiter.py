@@ -0,0 +1,153 @@
+import functools
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from flask import request
+
+from .metrics import registry
+
+# Все ключи лимитов в одном слоте кластера: скрипт проверяет их атомарно за один вызов
+RATE_LIMIT_KEY = 'rate_limit:{{auth}}:{endpoint}:{scope}:{value}'
+
+rejected_counter = registry.counter(
+    'auth_rate_limit_rejected_total', 'Запросы, отклоненные ограничением частоты', ('endpoint', 'scope'))
+errors_counter = registry.counter(
+    'auth_rate_limit_errors_total', 'Ошибки Redis при проверке ограничения частоты')
+
+# GCRA (token bucket без фонового пополнения): в ключе хранится теоретическое время
+# прихода следующего запроса. Запрос проходит, только если укладывается во все лимиты;
+# отклоненный запрос не расходует ни один из них. Время берется у Redis, а не у воркеров.
+_GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+local retry_after, limited = 0, 0
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    local tat = tonumber(redis.call('GET', key)) or now
+    if tat < now then
+        tat = now
+    end
+    tats[i] = tat + interval
+    local wait = tats[i] - burst * interval - now
+    if wait > retry_after then
+        retry_after, limited = wait, i
+    end
+end
+if limited > 0 then
+    return {limited, math.ceil(retry_after)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(tats[i]), 'PX', math.ceil(tats[i] - now))
+end
+return {0, 0}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Превышен лимит частоты запросов"""
+
+    def __init__(self, endpoint: str, scope: str, retry_after: int = 1):
+        super().__init__("Rate limit exceeded")
+        self.endpoint = endpoint
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов к дорогим эндпоинтам (вход, регистрация, обновление токенов).
+
+    Для каждого эндпоинта задаются лимиты по IP клиента, по имени пользователя
+    и общий на весь сервис. Все лимиты запроса проверяются одним Lua-скриптом,
+    то есть одним обращением к Redis, до работы с базой данных и bcrypt.
+    При недоступности Redis запросы пропускаются.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.enabled = True
+        self.proxy_hops = 0
+        self._limits: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._script = None
+
+    def init_app(self, app, redis_client):
+        """Настройка из конфигурации приложения"""
+        self.redis = redis_client
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', self.enabled)
+        self.proxy_hops = app.config.get('RATE_LIMIT_PROXY_HOPS', self.proxy_hops)
+        # Аргументы скрипта считаются один раз: (scope, интервал между запросами в мс, размер всплеска)
+        self._limits = {
+            endpoint: [
+                (scope, repr(period * 1000.0 / count), str(count))
+                for scope, (count, period) in scopes.items()
+            ]
+            for endpoint, scopes in app.config.get('RATE_LIMITS', {}).items()
+        }
+        self._script = redis_client.register_script(_GCRA_SCRIPT)
+
+    def _client_ip(self) -> str:
+        """IP клиента; за доверенными прокси берется из X-Forwarded-For"""
+        if self.proxy_hops:
+            forwarded = [item.strip() for item in request.headers.get('X-Forwarded-For', '').split(',') if item.strip()]
+            if len(forwarded) >= self.proxy_hops:
+                return forwarded[-self.proxy_hops]
+        return request.remote_addr or 'unknown'
+
+    def _identity(self, scope: str) -> Optional[str]:
+        if scope == 'global':
+            return 'all'
+        if scope == 'ip':
+            return self._client_ip()
+        if scope == 'username':
+            data = request.get_json(silent=True)
+            username = data.get('username') if isinstance(data, dict) else None
+            if not isinstance(username, str) or not username.strip():
+                return None
+            # Фиксированная длина ключа и никаких персональных данных в Redis
+            return hashlib.sha256(username.strip().lower().encode('utf-8')).hexdigest()[:32]
+        return None
+
+    def check(self, endpoint: str) -> None:
+        """
+        Проверка и расход лимитов эндпоинта для текущего запроса
+
+        Raises:
+            RateLimitExceeded: Если хотя бы один лимит исчерпан
+        """
+        limits = self._limits.get(endpoint)
+        if not self.enabled or not limits:
+            return
+
+        keys, args, scopes = [], [], []
+        for scope, interval, burst in limits:
+            value = self._identity(scope)
+            if value is None:
+                continue
+            keys.append(RATE_LIMIT_KEY.format(endpoint=endpoint, scope=scope, value=value))
+            args.extend((interval, burst))
+            scopes.append(scope)
+        if not keys:
+            return
+
+        try:
+            limited, retry_after_ms = self._script(keys=keys, args=args)
+        except Exception:
+            # Сбой Redis не должен закрывать вход в систему
+            errors_counter.inc()
+            return
+        if limited:
+            scope = scopes[int(limited) - 1]
+            rejected_counter.inc(endpoint=endpoint, scope=scope)
+            raise RateLimitExceeded(endpoint, scope, max(1, -(-int(retry_after_ms) // 1000)))
+
+    def limit(self, endpoint: str):
+        """Декоратор представления: проверка лимитов до выполнения обработчика"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                self.check(endpoint)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,262 @@
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+import redis
+from redis.client import Pipeline
+from redis.commands.core import Script
+from redis.connection import Encoder
+from redis.exceptions import RedisError
+
+from .metrics import registry
+
+command_latency_histogram = registry.histogram(
+    'auth_redis_command_duration_seconds', 'Время выполнения команды Redis', ('command',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+command_errors_counter = registry.counter(
+    'auth_redis_command_errors_total', 'Ошибки команд Redis', ('command', 'error'))
+pipeline_size_histogram = registry.histogram(
+    'auth_redis_pipeline_commands', 'Количество команд в конвейере Redis',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+
+class _InstrumentedMixin:
+    """Замер времени и подсчет ошибок каждой команды"""
+
+    def execute_command(self, *args, **options):
+        command = str(args[0]).upper() if args else 'UNKNOWN'
+        started_at = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except RedisError as e:
+            command_errors_counter.inc(command=command, error=type(e).__name__)
+            raise
+        finally:
+            command_latency_histogram.observe(time.perf_counter() - started_at, command=command)
+
+
+class InstrumentedPipeline(Pipeline):
+    """Конвейер, замеряющий время всего пакета как команду PIPELINE/MULTI"""
+
+    def execute(self, raise_on_error=True):
+        command = 'MULTI' if self.transaction else 'PIPELINE'
+        pipeline_size_histogram.observe(len(self.command_stack))
+        started_at = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except RedisError as e:
+            command_errors_counter.inc(command=command, error=type(e).__name__)
+            raise
+        finally:
+            command_latency_histogram.observe(time.perf_counter() - started_at, command=command)
+
+
+class InstrumentedRedis(_InstrumentedMixin, redis.Redis):
+    """Клиент Redis с метриками команд и конвейеров"""
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def _parse_nodes(value: str):
+    """Разбор списка "host:port,host:port" """
+    nodes = []
+    for node in filter(None, (item.strip() for item in value.split(','))):
+        host, _, port = node.rpartition(':')
+        nodes.append((host, int(port)))
+    return nodes
+
+
+def create_redis_client(config):
+    """
+    Создание клиента Redis по конфигурации приложения.
+    Поддерживаются одиночный сервер, Sentinel (REDIS_SENTINELS) и Cluster (REDIS_CLUSTER_NODES).
+    """
+    connection_kwargs = {
+        'password': config.get('REDIS_PASSWORD'),
+        'socket_timeout': config.get('REDIS_SOCKET_TIMEOUT'),
+        'socket_connect_timeout': config.get('REDIS_SOCKET_CONNECT_TIMEOUT'),
+        'health_check_interval': config.get('REDIS_HEALTH_CHECK_INTERVAL', 30),
+        'retry_on_timeout': True,
+    }
+
+    if config.get('REDIS_CLUSTER_NODES'):
+        from redis.cluster import ClusterNode, RedisCluster
+
+        class InstrumentedRedisCluster(_InstrumentedMixin, RedisCluster):
+            pass
+
+        return InstrumentedRedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in _parse_nodes(config['REDIS_CLUSTER_NODES'])],
+            max_connections=config.get('REDIS_MAX_CONNECTIONS'),
+            **connection_kwargs
+        )
+
+    if config.get('REDIS_SENTINELS'):
+        from redis.sentinel import Sentinel
+
+        sentinel = Sentinel(
+            _parse_nodes(config['REDIS_SENTINELS']),
+            sentinel_kwargs={
+                'socket_timeout': config.get('REDIS_SOCKET_TIMEOUT'),
+                'socket_connect_timeout': config.get('REDIS_SOCKET_CONNECT_TIMEOUT'),
+            },
+            **connection_kwargs
+        )
+        return sentinel.master_for(
+            config['REDIS_SENTINEL_MASTER'],
+            redis_class=InstrumentedRedis,
+            db=config.get('REDIS_DB', 0),
+            max_connections=config.get('REDIS_MAX_CONNECTIONS')
+        )
+
+    # Блокирующий пул: при исчерпании соединений запрос ждет REDIS_POOL_TIMEOUT, а не падает сразу
+    pool = redis.BlockingConnectionPool(
+        host=config.get('REDIS_HOST', 'localhost'),
+        port=config.get('REDIS_PORT', 6379),
+        db=config.get('REDIS_DB', 0),
+        max_connections=config.get('REDIS_MAX_CONNECTIONS', 50),
+        timeout=config.get('REDIS_POOL_TIMEOUT', 1),
+        **connection_kwargs
+    )
+    return InstrumentedRedis(connection_pool=pool)
+
+
+class RedisClient:
+    """
+    Расширение Flask для Redis.
+    Модули импортируют общий объект redis_client, а реальный клиент
+    создается в create_app по конфигурации приложения.
+    """
+
+    def __init__(self, app=None):
+        self._client = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, client=None):
+        """Создание клиента по конфигурации приложения"""
+        self._client = client or create_redis_client(app.config)
+        app.extensions['redis'] = self
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("Redis client is not initialized, call init_app first")
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get_encoder(self):
+        """Кодировщик для скриптов, зарегистрированных до init_app"""
+        if self._client is None:
+            return Encoder('utf-8', 'strict', False)
+        return self._client.get_encoder()
+
+    def register_script(self, script) -> Script:
+        """Регистрация Lua-скрипта, привязанного к текущему клиенту, а не к клиенту на момент импорта"""
+        return Script(self, script)
+
+    def pipeline_map(
+        self,
+        items: Iterable[Any],
+        command: Callable[[Any, Any], Any],
+        chunk_size: int = 500,
+        transaction: bool = False
+    ) -> List[Any]:
+        """
+        Выполнение команды для каждого элемента конвейером.
+        Команды отправляются пакетами по chunk_size, результаты возвращаются в порядке элементов.
+
+        Args:
+            items: Элементы (например, ключи)
+            command: Функция command(pipe, item), добавляющая команду в конвейер
+            chunk_size: Максимальное число команд в одном пакете
+            transaction: Выполнять ли каждый пакет в MULTI/EXEC
+        """
+        results: List[Any] = []
+        pipe: Optional[Pipeline] = None
+        for item in items:
+            if pipe is None:
+                pipe = self.pipeline(transaction=transaction)
+            command(pipe, item)
+            if len(pipe) >= chunk_size:
+                results.extend(pipe.execute())
+                pipe = None
+        if pipe is not None and len(pipe):
+            results.extend(pipe.execute())
+        return results
+
+
+class _AsyncInstrumentedMixin:
+    """Замер времени и подсчет ошибок команд асинхронного клиента"""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper() if args else 'UNKNOWN'
+        started_at = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except RedisError as e:
+            command_errors_counter.inc(command=command, error=type(e).__name__)
+            raise
+        finally:
+            command_latency_histogram.observe(time.perf_counter() - started_at, command=command)
+
+
+def create_async_redis_client(config):
+    """
+    Асинхронный клиент Redis (redis.asyncio) для ASGI режима с теми же настройками, что и create_redis_client.
+    Клиент привязан к циклу событий, поэтому создается при старте ASGI приложения.
+    """
+    import redis.asyncio as aioredis
+
+    connection_kwargs = {
+        'password': config.get('REDIS_PASSWORD'),
+        'socket_timeout': config.get('REDIS_SOCKET_TIMEOUT'),
+        'socket_connect_timeout': config.get('REDIS_SOCKET_CONNECT_TIMEOUT'),
+        'health_check_interval': config.get('REDIS_HEALTH_CHECK_INTERVAL', 30),
+        'retry_on_timeout': True,
+    }
+
+    class InstrumentedAsyncRedis(_AsyncInstrumentedMixin, aioredis.Redis):
+        pass
+
+    if config.get('REDIS_CLUSTER_NODES'):
+        from redis.asyncio.cluster import ClusterNode, RedisCluster
+
+        class InstrumentedAsyncRedisCluster(_AsyncInstrumentedMixin, RedisCluster):
+            pass
+
+        return InstrumentedAsyncRedisCluster(
+            startup_nodes=[ClusterNode(host, port) for host, port in _parse_nodes(config['REDIS_CLUSTER_NODES'])],
+            max_connections=config.get('REDIS_MAX_CONNECTIONS') or 2 ** 31,
+            **connection_kwargs
+        )
+
+    if config.get('REDIS_SENTINELS'):
+        from redis.asyncio.sentinel import Sentinel
+
+        sentinel = Sentinel(
+            _parse_nodes(config['REDIS_SENTINELS']),
+            sentinel_kwargs={
+                'socket_timeout': config.get('REDIS_SOCKET_TIMEOUT'),
+                'socket_connect_timeout': config.get('REDIS_SOCKET_CONNECT_TIMEOUT'),
+            },
+            **connection_kwargs
+        )
+        return sentinel.master_for(
+            config['REDIS_SENTINEL_MASTER'],
+            redis_class=InstrumentedAsyncRedis,
+            db=config.get('REDIS_DB', 0),
+            max_connections=config.get('REDIS_MAX_CONNECTIONS')
+        )
+
+    pool = aioredis.BlockingConnectionPool(
+        host=config.get('REDIS_HOST', 'localhost'),
+        port=config.get('REDIS_PORT', 6379),
+        db=config.get('REDIS_DB', 0),
+        max_connections=config.get('REDIS_MAX_CONNECTIONS', 50),
+        timeout=config.get('REDIS_POOL_TIMEOUT', 1),
+        **connection_kwargs
+    )
+    return InstrumentedAsyncRedis(connection_pool=pool)
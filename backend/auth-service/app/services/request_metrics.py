@@ -0,0 +1,85 @@
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import registry
+
+request_duration_histogram = registry.histogram(
+    'auth_http_request_duration_seconds', 'Время обработки HTTP запроса', ('blueprint', 'route', 'method'))
+requests_counter = registry.counter(
+    'auth_http_requests_total', 'HTTP запросы по кодам ответа', ('blueprint', 'route', 'method', 'status'))
+statement_duration_histogram = registry.histogram(
+    'auth_db_statement_duration_seconds', 'Время выполнения SQL запроса', ('operation',))
+statement_errors_counter = registry.counter(
+    'auth_db_statement_errors_total', 'Ошибки SQL запросов', ('operation',))
+request_statements_histogram = registry.histogram(
+    'auth_http_request_db_statements', 'Число SQL запросов на HTTP запрос', ('blueprint', 'route'),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+
+_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def _operation(statement: str) -> str:
+    """Тип SQL запроса для метки: первое ключевое слово"""
+    keyword = statement.lstrip()[:8].split(None, 1)
+    keyword = keyword[0].upper() if keyword else ''
+    return keyword if keyword in _OPERATIONS else 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, '_metrics_started_at', None)
+    if started_at is None:
+        return
+    statement_duration_histogram.observe(time.perf_counter() - started_at, operation=_operation(statement))
+    if has_request_context():
+        g._metrics_statements = g.get('_metrics_statements', 0) + 1
+
+
+def _handle_error(exception_context):
+    statement = exception_context.statement or ''
+    statement_errors_counter.inc(operation=_operation(statement))
+
+
+class RequestMetrics:
+    """
+    Метрики HTTP запросов и SQL для /auth/metrics.
+
+    Время ответа и коды считаются по шаблону маршрута (/auth/admin/users/<int:user_id>/roles),
+    а не по пути, чтобы число рядов не зависело от параметров. SQL запросы всех движков
+    процесса считаются через события SQLAlchemy.
+    """
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+
+        @app.before_request
+        def start_timer():
+            g._metrics_started_at = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            started_at = g.get('_metrics_started_at')
+            if started_at is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.observe(request.blueprint or '', route, request.method, response.status_code,
+                             time.perf_counter() - started_at)
+                request_statements_histogram.observe(g.get('_metrics_statements', 0),
+                                                     blueprint=request.blueprint or '', route=route)
+            return response
+
+    def observe(self, blueprint: str, route: str, method: str, status: int, duration: float) -> None:
+        """Учет запроса; используется и эндпоинтами ASGI режима, которые обслуживаются без Flask"""
+        request_duration_histogram.observe(duration, blueprint=blueprint, route=route, method=method)
+        requests_counter.inc(blueprint=blueprint, route=route, method=method, status=status)
@@ -0,0 +1,118 @@
+from sqlalchemy import select, insert, delete, and_, exists, true
+from app import db, profile_cache, token_revocation
+from app.models.role import Role, Permission, role_permissions
+from app.models.user import User, user_roles
+
+
+class RoleService:
+    """Массовое изменение ролей пользователей и прав ролей set-based запросами"""
+
+    @staticmethod
+    def resolve_ids(model, names):
+        """
+        Идентификаторы ролей или прав по именам одним запросом
+
+        Returns:
+            (список id, множество неизвестных имен)
+        """
+        names = set(names or [])
+        if not names:
+            return [], set()
+        rows = db.session.execute(select(model.id, model.name).where(model.name.in_(names))).all()
+        return [row.id for row in rows], names - {row.name for row in rows}
+
+    @staticmethod
+    def bulk_update_user_roles(target_users, add_role_ids, remove_role_ids):
+        """
+        Добавление и удаление ролей у множества пользователей в одной транзакции
+
+        Args:
+            target_users: select(User.id ...) - пользователи, к которым применяется изменение
+            add_role_ids: Роли, которые нужно выдать
+            remove_role_ids: Роли, которые нужно отобрать
+
+        Returns:
+            Сводка: количество добавленных и удаленных связей и затронутых пользователей
+        """
+        added, removed = [], []
+        try:
+            if remove_role_ids:
+                removed = db.session.execute(
+                    delete(user_roles)
+                    .where(user_roles.c.user_id.in_(target_users), user_roles.c.role_id.in_(remove_role_ids))
+                    .returning(user_roles.c.user_id)
+                ).scalars().all()
+            if add_role_ids:
+                # INSERT ... SELECT по всем парам пользователь-роль, кроме уже существующих
+                pairs = (
+                    select(User.id, Role.id)
+                    .join(Role, true())
+                    .where(User.id.in_(target_users), Role.id.in_(add_role_ids))
+                    .where(~exists().where(and_(user_roles.c.user_id == User.id, user_roles.c.role_id == Role.id)))
+                )
+                added = db.session.execute(
+                    insert(user_roles).from_select(['user_id', 'role_id'], pairs).returning(user_roles.c.user_id)
+                ).scalars().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Роли входят в claims токенов: у потерявших роль отзываются выпущенные токены
+        revoked_users = sorted(set(removed))
+        affected_users = sorted(set(added) | set(removed))
+        token_revocation.revoke_users(revoked_users)
+        profile_cache.invalidate(*affected_users)
+        return {
+            'roles_added': len(added),
+            'roles_removed': len(removed),
+            'users_affected': len(affected_users),
+            'users_revoked': len(revoked_users)
+        }
+
+    @staticmethod
+    def bulk_update_role_permissions(role_ids, add_permission_ids, remove_permission_ids):
+        """
+        Добавление и удаление прав у набора ролей в одной транзакции
+
+        Returns:
+            Сводка: количество добавленных и удаленных связей и затронутых пользователей
+        """
+        added = removed = 0
+        try:
+            if remove_permission_ids:
+                removed = db.session.execute(
+                    delete(role_permissions).where(
+                        role_permissions.c.role_id.in_(role_ids),
+                        role_permissions.c.permission_id.in_(remove_permission_ids)
+                    )
+                ).rowcount
+            if add_permission_ids:
+                pairs = (
+                    select(Role.id, Permission.id)
+                    .join(Permission, true())
+                    .where(Role.id.in_(role_ids), Permission.id.in_(add_permission_ids))
+                    .where(~exists().where(and_(
+                        role_permissions.c.role_id == Role.id,
+                        role_permissions.c.permission_id == Permission.id
+                    )))
+                )
+                added = db.session.execute(
+                    insert(role_permissions).from_select(['role_id', 'permission_id'], pairs)
+                ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        affected_users = []
+        if added or removed:
+            affected_users = db.session.execute(
+                select(user_roles.c.user_id).where(user_roles.c.role_id.in_(role_ids)).distinct()
+            ).scalars().all()
+            profile_cache.invalidate(*affected_users)
+        return {
+            'permissions_added': added,
+            'permissions_removed': removed,
+            'users_affected': len(affected_users)
+        }
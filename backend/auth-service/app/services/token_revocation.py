@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+from .bloom_filter import BloomFilter
+from .metrics import registry
+
+# Ключи Redis и канал синхронизации фильтров между воркерами
+REVOKED_TOKEN_KEY = 'revoked_token:{}'
+TOKEN_EPOCH_KEY = 'token_epoch:{}'
+REVOCATION_CHANNEL = 'token_revocations'
+
+filter_checks_counter = registry.counter(
+    'auth_revocation_checks_total', 'Проверки отзыва токенов по результату фильтра', ('result',))
+filter_errors_counter = registry.counter(
+    'auth_revocation_sync_errors_total', 'Ошибки синхронизации фильтра отозванных токенов')
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class TokenRevocation:
+    """
+    Отзыв токенов по jti и по счетчику эпохи пользователя.
+
+    Отозванный jti хранится в Redis с TTL, равным остатку срока жизни токена.
+    "Выход со всех устройств" увеличивает эпоху пользователя: токены, выпущенные
+    с меньшей эпохой, считаются отозванными. Каждый воркер держит фильтр Блума
+    с отозванными jti и пользователями с ненулевой эпохой, синхронизируемый
+    через pub/sub, поэтому проверка неотозванного токена не обращается к Redis.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.use_filter = True
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.rebuild_interval = 3600
+        self._filter = None
+        self._built_at = 0.0
+        self._ready = threading.Event()
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, redis_client):
+        """Настройка из конфигурации приложения"""
+        self.redis = redis_client
+        self.use_filter = app.config.get('REVOCATION_BLOOM_ENABLED', self.use_filter)
+        self.capacity = app.config.get('REVOCATION_BLOOM_CAPACITY', self.capacity)
+        self.error_rate = app.config.get('REVOCATION_BLOOM_ERROR_RATE', self.error_rate)
+        self.rebuild_interval = app.config.get('REVOCATION_BLOOM_REBUILD_INTERVAL', self.rebuild_interval)
+        self._filter = None
+        self._ready = threading.Event()
+        self._listener_pid = None
+
+    def _filter_ready(self) -> bool:
+        """Запуск синхронизации фильтра в текущем процессе; True, если фильтру можно доверять"""
+        if not self.use_filter:
+            return False
+        pid = os.getpid()
+        if self._listener_pid != pid:
+            with self._lock:
+                if self._listener_pid != pid:
+                    self._ready = threading.Event()
+                    threading.Thread(target=self._listen, name='token-revocation-sync', daemon=True).start()
+                    self._listener_pid = pid
+        return self._ready.is_set()
+
+    def _listen(self):
+        """Фоновая подписка на отзывы; при сбое фильтр пересобирается заново"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                # Подписка до чтения состояния, чтобы не потерять отзывы во время сборки
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                self._rebuild()
+                self._ready.set()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self._filter.add(_decode(message['data']))
+                    if time.monotonic() - self._built_at >= self.rebuild_interval:
+                        # Истекшие jti из фильтра не удаляются, поэтому он периодически пересобирается
+                        self._rebuild()
+            except Exception:
+                self._ready.clear()
+                filter_errors_counter.inc()
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _rebuild(self):
+        """Сборка фильтра по текущему состоянию Redis"""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for key in self.redis.scan_iter(match=REVOKED_TOKEN_KEY.format('*'), count=1000):
+            bloom.add('jti:' + _decode(key).split(':', 1)[1])
+        for key in self.redis.scan_iter(match=TOKEN_EPOCH_KEY.format('*'), count=1000):
+            bloom.add('user:' + _decode(key).split(':', 1)[1])
+        self._filter = bloom
+        self._built_at = time.monotonic()
+
+    def _add_local(self, item: str):
+        if self._filter is not None:
+            self._filter.add(item)
+
+    def revoke(self, claims: Dict[str, Any]) -> None:
+        """Отзыв конкретного токена по его jti до истечения срока действия"""
+        ttl = int(claims['exp'] - time.time())
+        if ttl <= 0:
+            return
+        jti = claims['jti']
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(REVOKED_TOKEN_KEY.format(jti), 1, ex=ttl)
+        pipe.publish(REVOCATION_CHANNEL, f'jti:{jti}')
+        pipe.execute()
+        self._add_local(f'jti:{jti}')
+
+    def revoke_user(self, user_id) -> int:
+        """Отзыв всех выпущенных токенов пользователя; возвращает новую эпоху"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incr(TOKEN_EPOCH_KEY.format(user_id))
+        pipe.publish(REVOCATION_CHANNEL, f'user:{user_id}')
+        epoch = pipe.execute()[0]
+        self._add_local(f'user:{user_id}')
+        return epoch
+
+    def revoke_users(self, user_ids: List[Any], chunk_size: int = 500) -> None:
+        """Отзыв токенов множества пользователей пакетами команд"""
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in chunk:
+                pipe.incr(TOKEN_EPOCH_KEY.format(user_id))
+                pipe.publish(REVOCATION_CHANNEL, f'user:{user_id}')
+            pipe.execute()
+            for user_id in chunk:
+                self._add_local(f'user:{user_id}')
+
+    def current_epoch(self, user_id) -> int:
+        """
+        Текущая эпоха пользователя для новых токенов - всегда из Redis. Фильтр воркера
+        может еще не получить отзыв, обработанный другим воркером; токен с устаревшей
+        эпохой считался бы отозванным навсегда. Выпуск токенов - не горячий путь.
+        """
+        return int(self.redis.get(TOKEN_EPOCH_KEY.format(user_id)) or 0)
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        """Проверка отзыва одного токена"""
+        return self.revoked_many([claims])[0]
+
+    def revoked_many(self, claims_list: List[Dict[str, Any]]) -> List[bool]:
+        """Проверка отзыва списка токенов: не более одного конвейерного запроса к Redis"""
+        ready, results, to_check = self._plan_checks(claims_list)
+        if not to_check:
+            return results
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_checks(pipe, to_check)
+        return self._apply_checks(ready, results, to_check, pipe.execute())
+
+    async def revoked_many_async(self, claims_list: List[Dict[str, Any]], redis) -> List[bool]:
+        """То же, что revoked_many, через асинхронный клиент Redis (ASGI режим)"""
+        ready, results, to_check = self._plan_checks(claims_list)
+        if not to_check:
+            return results
+        pipe = redis.pipeline(transaction=False)
+        self._queue_checks(pipe, to_check)
+        return self._apply_checks(ready, results, to_check, await pipe.execute())
+
+    def _plan_checks(self, claims_list: List[Dict[str, Any]]):
+        """Токены, которые фильтр не смог признать неотозванными, и что для них проверить в Redis"""
+        ready = self._filter_ready()
+        bloom = self._filter
+        results = [False] * len(claims_list)
+        to_check = []
+        for index, claims in enumerate(claims_list):
+            jti = claims.get('jti')
+            if ready:
+                check_jti = jti is not None and f'jti:{jti}' in bloom
+                check_user = f"user:{claims.get('sub')}" in bloom
+            else:
+                check_jti, check_user = jti is not None, True
+            if check_jti or check_user:
+                to_check.append((index, claims, check_jti, check_user))
+            else:
+                filter_checks_counter.inc(result='negative')
+        return ready, results, to_check
+
+    @staticmethod
+    def _queue_checks(pipe, to_check) -> None:
+        for _index, claims, check_jti, check_user in to_check:
+            if check_jti:
+                pipe.exists(REVOKED_TOKEN_KEY.format(claims['jti']))
+            if check_user:
+                pipe.get(TOKEN_EPOCH_KEY.format(claims.get('sub')))
+
+    @staticmethod
+    def _apply_checks(ready, results, to_check, values) -> List[bool]:
+        values = iter(values)
+        for index, claims, check_jti, check_user in to_check:
+            revoked = False
+            if check_jti and next(values):
+                revoked = True
+            if check_user:
+                epoch = next(values)
+                if epoch is not None and int(claims.get('epoch', 0)) < int(epoch):
+                    revoked = True
+            results[index] = revoked
+            if ready:
+                filter_checks_counter.inc(result='revoked' if revoked else 'false_positive')
+            else:
+                filter_checks_counter.inc(result='unfiltered')
+        return results
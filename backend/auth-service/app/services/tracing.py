@@ -0,0 +1,172 @@
+import contextlib
+import contextvars
+import random
+import re
+import secrets
+import time
+from typing import Dict, Iterator, Optional
+
+from flask import request
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(?:-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+SAMPLED = 0x01
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('trace_span', default=None)
+
+
+def parse_traceparent(header: Optional[str]):
+    """
+    Разбор заголовка traceparent (W3C Trace Context): (trace_id, span_id, flags)
+    или None для отсутствующего и некорректного заголовка
+    """
+    if not header:
+        return None
+    match = _TRACEPARENT.match(header.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    # Версия ff запрещена; для версии 00 хвост после флагов недопустим
+    if version == 'ff' or (version == '00' and len(header.strip()) != 55):
+        return None
+    if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, int(flags, 16)
+
+
+class Span:
+    """Участок обработки запроса: идентификаторы W3C, время начала и длительность"""
+    __slots__ = ('trace_id', 'span_id', 'parent_span_id', 'name', 'flags', 'tracestate',
+                 'start_us', '_started_at', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None,
+                 flags: int = SAMPLED, tracestate: Optional[str] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.flags = flags
+        self.tracestate = tracestate
+        self.start_us = time.time_ns() // 1000
+        self._started_at = time.perf_counter()
+        self._token = None
+
+    @property
+    def sampled(self) -> bool:
+        return bool(self.flags & SAMPLED)
+
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-{self.flags:02x}'
+
+    def headers(self) -> Dict[str, str]:
+        """Заголовки для исходящего запроса, в котором этот участок - родительский"""
+        headers = {'traceparent': self.traceparent()}
+        if self.tracestate:
+            headers['tracestate'] = self.tracestate
+        return headers
+
+    def elapsed_us(self) -> int:
+        return int((time.perf_counter() - self._started_at) * 1_000_000)
+
+
+def current_span() -> Optional[Span]:
+    """Текущий участок трассировки потока или корутины; None вне запроса"""
+    return _current_span.get()
+
+
+class Tracer:
+    """
+    Распространение контекста трассировки W3C (traceparent/tracestate).
+
+    На входе каждого запроса принимается traceparent клиента или начинается новая
+    трасса; участок запроса становится текущим (contextvars), и LogService добавляет
+    его trace_id/span_id в каждую запись. Исходящие вызовы оборачиваются в span():
+    дочерний участок получает свой span_id и передается дальше в заголовке traceparent.
+
+    Завершенный участок пишется в лог отдельной записью с action="span", временем
+    начала и длительностью, чтобы log-service мог собрать разбивку задержки запроса
+    по trace_id. Решение о записи участков принимается один раз на трассу (флаг sampled)
+    и передается дальше, поэтому дерево участков не рвется сэмплированием.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.sample_rate = 0.01
+        self.logger = None
+
+    def init_app(self, app, logger):
+        self.enabled = app.config.get('TRACING_ENABLED', self.enabled)
+        self.sample_rate = app.config.get('TRACE_SAMPLE_RATE', self.sample_rate)
+        self.logger = logger
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def start_request_span():
+            self.start(request.method, request.headers.get('traceparent'),
+                       request.headers.get('tracestate'))
+
+        @app.after_request
+        def add_trace_header(response):
+            span = current_span()
+            if span is not None:
+                # Клиент связывает ответ с трассой, даже если сам ее не начинал
+                response.headers['traceresponse'] = span.traceparent()
+            return response
+
+        @app.teardown_request
+        def finish_request_span(exception=None):
+            span = current_span()
+            if span is None:
+                return
+            if request.url_rule is not None:
+                span.name = f'{request.method} {request.url_rule.rule}'
+            self.finish(span, error=exception is not None)
+
+    def start(self, name: str, traceparent: Optional[str] = None,
+              tracestate: Optional[str] = None) -> Span:
+        """Участок входящего запроса: продолжение трассы клиента или новая трасса"""
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_span_id, flags = parent
+        else:
+            trace_id, parent_span_id, tracestate = secrets.token_hex(16), None, None
+            flags = SAMPLED if random.random() < self.sample_rate else 0
+        span = Span(name, trace_id, parent_span_id, flags, tracestate)
+        span._token = _current_span.set(span)
+        return span
+
+    def finish(self, span: Span, error: bool = False, record: bool = True) -> None:
+        """Запись длительности участка и восстановление родительского участка"""
+        duration_us = span.elapsed_us()
+        if span._token is not None:
+            try:
+                _current_span.reset(span._token)
+            except ValueError:
+                # Участок начат в другом контексте (например, в другом потоке)
+                pass
+            span._token = None
+        if record and span.sampled and self.logger is not None:
+            self.logger.info(f"span {span.name}", action="span",
+                             metadata={"error": True} if error else None,
+                             span=span, duration_us=duration_us)
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """Дочерний участок текущего (или корень новой трассы) на время блока"""
+        parent = current_span()
+        if parent is None or not self.enabled:
+            span = Span(name, secrets.token_hex(16),
+                        flags=SAMPLED if self.enabled and random.random() < self.sample_rate else 0)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, parent.flags, parent.tracestate)
+        span._token = _current_span.set(span)
+        error = False
+        try:
+            yield span
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.finish(span, error=error)
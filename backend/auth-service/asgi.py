@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# ASGI режим: uvicorn asgi:app --workers N
+app = create_asgi_app()
@@ -0,0 +1,5 @@
+"""
+Нагрузочные сценарии auth-service в одном процессе.
+
+Запуск из каталога сервиса: python -m benchmarks --help
+"""
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import sys
+
+from .harness import benchmark_app, compare, run_scenario
+from .scenarios import OPERATIONS, SCENARIOS, Worker
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Нагрузочные сценарии auth-service: p50/p95/p99 и RPS по операциям')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='сценарий (можно несколько); по умолчанию все')
+    parser.add_argument('--concurrency', type=int, default=8, help='число потоков нагрузки')
+    parser.add_argument('--duration', type=float, default=10.0, help='длительность замера, секунд')
+    parser.add_argument('--warmup', type=float, default=1.0, help='прогрев без замера, секунд')
+    parser.add_argument('--users', type=int, default=100, help='число тестовых пользователей')
+    parser.add_argument('--bcrypt-rounds', type=int, default=4, help='стоимость bcrypt для сценариев входа')
+    parser.add_argument('--database-url', help='одноразовая БД вместо SQLite во временном файле')
+    parser.add_argument('--redis-url', help='одноразовый Redis вместо fakeredis')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='файл базового прогона')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результаты как базовые')
+    parser.add_argument('--output', help='записать результаты в JSON файл')
+    return parser.parse_args(argv)
+
+
+def print_report(scenario, results):
+    print(f'\n{scenario}')
+    print(f"  {'operation':<16}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"  {name:<16}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = {'concurrency': args.concurrency, 'users': args.users, 'bcrypt_rounds': args.bcrypt_rounds,
+                'database': 'external' if args.database_url else 'sqlite',
+                'redis': 'external' if args.redis_url else 'fakeredis'}
+
+    results = {}
+    with benchmark_app(args.database_url, args.redis_url, args.users, args.bcrypt_rounds) as (app, fixtures):
+        for scenario in args.scenario or list(SCENARIOS):
+            results[scenario] = run_scenario(
+                app, fixtures, OPERATIONS, SCENARIOS[scenario], Worker,
+                concurrency=args.concurrency, duration=args.duration, warmup=args.warmup)
+            print_report(scenario, results[scenario])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings, 'scenarios': results}, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        # Допуски сохраняются из прежнего файла, если он был
+        baseline = {'thresholds': baseline.get('thresholds', {'latency': 0.25, 'throughput': 0.2,
+                                                             'error_rate': 0.01}),
+                    'settings': settings, 'scenarios': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f'\nBaseline saved to {args.baseline}')
+        return 0
+
+    if baseline.get('settings') and baseline['settings'] != settings:
+        print(f"\nWarning: baseline was recorded with {baseline['settings']}", file=sys.stderr)
+    failures = compare(results, baseline)
+    for failure in failures:
+        print(f'REGRESSION {failure}', file=sys.stderr)
+    if not failures:
+        print('\nNo regressions against baseline' if baseline.get('scenarios') else '\nNo baseline to compare with')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+import fakeredis
+import redis
+
+from app import create_app, db, last_login_buffer, password_hasher
+from app.config import Config
+from app.models.role import Role
+from app.models.user import User
+from app.services.redis_client import InstrumentedRedis
+
+PERCENTILES = (50, 95, 99)
+
+
+class BenchmarkConfig(Config):
+    """Рабочая конфигурация без внешних зависимостей: кеши и буферы записи включены"""
+    TESTING = True
+    ASYNC_DATABASE_URL = None
+    JWT_EPHEMERAL_KEY = True
+    CORS_ALLOWED_ORIGINS = ['*']
+    BCRYPT_EXECUTOR = 'thread'
+    BCRYPT_LOG_ROUNDS = 4
+    # Лимиты отклонили бы сценарий входа с одного адреса
+    RATE_LIMIT_ENABLED = False
+    LOG_TRANSPORT = 'stdout'
+    LOG_LEVEL = 'ERROR'
+    # Отметки входа пишутся только явным flush(): фоновый поток конкурировал бы
+    # с запросами сценария за блокировку SQLite и давал нестабильные задержки
+    LAST_LOGIN_FLUSH_INTERVAL = 0
+
+
+@dataclass
+class Fixtures:
+    """Пользователи, созданные для прогона"""
+    usernames: List[str]
+    password: str
+    admin_username: str
+
+
+@contextlib.contextmanager
+def benchmark_app(database_url: Optional[str] = None, redis_url: Optional[str] = None,
+                  users: int = 100, bcrypt_rounds: int = 4):
+    """
+    Flask приложение с тестовыми данными.
+
+    Без database_url используется SQLite во временном файле, без redis_url - fakeredis.
+    Настоящие серверы должны быть одноразовыми: в них создаются таблицы и пользователи.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='auth-bench-')
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database_url or f"sqlite:///{os.path.join(tmpdir, 'auth.db')}",
+        'BCRYPT_LOG_ROUNDS': bcrypt_rounds,
+    }
+    if redis_url:
+        url = urlsplit(redis_url)
+        overrides.update(REDIS_HOST=url.hostname, REDIS_PORT=url.port or 6379,
+                         REDIS_DB=int(url.path.lstrip('/') or 0), REDIS_PASSWORD=url.password)
+    config = type('BenchmarkRunConfig', (BenchmarkConfig,), overrides)
+
+    with contextlib.ExitStack() as stack:
+        if not redis_url:
+            fake = InstrumentedRedis(connection_pool=redis.ConnectionPool(
+                connection_class=fakeredis.FakeRedisConnection, server=fakeredis.FakeServer()))
+            stack.enter_context(patch('app.services.redis_client.create_redis_client', return_value=fake))
+        app = None
+        try:
+            app = create_app(config)
+            with app.app_context():
+                db.create_all()
+                fixtures = _seed(users)
+            yield app, fixtures
+        finally:
+            if app is not None:
+                # Поток last_login и пул соединений не должны пережить прогон:
+                # иначе следующий прогон пишет в удаленный файл SQLite
+                last_login_buffer.stop()
+                with app.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _seed(count: int) -> Fixtures:
+    """Пользователи bench_* с общим паролем; первый - администратор"""
+    prefix = f'bench_{os.getpid()}_{int(time.time())}'
+    password = 'benchpass123'
+    password_hash = password_hasher.hash(password)
+
+    admin_role = db.session.query(Role).filter_by(name='admin').first() or Role(name='admin')
+    users = [User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password_hash=password_hash)
+             for i in range(count)]
+    users[0].roles = [admin_role]
+    db.session.add_all(users)
+    db.session.commit()
+    usernames = [user.username for user in users]
+    return Fixtures(usernames=usernames, password=password, admin_username=usernames[0])
+
+
+@dataclass
+class EndpointStats:
+    """Задержки одной операции сценария"""
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, duration: float) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        summary = {'requests': len(latencies), 'errors': self.errors,
+                   'rps': round(len(latencies) / duration, 1) if duration else 0.0}
+        for percentile in PERCENTILES:
+            summary[f'p{percentile}_ms'] = round(_percentile(latencies, percentile) * 1000, 3)
+        return summary
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percentile // 100))
+    return values[int(rank) - 1]
+
+
+def run_scenario(app, fixtures: Fixtures, operations: Dict[str, Callable], weights: Dict[str, int],
+                 worker_factory: Callable, concurrency: int = 8, duration: float = 10.0,
+                 warmup: float = 1.0, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Нагрузка сценария из concurrency потоков в течение warmup + duration секунд.
+    Каждый поток выбирает операции по весам; запросы прогрева не учитываются.
+
+    Returns:
+        {операция: {requests, errors, rps, p50_ms, p95_ms, p99_ms}}
+    """
+    names = list(weights)
+    workers = [worker_factory(app, fixtures, index) for index in range(concurrency)]
+    # Результаты копятся по потокам и объединяются после прогона, без общей блокировки
+    stats = [defaultdict(EndpointStats) for _ in workers]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def work(index):
+        rng = random.Random(seed + index)
+        worker, local = workers[index], stats[index]
+        barrier.wait()
+        measure_from = time.perf_counter() + warmup
+        stop_at = measure_from + duration
+        while True:
+            name = rng.choices(names, [weights[n] for n in names])[0]
+            started_at = time.perf_counter()
+            if started_at >= stop_at:
+                break
+            ok = operations[name](worker, rng)
+            finished_at = time.perf_counter()
+            if started_at >= measure_from:
+                entry = local[name]
+                entry.latencies.append(finished_at - started_at)
+                entry.errors += 0 if ok else 1
+
+    threads = [threading.Thread(target=work, args=(index,), name=f'bench-{index}') for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+
+    merged = defaultdict(EndpointStats)
+    for local in stats:
+        for name, entry in local.items():
+            merged[name].latencies.extend(entry.latencies)
+            merged[name].errors += entry.errors
+    return {name: merged[name].summary(duration) for name in names if name in merged}
+
+
+def compare(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict) -> List[str]:
+    """
+    Регрессии относительно сохраненного базового прогона.
+
+    Операция считается регрессией, если ее p99 вырос больше допуска latency,
+    RPS упал больше допуска throughput или доля ошибок превысила error_rate.
+    """
+    thresholds = baseline.get('thresholds', {})
+    max_latency = thresholds.get('latency', 0.25)
+    max_throughput = thresholds.get('throughput', 0.2)
+    max_error_rate = thresholds.get('error_rate', 0.01)
+
+    failures = []
+    for scenario, endpoints in results.items():
+        for name, current in endpoints.items():
+            label = f'{scenario}/{name}'
+            requests = current['requests']
+            if requests and current['errors'] / requests > max_error_rate:
+                failures.append(f"{label}: error rate {current['errors'] / requests:.1%} > {max_error_rate:.1%}")
+            expected = baseline.get('scenarios', {}).get(scenario, {}).get(name)
+            if not expected:
+                continue
+            if current['p99_ms'] > expected['p99_ms'] * (1 + max_latency):
+                failures.append(f"{label}: p99 {current['p99_ms']:.2f}ms > baseline "
+                                f"{expected['p99_ms']:.2f}ms +{max_latency:.0%}")
+            if current['rps'] < expected['rps'] * (1 - max_throughput):
+                failures.append(f"{label}: {current['rps']:.1f} rps < baseline "
+                                f"{expected['rps']:.1f} rps -{max_throughput:.0%}")
+    return failures
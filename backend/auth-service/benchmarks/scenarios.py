@@ -0,0 +1,85 @@
+import random
+
+from .harness import Fixtures
+
+
+class Worker:
+    """Состояние потока нагрузки: свой тестовый клиент и токены своего пользователя"""
+
+    def __init__(self, app, fixtures: Fixtures, index: int):
+        self.client = app.test_client()
+        self.fixtures = fixtures
+        self.device_id = f'bench-{index}'
+        tokens = self._login(fixtures.usernames[index % len(fixtures.usernames)], self.device_id)
+        self.access_token, self.refresh_token = tokens['access_token'], tokens['refresh_token']
+        # Администратор может совпасть с пользователем потока: вход на то же устройство отозвал бы его refresh токен
+        self.admin_token = self._login(fixtures.admin_username, f'{self.device_id}-admin')['access_token']
+
+    def _login(self, username, device_id):
+        response = self.client.post('/auth/login', json={
+            'username': username, 'password': self.fixtures.password, 'device_id': device_id})
+        if response.status_code != 200:
+            raise RuntimeError(f'Benchmark login failed: {response.status_code} {response.get_data(as_text=True)}')
+        return response.json
+
+    def headers(self, admin=False):
+        return {'Authorization': f"Bearer {self.admin_token if admin else self.access_token}"}
+
+
+def login(worker: Worker, rng: random.Random) -> bool:
+    response = worker.client.post('/auth/login', json={
+        'username': rng.choice(worker.fixtures.usernames),
+        'password': worker.fixtures.password,
+        # Повторный вход на устройство отзывает его refresh токен, которым пользуется refresh
+        'device_id': f'{worker.device_id}-login',
+    })
+    return response.status_code == 200
+
+
+def refresh(worker: Worker, rng: random.Random) -> bool:
+    response = worker.client.post('/auth/refresh', json={'refresh_token': worker.refresh_token})
+    if response.status_code != 200:
+        return False
+    worker.access_token = response.json['access_token']
+    worker.refresh_token = response.json.get('refresh_token', worker.refresh_token)
+    return True
+
+
+def validate(worker: Worker, rng: random.Random) -> bool:
+    return worker.client.post('/auth/validate', headers=worker.headers()).status_code == 200
+
+
+def validate_batch(worker: Worker, rng: random.Random) -> bool:
+    response = worker.client.post('/auth/validate/batch', json={'tokens': [worker.access_token] * 20})
+    return response.status_code == 200
+
+
+def me(worker: Worker, rng: random.Random) -> bool:
+    return worker.client.get('/auth/me', headers=worker.headers()).status_code == 200
+
+
+def admin_users(worker: Worker, rng: random.Random) -> bool:
+    response = worker.client.get('/auth/admin/users?limit=50', headers=worker.headers(admin=True))
+    return response.status_code == 200
+
+
+def admin_roles(worker: Worker, rng: random.Random) -> bool:
+    return worker.client.get('/auth/admin/roles', headers=worker.headers(admin=True)).status_code == 200
+
+
+OPERATIONS = {
+    'login': login,
+    'refresh': refresh,
+    'validate': validate,
+    'validate_batch': validate_batch,
+    'me': me,
+    'admin_users': admin_users,
+    'admin_roles': admin_roles,
+}
+
+# Сценарии: веса операций, из которых каждый поток выбирает следующий запрос
+SCENARIOS = {
+    'login_storm': {'login': 1},
+    'validate_flood': {'validate': 9, 'validate_batch': 1},
+    'mixed': {'me': 4, 'validate': 3, 'refresh': 1, 'login': 1, 'admin_users': 1, 'admin_roles': 1},
+}
@@ -0,0 +1,63 @@
+"""
+Запуск в продакшене: gunicorn -c gunicorn.conf.py
+
+Настройки берутся из app.config.Config (переменные окружения SERVER_*).
+Приложение загружается в мастер-процессе до fork, поэтому импорты и метаданные
+моделей разделяются воркерами copy-on-write. Фоновые потоки, пулы bcrypt и соединения
+Redis создаются лениво в каждом воркере после fork.
+
+Перезапуск без простоя: kill -HUP <master> перезапускает воркеры с той же версией кода
+(при preload код не перечитывается). Для обновления кода: kill -USR2 <master> запускает
+новый мастер с новыми воркерами, после их старта kill -QUIT <старый master> плавно
+останавливает старые воркеры.
+"""
+import gc
+import glob
+import os
+import tempfile
+
+from app.config import Config
+
+# Метрики всех воркеров собираются через общий каталог снимков (app/services/metrics.py);
+# значение задается до загрузки приложения, которое читает Config при create_app
+if Config.METRICS_ENABLED and not Config.METRICS_MULTIPROC_DIR:
+    Config.METRICS_MULTIPROC_DIR = tempfile.mkdtemp(prefix='auth-metrics-')
+
+wsgi_app = Config.SERVER_APP
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+# ASGI приложение обслуживается воркерами uvicorn, WSGI - потоками gthread
+worker_class = 'uvicorn_worker.UvicornWorker' if Config.SERVER_APP.startswith('asgi:') else 'gthread'
+threads = Config.SERVER_THREADS
+preload_app = True
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+keepalive = Config.SERVER_KEEPALIVE
+
+
+def on_starting(server):
+    # Снимки предыдущего запуска сервера не должны попасть в суммы счетчиков
+    if Config.METRICS_MULTIPROC_DIR:
+        for path in glob.glob(os.path.join(Config.METRICS_MULTIPROC_DIR, '*.json')):
+            os.remove(path)
+
+
+def pre_fork(server, worker):
+    # Объекты, созданные при загрузке, не попадают в сборку мусора воркеров
+    # и не копируются при обходе сборщиком
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Соединения с БД, открытые мастером, воркерам не передаются
+    from app import db
+
+    application = server.app.wsgi()
+    flask_app = getattr(getattr(application, 'state', None), 'flask_app', application)
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+
+    from app.services.metrics import multiprocess_metrics
+    multiprocess_metrics.start()
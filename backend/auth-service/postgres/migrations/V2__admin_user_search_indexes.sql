@@ -0,0 +1,14 @@
+BEGIN;
+
+-- Поиск пользователей по префиксу username/email без учета регистра
+CREATE INDEX ix_users_username_lower_prefix ON users (lower(username) text_pattern_ops);
+CREATE INDEX ix_users_email_lower_prefix ON users (lower(email) text_pattern_ops);
+
+-- Фильтры списка пользователей с пагинацией по id
+CREATE INDEX ix_users_provider_id ON users (provider, id);
+CREATE INDEX ix_users_created_at_id ON users (created_at, id);
+
+-- Выборка пользователей роли
+CREATE INDEX ix_user_roles_role_id_user_id ON user_roles (role_id, user_id);
+
+COMMIT;
@@ -0,0 +1,17 @@
+BEGIN;
+
+-- Уникальность username и email без учета регистра.
+-- Перед применением дубликаты вида 'Alice'/'alice' нужно разрешить вручную:
+-- SELECT lower(username), count(*) FROM users GROUP BY 1 HAVING count(*) > 1;
+-- Индексы с text_pattern_ops обслуживают и равенство (вход, регистрация), и поиск по префиксу
+CREATE UNIQUE INDEX uq_users_username_lower ON users (lower(username) text_pattern_ops);
+CREATE UNIQUE INDEX uq_users_email_lower ON users (lower(email) text_pattern_ops);
+
+-- Заменяются индексами выше
+DROP INDEX IF EXISTS ix_users_username_lower_prefix;
+DROP INDEX IF EXISTS ix_users_email_lower_prefix;
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_username_key;
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_email_key;
+DROP INDEX IF EXISTS idx_users_email;
+
+COMMIT;
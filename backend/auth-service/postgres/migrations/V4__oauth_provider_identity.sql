@@ -0,0 +1,12 @@
+BEGIN;
+
+-- Вход через OAuth: INSERT ... ON CONFLICT (provider, provider_user_id).
+-- Перед применением дубликаты нужно разрешить вручную:
+-- SELECT provider, provider_user_id, count(*) FROM users
+-- WHERE provider_user_id IS NOT NULL GROUP BY 1, 2 HAVING count(*) > 1;
+CREATE UNIQUE INDEX uq_users_provider_user ON users (provider, provider_user_id);
+
+-- Заменяется индексом выше
+DROP INDEX IF EXISTS idx_users_provider_user_id;
+
+COMMIT;
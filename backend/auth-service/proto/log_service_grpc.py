@@ -0,0 +1,72 @@
+# Generated by the Protocol Buffers compiler. DO NOT EDIT!
+# source: proto/log_service.proto
+# plugin: grpclib.plugin.main
+import abc
+import typing
+
+import grpclib.const
+import grpclib.client
+if typing.TYPE_CHECKING:
+    import grpclib.server
+
+import proto.log_service_pb2
+
+
+class LogServiceBase(abc.ABC):
+
+    @abc.abstractmethod
+    async def SendLog(self, stream: 'grpclib.server.Stream[proto.log_service_pb2.LogMessage, proto.log_service_pb2.LogResponse]') -> None:
+        pass
+
+    @abc.abstractmethod
+    async def SendLogs(self, stream: 'grpclib.server.Stream[proto.log_service_pb2.LogBatch, proto.log_service_pb2.LogResponse]') -> None:
+        pass
+
+    @abc.abstractmethod
+    async def GetLogs(self, stream: 'grpclib.server.Stream[proto.log_service_pb2.LogRequest, proto.log_service_pb2.LogsResponse]') -> None:
+        pass
+
+    def __mapping__(self) -> typing.Dict[str, grpclib.const.Handler]:
+        return {
+            '/log_service.LogService/SendLog': grpclib.const.Handler(
+                self.SendLog,
+                grpclib.const.Cardinality.UNARY_UNARY,
+                proto.log_service_pb2.LogMessage,
+                proto.log_service_pb2.LogResponse,
+            ),
+            '/log_service.LogService/SendLogs': grpclib.const.Handler(
+                self.SendLogs,
+                grpclib.const.Cardinality.UNARY_UNARY,
+                proto.log_service_pb2.LogBatch,
+                proto.log_service_pb2.LogResponse,
+            ),
+            '/log_service.LogService/GetLogs': grpclib.const.Handler(
+                self.GetLogs,
+                grpclib.const.Cardinality.UNARY_UNARY,
+                proto.log_service_pb2.LogRequest,
+                proto.log_service_pb2.LogsResponse,
+            ),
+        }
+
+
+class LogServiceStub:
+
+    def __init__(self, channel: grpclib.client.Channel) -> None:
+        self.SendLog = grpclib.client.UnaryUnaryMethod(
+            channel,
+            '/log_service.LogService/SendLog',
+            proto.log_service_pb2.LogMessage,
+            proto.log_service_pb2.LogResponse,
+        )
+        self.SendLogs = grpclib.client.UnaryUnaryMethod(
+            channel,
+            '/log_service.LogService/SendLogs',
+            proto.log_service_pb2.LogBatch,
+            proto.log_service_pb2.LogResponse,
+        )
+        self.GetLogs = grpclib.client.UnaryUnaryMethod(
+            channel,
+            '/log_service.LogService/GetLogs',
+            proto.log_service_pb2.LogRequest,
+            proto.log_service_pb2.LogsResponse,
+        )
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: proto/log_service.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x17proto/log_service.proto\x12\x0blog_service\"\xbe\x03\n\nLogMessage\x12\x11\n\ttimestamp\x18\x01 \x01(\x03\x12\x14\n\x0cservice_name\x18\x02 \x01(\t\x12$\n\x05level\x18\x03 \x01(\x0e\x32\x15.log_service.LogLevel\x12\x0f\n\x07message\x18\x04 \x01(\t\x12\x10\n\x08metadata\x18\x05 \x01(\t\x12\x14\n\x07user_id\x18\x06 \x01(\x05H\x00\x88\x01\x01\x12\x13\n\x06\x61\x63tion\x18\x07 \x01(\tH\x01\x88\x01\x01\x12\x15\n\x08trace_id\x18\x08 \x01(\tH\x02\x88\x01\x01\x12\x14\n\x07span_id\x18\t \x01(\tH\x03\x88\x01\x01\x12\x1b\n\x0eparent_span_id\x18\n \x01(\tH\x04\x88\x01\x01\x12\x16\n\tspan_name\x18\x0b \x01(\tH\x05\x88\x01\x01\x12\x1a\n\rspan_start_us\x18\x0c \x01(\x03H\x06\x88\x01\x01\x12\x1d\n\x10span_duration_us\x18\r \x01(\x03H\x07\x88\x01\x01\x42\n\n\x08_user_idB\t\n\x07_actionB\x0b\n\t_trace_idB\n\n\x08_span_idB\x11\n\x0f_parent_span_idB\x0c\n\n_span_nameB\x10\n\x0e_span_start_usB\x13\n\x11_span_duration_us\"1\n\x08LogBatch\x12%\n\x04logs\x18\x01 \x03(\x0b\x32\x17.log_service.LogMessage\"\xe7\x01\n\nLogRequest\x12\x17\n\x0fstart_timestamp\x18\x01 \x01(\x03\x12\x15\n\rend_timestamp\x18\x02 \x01(\x03\x12)\n\x05level\x18\x03 \x01(\x0e\x32\x15.log_service.LogLevelH\x00\x88\x01\x01\x12\x19\n\x0cservice_name\x18\x04 \x01(\tH\x01\x88\x01\x01\x12\x14\n\x07user_id\x18\x05 \x01(\x05H\x02\x88\x01\x01\x12\x11\n\tpage_size\x18\x06 \x01(\x05\x12\x13\n\x0bpage_number\x18\x07 \x01(\x05\x42\x08\n\x06_levelB\x0f\n\r_service_nameB\n\n\x08_user_id\"r\n\x0cLogsResponse\x12%\n\x04logs\x18\x01 \x03(\x0b\x32\x17.log_service.LogMessage\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x13\n\x0bpage_number\x18\x03 \x01(\x05\x12\x11\n\tpage_size\x18\x04 \x01(\x05\"<\n\x0bLogResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\x05\x65rror\x18\x02 \x01(\tH\x00\x88\x01\x01\x42\x08\n\x06_error*E\n\x08LogLevel\x12\t\n\x05\x44\x45\x42UG\x10\x00\x12\x08\n\x04INFO\x10\x01\x12\x0b\n\x07WARNING\x10\x02\x12\t\n\x05\x45RROR\x10\x03\x12\x0c\n\x08\x43RITICAL\x10\x04\x32\xcc\x01\n\nLogService\x12>\n\x07SendLog\x12\x17.log_service.LogMessage\x1a\x18.log_service.LogResponse\"\x00\x12=\n\x08SendLogs\x12\x15.log_service.LogBatch\x1a\x18.log_service.LogResponse\"\x00\x12?\n\x07GetLogs\x12\x17.log_service.LogRequest\x1a\x19.log_service.LogsResponse\"\x00\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto.log_service_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _LOGLEVEL._serialized_start=952
+  _LOGLEVEL._serialized_end=1021
+  _LOGMESSAGE._serialized_start=41
+  _LOGMESSAGE._serialized_end=487
+  _LOGBATCH._serialized_start=489
+  _LOGBATCH._serialized_end=538
+  _LOGREQUEST._serialized_start=541
+  _LOGREQUEST._serialized_end=772
+  _LOGSRESPONSE._serialized_start=774
+  _LOGSRESPONSE._serialized_end=888
+  _LOGRESPONSE._serialized_start=890
+  _LOGRESPONSE._serialized_end=950
+  _LOGSERVICE._serialized_start=1024
+  _LOGSERVICE._serialized_end=1228
+# @@protoc_insertion_point(module_scope)
@@ -1,5 +1,5 @@
 from app import create_app
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app('app.config.DevelopmentConfig')
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,6 +1,18 @@
+import collections
+import contextlib
+import fakeredis
 import pytest
-from unittest.mock import MagicMock, patch
-from app import create_app, db, redis_client
+import redis
+from unittest.mock import patch
+from sqlalchemy import event
+from app import create_app, db
+from app.services.redis_client import InstrumentedRedis
+
+# Redis в памяти за тем же инструментированным клиентом, что и в рабочем режиме
+fake_redis = InstrumentedRedis(connection_pool=redis.ConnectionPool(
+    connection_class=fakeredis.FakeRedisConnection,
+    server=fakeredis.FakeServer()
+))
 
 
 @pytest.fixture
@@ -25,12 +37,10 @@ def app():
 
 @pytest.fixture(autouse=True)
 def mock_redis():
-    """Мок для Redis, который будет использоваться автоматически во всех тестах"""
-    with patch('app.redis_client') as mock:
-        mock.setex.return_value = True
-        mock.get.return_value = None
-        mock.delete.return_value = True
-        yield mock
+    """Redis в памяти, который будет использоваться автоматически во всех тестах"""
+    with patch('app.services.redis_client.create_redis_client', return_value=fake_redis):
+        yield fake_redis
+    fake_redis.flushall()
 
 
 @pytest.fixture
@@ -65,3 +75,45 @@ def access_token(client, db_session):
         'password': 'testpass123'
     })
     return response.json['access_token']
+
+
+class QueryCounter:
+    """Счетчик SQL запросов и загруженных ORM объектов"""
+
+    def __init__(self):
+        self.statements = []
+        self.loaded = collections.Counter()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _on_load(self, target, context):
+        self.loaded[type(target).__name__] += 1
+
+    def _on_refresh(self, target, context, attrs):
+        self.loaded[type(target).__name__] += 1
+
+    @contextlib.contextmanager
+    def __call__(self):
+        """Подсчет запросов внутри блока with"""
+        self.statements.clear()
+        self.loaded.clear()
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        event.listen(db.Model, 'load', self._on_load, propagate=True)
+        event.listen(db.Model, 'refresh', self._on_refresh, propagate=True)
+        try:
+            yield self
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+            event.remove(db.Model, 'load', self._on_load)
+            event.remove(db.Model, 'refresh', self._on_refresh)
+
+
+@pytest.fixture
+def count_queries(db_session):
+    """Фикстура для проверки количества запросов эндпоинта"""
+    return QueryCounter()
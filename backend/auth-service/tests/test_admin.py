@@ -1,6 +1,10 @@
+import json
+import time
 import pytest
+from unittest.mock import patch
 from app.models.role import Role, Permission
 from app.models.user import User
+from app.services.auth_service import AuthService
 
 @pytest.fixture
 def admin_token(client, db_session):
@@ -116,3 +120,183 @@ def test_update_user_roles(client, db_session, admin_token):
     )
     assert response.status_code == 200
     assert 'test_role' in response.json['roles']
+
+@pytest.fixture
+def many_users(db_session):
+    """Пользователи для проверки списка: половина из GitHub"""
+    users = [
+        User(username=f'user_{i:02d}', email=f'user_{i:02d}@example.com',
+             provider='github' if i % 2 else None)
+        for i in range(25)
+    ]
+    db_session.add_all(users)
+    db_session.commit()
+    return users
+
+def test_list_users_keyset_pagination(client, db_session, admin_token, many_users):
+    """Тест обхода списка пользователей по курсору"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    seen, cursor = [], None
+    while True:
+        response = client.get('/auth/admin/users', query_string={'limit': 10, 'cursor': cursor or ''},
+                              headers=headers)
+        assert response.status_code == 200
+        seen.extend(user['id'] for user in response.json['users'])
+        cursor = response.json['next_cursor']
+        if not cursor:
+            break
+    # 25 пользователей + админ, без пропусков и повторов
+    assert seen == sorted(set(seen))
+    assert len(seen) == 26
+
+def test_list_users_filters(client, db_session, admin_token, many_users):
+    """Тест фильтров и поиска по префиксу"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+
+    response = client.get('/auth/admin/users?provider=github&limit=100', headers=headers)
+    assert len(response.json['users']) == 12
+
+    response = client.get('/auth/admin/users?role=admin', headers=headers)
+    assert [user['username'] for user in response.json['users']] == ['admin']
+
+    response = client.get('/auth/admin/users?q=USER_1', headers=headers)
+    assert len(response.json['users']) == 10
+
+    # Спецсимволы LIKE в запросе экранируются
+    response = client.get('/auth/admin/users?q=user%25', headers=headers)
+    assert response.json['users'] == []
+
+    response = client.get('/auth/admin/users?created_after=not-a-date', headers=headers)
+    assert response.status_code == 400
+
+def test_export_users_ndjson(client, db_session, admin_token, many_users):
+    """Тест потоковой выгрузки пользователей"""
+    response = client.get('/auth/admin/users/export?provider=github',
+                          headers={'Authorization': f'Bearer {admin_token}'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 12
+    assert all(line['provider'] == 'github' for line in lines)
+
+def test_bulk_update_user_roles(client, db_session, admin_token, many_users, mock_redis, count_queries):
+    """Тест массового добавления и удаления ролей несколькими set-based запросами"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    db_session.add_all([Role(name='editor'), Role(name='viewer')])
+    db_session.commit()
+
+    with count_queries() as queries:
+        response = client.post('/auth/admin/users/roles/bulk', json={
+            'filter': {'provider': 'github'}, 'add': ['editor', 'viewer']
+        }, headers=headers)
+    assert response.status_code == 200
+    assert response.json['roles_added'] == 24
+    assert response.json['users_affected'] == 12
+    # Разрешение имен ролей, INSERT ... SELECT и немного запросов аутентификации, независимо от числа пользователей
+    assert queries.count <= 6
+
+    # Повтор не создает дубликатов
+    response = client.post('/auth/admin/users/roles/bulk', json={
+        'filter': {'provider': 'github'}, 'add': ['editor']
+    }, headers=headers)
+    assert response.json['roles_added'] == 0
+
+    user_ids = [user.id for user in many_users[:4]]
+    response = client.post('/auth/admin/users/roles/bulk', json={
+        'user_ids': user_ids, 'remove': ['viewer']
+    }, headers=headers)
+    assert response.json['roles_removed'] == 2
+    assert response.json['users_revoked'] == 2
+    # Выпущенные токены потерявших роль пользователей отозваны через эпоху
+    assert mock_redis.get(f'token_epoch:{user_ids[1]}') == b'1'
+    assert mock_redis.get(f'token_epoch:{user_ids[0]}') is None
+
+    response = client.post('/auth/admin/users/roles/bulk', json={
+        'user_ids': user_ids, 'add': ['missing']
+    }, headers=headers)
+    assert response.status_code == 400
+
+def test_bulk_update_user_roles_rejects_invalid_filter(client, db_session, admin_token):
+    """Тест: фильтр с нестроковыми значениями или неизвестными полями отклоняется с 400"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    for filters in ({'q': 5}, {'role': ['x']}, {'provider': {}}, {'created_after': 1}, {'rol': 'admin'}):
+        response = client.post('/auth/admin/users/roles/bulk', json={
+            'filter': filters, 'add': ['admin']
+        }, headers=headers)
+        assert response.status_code == 400, filters
+        assert 'error' in response.json
+
+def test_bulk_update_role_permissions(client, db_session, admin_token):
+    """Тест массового изменения прав ролей"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    db_session.add_all([Role(name='editor'), Permission(name='read'), Permission(name='write')])
+    db_session.commit()
+
+    response = client.post('/auth/admin/roles/permissions/bulk', json={
+        'roles': ['admin', 'editor'], 'add': ['read', 'write']
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json['permissions_added'] == 4
+    assert response.json['users_affected'] == 1
+
+    response = client.post('/auth/admin/roles/permissions/bulk', json={
+        'roles': ['editor'], 'remove': ['write']
+    }, headers=headers)
+    assert response.json['permissions_removed'] == 1
+    roles = {role['name']: role for role in client.get('/auth/admin/roles', headers=headers).json}
+    assert roles['editor']['permissions'] == ['read']
+    assert sorted(roles['admin']['permissions']) == ['read', 'write']
+
+def test_update_logging_settings(client, db_session, admin_token):
+    """Тест изменения уровня логирования и сэмплирования без перезапуска"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    response = client.put('/auth/admin/logging', json={
+        'level': 'info', 'sampling': {'validate_token': 0.01}
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json == {'level': 'INFO', 'sampling': {'validate_token': 0.01}}
+    assert client.get('/auth/admin/logging', headers=headers).json == response.json
+
+    response = client.put('/auth/admin/logging', json={'sampling': {'validate_token': 2}}, headers=headers)
+    assert response.status_code == 400
+
+def test_profiler_header_session(client, db_session, admin_token):
+    """Тест: профилирование только запросов с токеном сессии в заголовке"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    response = client.post('/auth/admin/profiler', json={'duration': 30, 'header_only': True, 'interval_ms': 1},
+                           headers=headers)
+    assert response.status_code == 200
+    session = response.json['session']
+    assert response.json['header'] == 'X-Profile-Token'
+
+    def slow_profile(user_id):
+        time.sleep(0.2)
+        return get_user_profile(user_id)
+
+    get_user_profile = AuthService.get_user_profile
+    with patch.object(AuthService, 'get_user_profile', side_effect=slow_profile):
+        assert client.get('/auth/me', headers=headers).status_code == 200
+        assert client.get('/auth/admin/profiler/profile', headers=headers).status_code == 404
+
+        profiled = {**headers, 'X-Profile-Token': session['token']}
+        assert client.get('/auth/me', headers=profiled).status_code == 200
+
+    response = client.get(f"/auth/admin/profiler/profile?session={session['id']}", headers=headers)
+    assert response.status_code == 200
+    stacks = [line.rsplit(' ', 1) for line in response.get_data(as_text=True).splitlines()]
+    assert all(stack.startswith('GET /auth/me;') and int(count) > 0 for stack, count in stacks)
+    assert any('slow_profile' in stack for stack, _count in stacks)
+
+    assert client.delete('/auth/admin/profiler', headers=headers).json == {'active': False, 'session': None}
+
+
+def test_profiler_window_turns_itself_off(client, db_session, admin_token):
+    """Тест: сессия окна выключается сама по истечении времени"""
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    assert client.post('/auth/admin/profiler', json={'duration': 0}, headers=headers).status_code == 400
+
+    response = client.post('/auth/admin/profiler', json={'duration': 0.2}, headers=headers)
+    assert response.json['session']['token'] is None
+    assert client.get('/auth/admin/profiler', headers=headers).json['active'] is True
+    time.sleep(0.3)
+    assert client.get('/auth/admin/profiler', headers=headers).json['active'] is False
@@ -0,0 +1,133 @@
+import asyncio
+import fakeredis
+import pytest
+from unittest.mock import patch
+from flask import request
+from sqlalchemy.pool import StaticPool
+from starlette.testclient import TestClient
+from app import db
+from app.asgi import create_asgi_app
+from app.config import TestingConfig
+
+
+class AsgiTestingConfig(TestingConfig):
+    """Одна база SQLite в памяти для всех потоков, в которых ASGI сервер выполняет Flask"""
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+
+
+@pytest.fixture
+def asgi(mock_redis):
+    """ASGI приложение с асинхронным Redis поверх того же сервера в памяти"""
+    server = mock_redis.connection_pool.connection_kwargs['server']
+    with patch('app.asgi.create_async_redis_client',
+               side_effect=lambda config: fakeredis.FakeAsyncRedis(server=server)):
+        app = create_asgi_app(AsgiTestingConfig)
+        flask_app = app.state.flask_app
+        with flask_app.app_context():
+            db.create_all()
+        # Запросы, дошедшие до Flask
+        flask_app.flask_requests = []
+        flask_app.before_request(lambda: flask_app.flask_requests.append(request.path))
+        with TestClient(app) as client:
+            yield client, flask_app
+        with flask_app.app_context():
+            db.drop_all()
+
+
+@pytest.fixture
+def asgi_token(asgi):
+    client, flask_app = asgi
+    client.post('/auth/register', json={
+        'username': 'testuser', 'email': 'test@example.com', 'password': 'testpass123'
+    })
+    response = client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass123'})
+    assert response.status_code == 200
+    flask_app.flask_requests.clear()
+    return response.json()['access_token']
+
+
+def test_read_endpoints_served_without_flask(asgi, asgi_token):
+    """Тест: валидация и профиль обслуживаются в цикле событий без перехода во Flask"""
+    client, flask_app = asgi
+    headers = {'Authorization': f'Bearer {asgi_token}'}
+
+    response = client.post('/auth/validate', headers=headers)
+    assert response.status_code == 200
+    assert response.json()['valid'] is True
+    assert response.json()['roles'] == []
+
+    response = client.get('/auth/me', headers=headers)
+    assert response.status_code == 200
+    assert response.json()['username'] == 'testuser'
+    # Второй запрос - из кеша профилей
+    assert client.get('/auth/me', headers=headers).json() == response.json()
+
+    response = client.post('/auth/validate/batch', json={'tokens': [asgi_token, 'garbage']})
+    assert response.status_code == 200
+    assert [result['valid'] for result in response.json()['results']] == [True, False]
+    assert flask_app.flask_requests == []
+
+
+def test_errors_keep_flask_contracts(asgi, asgi_token):
+    """Тест: ошибки этих эндпоинтов формирует Flask приложение с прежними ответами"""
+    client, flask_app = asgi
+    headers = {'Authorization': f'Bearer {asgi_token}'}
+
+    response = client.post('/auth/validate')
+    assert response.status_code == 401
+    assert response.json() == {'valid': False, 'error': 'Missing or invalid Authorization header'}
+
+    response = client.post('/auth/validate/batch', json={'tokens': []})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'Non-empty tokens list is required'}
+
+    assert client.post('/auth/logout', json={}, headers=headers).status_code == 200
+    response = client.post('/auth/validate', headers=headers)
+    assert response.status_code == 401
+    assert response.json() == {'valid': False, 'error': 'Token has been revoked'}
+    assert client.get('/auth/me', headers=headers).status_code == 401
+    response = client.post('/auth/validate/batch', json={'tokens': [asgi_token]})
+    assert response.json()['results'] == [{'valid': False, 'error': 'token_revoked'}]
+
+
+def test_last_seen_flush_runs_off_the_event_loop(asgi, asgi_token):
+    """Тест: запись накопленных last-seen из ASGI эндпоинтов выполняется в потоке, а не в цикле событий"""
+    from app.models import session
+    client, _ = asgi
+    in_event_loop = []
+    session._last_seen.configure(interval=0, flush_interval=0, max_batch=500)
+    with patch.object(session._last_seen, 'flush', side_effect=lambda: in_event_loop.append(_in_event_loop())):
+        assert client.post('/auth/validate', headers={'Authorization': f'Bearer {asgi_token}'}).status_code == 200
+    assert in_event_loop == [False]
+
+
+def test_event_loop_endpoints_are_profiled(asgi, asgi_token):
+    """Тест: профилировщик снимает стек цикла событий, пока выполняется эндпоинт без Flask"""
+    import time
+    from app import profiler
+    from app.models.session import SessionManager
+    client, flask_app = asgi
+
+    async def blocking_touch(user_id, device_id):
+        # Блокирующий вызов в цикле событий - то, что должен показать профиль
+        time.sleep(0.2)
+
+    session = profiler.start(30, interval=0.001)
+    try:
+        with patch.object(SessionManager, 'touch_async', side_effect=blocking_touch):
+            response = client.get('/auth/me', headers={'Authorization': f'Bearer {asgi_token}'})
+        assert response.status_code == 200
+        assert flask_app.flask_requests == []
+    finally:
+        profiler.stop()
+
+    stacks = [line.rsplit(' ', 1)[0] for line in profiler.profile(session['id']).splitlines()]
+    assert any(stack.startswith('GET /auth/me;') and 'blocking_touch' in stack for stack in stacks)
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
@@ -1,6 +1,7 @@
 import pytest
 from app.models.user import User
 from app.models.role import Role, Permission
+from app.services.profile_cache import PROFILE_KEY
 
 def test_register(client, db_session):
     """Тест регистрации пользователя"""
@@ -106,3 +107,266 @@ def test_validate_invalid_token(client):
     })
     assert response.status_code == 422
     assert response.json['valid'] is False
+
+def test_jwks_verifies_access_token(client, access_token):
+    """Тест проверки access токена по опубликованному JWKS"""
+    import jwt
+
+    response = client.get('/auth/.well-known/jwks.json')
+    assert response.status_code == 200
+    assert 'max-age' in response.headers['Cache-Control']
+
+    kid = jwt.get_unverified_header(access_token)['kid']
+    jwk = next(key for key in response.json['keys'] if key['kid'] == kid)
+    claims = jwt.decode(access_token, jwt.PyJWK(jwk).key, algorithms=[jwk['alg']],
+                        issuer='frame-auth-service')
+    assert claims['type'] == 'access'
+
+def test_signing_keys_required_outside_development(app):
+    """Тест: без JWT_KEYS_DIR временный ключ генерируется только при JWT_EPHEMERAL_KEY"""
+    from app.services.key_manager import KeyManager
+
+    app.config.update(JWT_KEYS_DIR=None, JWT_EPHEMERAL_KEY=False)
+    with pytest.raises(RuntimeError):
+        KeyManager(app)
+
+    app.config['JWT_EPHEMERAL_KEY'] = True
+    assert KeyManager(app).signing_key()[0]
+
+def test_token_kid_matches_signing_key_during_rotation(app):
+    """Тест: смена активного ключа между заголовком и подписью не дает токен с чужим kid"""
+    from unittest.mock import patch
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    from flask_jwt_extended import create_access_token
+    from app import key_manager
+
+    kid, private_key = key_manager.signing_key()
+    pairs = iter([(kid, private_key), ('rotated', ed25519.Ed25519PrivateKey.generate())])
+    with app.app_context(), patch.object(key_manager, 'signing_key', side_effect=lambda: next(pairs)):
+        token = create_access_token(identity='1')
+
+    assert jwt.get_unverified_header(token)['kid'] == kid
+    assert jwt.decode(token, private_key.public_key(), algorithms=['EdDSA'])['sub'] == '1'
+
+def test_validate_batch(client, access_token):
+    """Тест пакетной валидации токенов"""
+    response = client.post('/auth/validate/batch', json={
+        'tokens': [access_token, 'invalid_token', 123]
+    })
+    assert response.status_code == 200
+    results = response.json['results']
+    assert results[0]['valid'] is True
+    assert results[0]['roles'] == []
+    assert results[1] == {'valid': False, 'error': 'invalid_token'}
+    assert results[2] == {'valid': False, 'error': 'invalid_token'}
+
+    client.post('/auth/logout', json={}, headers={'Authorization': f'Bearer {access_token}'})
+    response = client.post('/auth/validate/batch', json={'tokens': [access_token]})
+    assert response.json['results'] == [{'valid': False, 'error': 'token_revoked'}]
+
+    response = client.post('/auth/validate/batch', json={'tokens': []})
+    assert response.status_code == 400
+
+def test_logout_revokes_access_token(client, access_token):
+    """Тест отзыва access токена при выходе"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    response = client.post('/auth/logout', json={}, headers=headers)
+    assert response.status_code == 200
+
+    assert client.get('/auth/me', headers=headers).status_code == 401
+    response = client.post('/auth/validate', headers=headers)
+    assert response.status_code == 401
+    assert response.json['valid'] is False
+
+def test_logout_all_revokes_previous_tokens(client, access_token):
+    """Тест отзыва всех токенов пользователя через эпоху"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    assert client.post('/auth/logout/all', headers=headers).status_code == 200
+    assert client.post('/auth/validate', headers=headers).status_code == 401
+
+    # Новые токены выпускаются с актуальной эпохой и остаются валидными
+    response = client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass123'})
+    new_headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+    assert client.post('/auth/validate', headers=new_headers).status_code == 200
+
+def login(client, device_id=None):
+    """Регистрация и вход тестового пользователя"""
+    client.post('/auth/register', json={
+        'username': 'testuser',
+        'email': 'test@example.com',
+        'password': 'testpass123'
+    })
+    return client.post('/auth/login', json={
+        'username': 'testuser',
+        'password': 'testpass123',
+        'device_id': device_id
+    }).json
+
+def test_refresh_rotates_token(client, db_session):
+    """Тест ротации refresh токена"""
+    tokens = login(client)
+    response = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+    assert response.json['refresh_token'] != tokens['refresh_token']
+
+    # Новый refresh токен работает
+    response = client.post('/auth/refresh', json={'refresh_token': response.json['refresh_token']})
+    assert response.status_code == 200
+
+def test_concurrent_refresh_returns_same_tokens(client, db_session):
+    """Тест повтора refresh токена в окне: выдается та же пара токенов"""
+    tokens = login(client)
+    first = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    second = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert second.status_code == 200
+    assert second.json == first.json
+
+def test_refresh_reuse_after_grace_revokes_sessions(client, app, db_session):
+    """Тест отзыва сессий при повторе использованного refresh токена после окна"""
+    app.config['REFRESH_TOKEN_REUSE_GRACE'] = 1
+    tokens = login(client)
+    rotated = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']}).json
+
+    from app import redis_client
+    for key in redis_client.scan_iter(match='refresh_token_grace:*'):
+        redis_client.delete(key)
+
+    response = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 401
+    response = client.post('/auth/refresh', json={'refresh_token': rotated['refresh_token']})
+    assert response.status_code == 401
+
+def test_sessions_list_and_logout_all(client, db_session):
+    """Тест списка сессий и выхода со всех устройств"""
+    tokens = login(client)
+    login(client)
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    response = client.get('/auth/sessions', headers=headers)
+    assert response.status_code == 200
+    assert len(response.json['sessions']) == 2
+
+    client.post('/auth/logout/all', headers=headers)
+    response = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 401
+
+def test_session_per_device(client, db_session, mock_redis):
+    """Тест отдельной компактной сессии для каждого устройства"""
+    phone = login(client, device_id='phone')
+    laptop = login(client, device_id='laptop')
+    assert phone['device_id'] == 'phone'
+
+    # Повторный вход с того же устройства не создает новую сессию
+    login(client, device_id='laptop')
+    headers = {'Authorization': f"Bearer {laptop['access_token']}"}
+    sessions = client.get('/auth/sessions', headers=headers).json['sessions']
+    assert sorted(s['device_id'] for s in sessions) == ['laptop', 'phone']
+    assert [s['current'] for s in sessions if s['device_id'] == 'laptop'] == [True]
+    user_id = phone['user']['id']
+    assert len(mock_redis.hget(f'sessions:{{{user_id}}}', 'phone')) == 24
+
+    # Завершение сессии телефона отзывает его refresh токен
+    assert client.delete('/auth/sessions/phone', headers=headers).status_code == 200
+    response = client.post('/auth/refresh', json={'refresh_token': phone['refresh_token']})
+    assert response.status_code == 401
+    assert client.delete('/auth/sessions/phone', headers=headers).status_code == 404
+
+def test_relogin_on_device_revokes_previous_refresh_token(client, db_session):
+    """Тест: повторный вход с того же устройства отзывает refresh токен прежнего входа"""
+    first = login(client, device_id='laptop')
+    second = login(client, device_id='laptop')
+    response = client.post('/auth/refresh', json={'refresh_token': first['refresh_token']})
+    assert response.status_code == 401
+
+    headers = {'Authorization': f"Bearer {second['access_token']}"}
+    assert client.delete('/auth/sessions/laptop', headers=headers).status_code == 200
+    for tokens in (first, second):
+        response = client.post('/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+        assert response.status_code == 401
+
+def test_last_seen_updates_are_throttled(client, db_session, mock_redis):
+    """Тест троттлинга обновлений last-seen"""
+    from app.models.session import SessionManager
+    tokens = login(client, device_id='phone')
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+    user_id = tokens['user']['id']
+    mock_redis.zadd(f'sessions_seen:{{{user_id}}}', {'phone': 0})
+
+    client.get('/auth/me', headers=headers)
+    assert SessionManager.flush_last_seen() == 1
+    client.get('/auth/me', headers=headers)
+    assert SessionManager.flush_last_seen() == 0
+    assert mock_redis.zscore(f'sessions_seen:{{{user_id}}}', 'phone') > 0
+
+
+def test_me_profile_cache_invalidated_on_role_change(client, db_session, mock_redis):
+    """Тест кеширования /auth/me и сброса кеша при изменении ролей"""
+    admin_role = Role(name='admin')
+    db_session.add(admin_role)
+    client.post('/auth/register', json={
+        'username': 'admin', 'email': 'admin@example.com', 'password': 'adminpass123'
+    })
+    user = User.query.filter_by(username='admin').first()
+    user.roles.append(admin_role)
+    db_session.commit()
+    response = client.post('/auth/login', json={'username': 'admin', 'password': 'adminpass123'})
+    headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+
+    assert client.get('/auth/me', headers=headers).json['roles'] == ['admin']
+    assert mock_redis.get(PROFILE_KEY.format(user.id)) is not None
+
+    db_session.add(Role(name='editor'))
+    db_session.commit()
+    response = client.put(f'/auth/admin/users/{user.id}/roles', json={'roles': ['admin', 'editor']},
+                          headers=headers)
+    assert response.status_code == 200
+    assert mock_redis.get(PROFILE_KEY.format(user.id)) is None
+    assert sorted(client.get('/auth/me', headers=headers).json['roles']) == ['admin', 'editor']
+
+
+def test_last_login_written_in_batches(client, db_session, count_queries):
+    """Тест отложенной пакетной записи времени входа"""
+    from app import last_login_buffer
+    for name in ('first', 'second'):
+        client.post('/auth/register', json={
+            'username': name, 'email': f'{name}@example.com', 'password': 'password123'
+        })
+
+    with count_queries() as queries:
+        response = client.post('/auth/login', json={'username': 'first', 'password': 'password123'})
+        client.post('/auth/login', json={'username': 'second', 'password': 'password123'})
+    assert not [statement for statement in queries.statements if statement.lstrip().upper().startswith('UPDATE')]
+    headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+    assert client.get('/auth/me', headers=headers).json['last_login_at'] is None
+
+    assert last_login_buffer.flush() == 2
+    db_session.expire_all()
+    assert all(user.last_login_at is not None for user in User.query.all())
+    # Профиль в кеше сброшен вместе с записью
+    assert client.get('/auth/me', headers=headers).json['last_login_at'] is not None
+    assert last_login_buffer.flush() == 0
+
+
+def test_register_duplicate_ignores_case(client, db_session, count_queries):
+    """Тест уникальности username и email без учета регистра одной вставкой"""
+    client.post('/auth/register', json={
+        'username': 'Alice', 'email': 'Alice@Example.com', 'password': 'password123'
+    })
+
+    with count_queries() as queries:
+        response = client.post('/auth/register', json={
+            'username': 'bob', 'email': 'alice@example.com', 'password': 'password123'
+        })
+    assert response.status_code == 409
+    assert response.json['error'] == 'User with this email already exists'
+    assert queries.count == 1
+
+    response = client.post('/auth/register', json={
+        'username': 'ALICE', 'email': 'other@example.com', 'password': 'password123'
+    })
+    assert response.status_code == 409
+    assert response.json['error'] == 'User with this username already exists'
+
+    response = client.post('/auth/login', json={'username': 'alice', 'password': 'password123'})
+    assert response.status_code == 200
@@ -0,0 +1,37 @@
+import threading
+from benchmarks.harness import benchmark_app, compare, run_scenario
+from benchmarks.scenarios import OPERATIONS, SCENARIOS, Worker
+
+
+def test_mixed_scenario_runs_without_errors():
+    """Тест: короткий прогон смешанного сценария проходит все операции без ошибок"""
+    with benchmark_app(users=5) as (app, fixtures):
+        results = run_scenario(app, fixtures, OPERATIONS, SCENARIOS['mixed'], Worker,
+                               concurrency=2, duration=0.5, warmup=0)
+
+    # Фоновая запись last_login не переживает прогон и не пишет в удаленную БД
+    assert not [thread for thread in threading.enumerate() if thread.name == 'last-login-writer']
+
+    assert set(results) <= set(SCENARIOS['mixed'])
+    assert results['me']['requests'] > 0
+    assert all(stats['errors'] == 0 for stats in results.values())
+    assert all(stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms'] for stats in results.values())
+
+
+def test_compare_with_baseline():
+    """Тест: регрессии p99, RPS и доли ошибок относительно базового прогона"""
+    baseline = {
+        'thresholds': {'latency': 0.25, 'throughput': 0.2, 'error_rate': 0.01},
+        'scenarios': {'mixed': {
+            'me': {'requests': 1000, 'errors': 0, 'rps': 100.0, 'p50_ms': 1.0, 'p95_ms': 4.0, 'p99_ms': 10.0},
+            'login': {'requests': 1000, 'errors': 0, 'rps': 100.0, 'p50_ms': 1.0, 'p95_ms': 4.0, 'p99_ms': 10.0},
+        }},
+    }
+    results = {'mixed': {
+        'me': {'requests': 1000, 'errors': 0, 'rps': 90.0, 'p50_ms': 1.0, 'p95_ms': 4.0, 'p99_ms': 12.0},
+        'login': {'requests': 700, 'errors': 20, 'rps': 70.0, 'p50_ms': 1.0, 'p95_ms': 4.0, 'p99_ms': 13.0},
+    }}
+
+    failures = compare(results, baseline)
+    assert not any(failure.startswith('mixed/me') for failure in failures)
+    assert len([failure for failure in failures if failure.startswith('mixed/login')]) == 3
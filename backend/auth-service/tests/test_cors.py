@@ -58,3 +58,51 @@ def test_protected_endpoint_invalid_origin(client, access_token):
     )
     assert response.status_code == 403
     assert 'Access-Control-Allow-Origin' not in response.headers
+
+
+def test_preflight_answered_before_routing(app, client):
+    """Preflight отвечается до маршрутизации: представление и before_request не выполняются"""
+    calls = []
+    app.before_request_funcs.setdefault(None, []).insert(0, lambda: calls.append(1))
+
+    response = client.options('/auth/me', headers={
+        'Origin': 'http://localhost:3000',
+        'Access-Control-Request-Method': 'GET'
+    })
+    assert response.status_code == 200
+    assert response.headers['Access-Control-Max-Age'] == str(app.config['CORS_MAX_AGE'])
+    assert 'Origin' in response.headers['Vary']
+    assert calls == []
+
+
+def test_disallowed_origin_rejected_before_view(app, client, access_token):
+    """Запрос с неразрешенным origin не доходит до представления"""
+    app.config['CORS_ALLOWED_ORIGINS'] = ['http://localhost:3000']
+
+    response = client.post('/auth/logout', headers={
+        'Origin': 'http://evil.com',
+        'Authorization': f'Bearer {access_token}'
+    })
+    assert response.status_code == 403
+    assert response.get_json() == {'error': 'Origin is not allowed'}
+    # logout не выполнился - токен по-прежнему действителен
+    response = client.get('/auth/me', headers={'Authorization': f'Bearer {access_token}'})
+    assert response.status_code == 200
+
+    response = client.options('/auth/me', headers={
+        'Origin': 'http://evil.com',
+        'Access-Control-Request-Method': 'GET'
+    })
+    assert response.status_code == 403
+    assert 'Access-Control-Allow-Origin' not in response.headers
+
+
+def test_public_endpoints_match_by_path_segments():
+    """Публичные префиксы сопоставляются по сегментам пути"""
+    from app.services.cors_policy import _PrefixTrie
+
+    trie = _PrefixTrie(['/auth/login', '/auth/oauth'])
+    assert trie.matches('/auth/login')
+    assert trie.matches('/auth/oauth/github/callback')
+    assert not trie.matches('/auth/loginx')
+    assert not trie.matches('/auth/me')
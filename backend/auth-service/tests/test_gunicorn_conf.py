@@ -0,0 +1,52 @@
+import os
+import runpy
+from unittest.mock import patch
+import pytest
+from app.config import Config
+
+CONF_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir_setting():
+    """Файл настроек задает каталог снимков метрик в Config - восстанавливаем после теста"""
+    with patch.object(Config, 'METRICS_MULTIPROC_DIR', None):
+        yield
+
+
+def test_metrics_snapshot_dir_is_prepared():
+    """Тест: без METRICS_MULTIPROC_DIR создается каталог снимков, старые снимки удаляются при старте"""
+    settings = runpy.run_path(CONF_PATH)
+    directory = Config.METRICS_MULTIPROC_DIR
+    assert directory and os.path.isdir(directory)
+
+    stale = os.path.join(directory, '1-1.json')
+    with open(stale, 'w') as snapshot_file:
+        snapshot_file.write('{}')
+    settings['on_starting'](None)
+    assert not os.path.exists(stale)
+    os.rmdir(directory)
+
+
+def test_gunicorn_settings_from_config():
+    """Тест: настройки запуска берутся из Config, приложение загружается до fork"""
+    settings = runpy.run_path(CONF_PATH)
+    assert settings['preload_app'] is True
+    assert settings['wsgi_app'] == 'wsgi:app'
+    assert settings['worker_class'] == 'gthread'
+    assert settings['workers'] == Config.SERVER_WORKERS >= 1
+    assert settings['max_requests'] == Config.SERVER_MAX_REQUESTS
+    assert settings['max_requests_jitter'] == Config.SERVER_MAX_REQUESTS_JITTER
+
+    with patch.object(Config, 'SERVER_APP', 'asgi:app'):
+        settings = runpy.run_path(CONF_PATH)
+    assert settings['worker_class'] == 'uvicorn_worker.UvicornWorker'
+
+
+def test_post_fork_disposes_inherited_connections(app):
+    """Тест: воркер после fork не использует соединения с БД мастер-процесса"""
+    settings = runpy.run_path(CONF_PATH)
+    server = type('Server', (), {'app': type('Loader', (), {'wsgi': staticmethod(lambda: app)})()})()
+    with patch('sqlalchemy.engine.Engine.dispose') as dispose:
+        settings['post_fork'](server, None)
+    dispose.assert_called_once_with(close=False)
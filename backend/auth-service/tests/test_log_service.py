@@ -0,0 +1,181 @@
+import json
+import threading
+import pytest
+from unittest.mock import patch
+from app.services.log_service import LogService, DROP_NEWEST, SPILL, records_dropped_counter, \
+    records_retried_counter, records_spilled_counter
+
+
+class FakeTransport:
+    """Транспорт, запоминающий пакеты; может имитировать недоступность log-service"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+        self.unblock = threading.Event()
+        self.unblock.set()
+
+    def send(self, records):
+        self.unblock.wait(5)
+        if self.fail:
+            raise ConnectionError("log-service is unavailable")
+        self.batches.append(records)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def transport():
+    return FakeTransport()
+
+
+@pytest.fixture
+def log_service(transport):
+    """Клиент логов с тестовым транспортом"""
+    service = LogService('test-service')
+    service.batch_size = 10
+    service.flush_interval = 60
+    service.retry_backoff = 0
+    with patch.object(service, '_make_transport', return_value=transport):
+        yield service
+        service.shutdown()
+
+
+def test_records_are_sent_in_batches(log_service, transport):
+    """Тест отправки пакетами по размеру и досылки остатка при flush"""
+    for i in range(25):
+        log_service.info(f"message {i}", user_id=i, action='test', metadata={'i': i})
+    assert log_service.flush()
+
+    assert [len(batch) for batch in transport.batches] == [10, 10, 5]
+    record = transport.batches[0][0]
+    assert record['service_name'] == 'test-service'
+    assert record['user_id'] == 0
+    assert json.loads(record['metadata']) == {'i': 0}
+
+
+def test_failed_batch_is_retried_and_dropped(log_service, transport):
+    """Тест повторов и отбрасывания пакета при недоступности log-service"""
+    transport.fail = True
+    log_service.max_retries = 2
+    dropped = records_dropped_counter.value(reason='send_failed')
+    retried = records_retried_counter.value()
+
+    for i in range(3):
+        log_service.warning(f"message {i}")
+    assert log_service.flush()
+
+    assert records_retried_counter.value() - retried == 6
+    assert records_dropped_counter.value(reason='send_failed') - dropped == 3
+
+
+def test_overflow_drop_newest(log_service, transport):
+    """Тест ограничения буфера: запрос не ждет отправку, лишние записи отбрасываются"""
+    transport.unblock.clear()
+    log_service.buffer_size = 5
+    log_service.overflow_policy = DROP_NEWEST
+    dropped = records_dropped_counter.value(reason='buffer_full')
+
+    # Первую запись забирает фоновый поток и зависает в транспорте
+    log_service.info("first")
+    assert log_service.flush(timeout=0.2) is False
+    for i in range(10):
+        log_service.info(f"message {i}")
+    transport.unblock.set()
+    assert log_service.flush()
+
+    assert records_dropped_counter.value(reason='buffer_full') - dropped == 5
+    assert sum(len(batch) for batch in transport.batches) == 6
+
+
+def test_spilled_records_are_replayed(log_service, transport, tmp_path):
+    """Тест сброса недоставленных записей на диск и досылки после восстановления связи"""
+    log_service.overflow_policy = SPILL
+    log_service.spill_path = str(tmp_path / 'spill.jsonl')
+    log_service.max_retries = 0
+    spilled = records_spilled_counter.value()
+
+    transport.fail = True
+    log_service.error("lost connection")
+    assert log_service.flush()
+    assert records_spilled_counter.value() - spilled == 1
+
+    transport.fail = False
+    log_service.info("connection restored")
+    assert log_service.flush()
+    assert [record['message'] for batch in transport.batches for record in batch] == [
+        "connection restored", "lost connection"
+    ]
+
+
+def test_level_threshold_skips_formatting(log_service, transport):
+    """Тест отбрасывания записей ниже уровня до вычисления метаданных"""
+    log_service.set_level('INFO')
+    calls = []
+    log_service.debug("skipped", metadata=lambda: calls.append('debug') or {})
+    log_service.info("kept", metadata=lambda: calls.append('info') or {'key': 'value'})
+    assert log_service.flush()
+
+    assert calls == ['info']
+    assert [record['message'] for batch in transport.batches for record in batch] == ["kept"]
+    assert json.loads(transport.batches[0][0]['metadata']) == {'key': 'value'}
+
+
+def test_sampling_by_action(log_service, transport):
+    """Тест сэмплирования DEBUG/INFO записей действия; предупреждения не сэмплируются"""
+    log_service.update_settings(sampling={'validate_token': 0})
+    for _ in range(100):
+        log_service.debug("Token validated", action='validate_token')
+    log_service.warning("Token validation failed", action='validate_token')
+    log_service.update_settings(sampling={'validate_token': None})
+    log_service.debug("Token validated", action='validate_token')
+    assert log_service.flush()
+
+    assert [record['message'] for batch in transport.batches for record in batch] == [
+        "Token validation failed", "Token validated"
+    ]
+
+
+def test_settings_are_shared_through_redis(app, log_service, mock_redis):
+    """Тест применения настроек, измененных в другом воркере"""
+    log_service.init_app(app, mock_redis)
+    log_service.settings_refresh_interval = 0
+
+    other_worker = LogService('test-service')
+    other_worker.init_app(app, mock_redis)
+    other_worker.update_settings(level='WARNING', sampling={'get_user_info': 0.5})
+
+    log_service._refresh_settings()
+    assert log_service.settings() == {'level': 'WARNING', 'sampling': {'get_user_info': 0.5}}
+
+
+def test_grpc_transport_requires_client_modules(app):
+    """Тест: при LOG_TRANSPORT=grpc без gRPC модулей сервис не запускается, а не пишет в консоль"""
+    service = LogService('test-service')
+    app.config['LOG_TRANSPORT'] = 'grpc'
+    with patch.dict('sys.modules', {'proto.log_service_grpc': None}):
+        with pytest.raises(RuntimeError):
+            service.init_app(app)
+
+    service.init_app(app)
+    assert service.transport_name == 'grpc'
+
+
+def test_grpc_transport_builds_log_batch():
+    """Тест: поставляемые модули proto принимают все поля записи, включая трассировку"""
+    from app.services.log_service import GrpcTransport
+    from app.services.tracing import Span
+
+    service = LogService('test-service')
+    span = Span('GET /auth/me', 'a' * 32, parent_span_id='b' * 16)
+    record = service._serialize((1, 1, 'span GET /auth/me', '7', 'span', {'status': 200},
+                                 (span.trace_id, span.span_id, span.parent_span_id, span.name, span.start_us, 42)))
+
+    transport = GrpcTransport('localhost', 50051, 1.0)
+    try:
+        message = transport._message(record)
+    finally:
+        transport.close()
+    assert message.user_id == 7
+    assert (message.trace_id, message.parent_span_id, message.span_duration_us) == ('a' * 32, 'b' * 16, 42)
@@ -0,0 +1,97 @@
+from app.services.metrics import MetricsRegistry
+
+
+def _sample(body, prefix):
+    """Значение первого ряда метрики, строка которого начинается с prefix"""
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_metrics_endpoint(client, access_token):
+    """Тест: /auth/metrics отдает время по маршрутам, коды ответов и SQL запросы"""
+    assert client.get('/auth/me', headers={'Authorization': f'Bearer {access_token}'}).status_code == 200
+    client.put('/auth/admin/users/12345/roles', json={})
+
+    response = client.get('/auth/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+
+    assert '# TYPE auth_http_request_duration_seconds histogram' in body
+    me_labels = 'blueprint="auth",route="/auth/me",method="GET"'
+    assert _sample(body, f'auth_http_request_duration_seconds_count{{{me_labels}}}') >= 1
+    assert _sample(body, f'auth_http_requests_total{{{me_labels},status="200"}}') >= 1
+    # Метки по шаблону маршрута, а не по пути
+    assert 'route="/auth/admin/users/<int:user_id>/roles"' in body
+    assert '/users/12345' not in body
+    assert _sample(body, 'auth_db_statement_duration_seconds_count{operation="SELECT"}') >= 1
+    assert _sample(body, 'auth_http_request_db_statements_count{blueprint="auth",route="/auth/login"}') >= 1
+    # Метрики сервисов: Redis, пул bcrypt, буфер клиента логов
+    for name in ('auth_redis_command_duration_seconds_bucket', 'auth_bcrypt_queue_wait_seconds_bucket',
+                 'auth_log_buffer_records'):
+        assert f'\n{name}' in body
+
+
+def test_metrics_disabled(app, client):
+    """Тест: при METRICS_ENABLED=false эндпоинт не доступен"""
+    app.config['METRICS_ENABLED'] = False
+    assert client.get('/auth/metrics').status_code == 404
+
+
+def test_render_format():
+    """Тест: текстовый формат счетчиков, гистограмм и экранирование меток"""
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests', ('path',)).inc(path='/a"b')
+    histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    assert registry.render().splitlines() == [
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        'latency_seconds_sum 0.55',
+        'latency_seconds_count 2',
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{path="/a\\"b"} 1',
+    ]
+
+
+def test_metrics_are_summed_across_workers(tmp_path):
+    """Тест: ответ собирается из снимков всех воркеров; gauge завершившихся воркеров не учитываются"""
+    import json
+    import subprocess
+    import sys
+    from app.services.metrics import MultiprocessMetrics
+
+    def worker_registry(requests, pending):
+        registry = MetricsRegistry()
+        registry.counter('demo_requests_total', 'Запросы', ('route',)).inc(requests, route='/a')
+        registry.histogram('demo_duration_seconds', 'Время', buckets=(0.1, 1.0)).observe(0.05 * requests)
+        registry.gauge('demo_pending', 'Очередь').set(pending)
+        return registry
+
+    # Снимок воркера, который уже завершился (например, перезапущен по max_requests)
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                              capture_output=True, text=True, check=True)
+    (tmp_path / f'{finished.stdout.strip()}-1.json').write_text(json.dumps(worker_registry(3, 7).snapshot()))
+
+    metrics = MultiprocessMetrics(worker_registry(2, 5))
+    app = type('App', (), {'config': {'METRICS_MULTIPROC_DIR': str(tmp_path), 'METRICS_SNAPSHOT_INTERVAL': 60},
+                           'before_request': lambda self, function: function})()
+    metrics.init_app(app)
+    body = metrics.render()
+
+    assert _sample(body, 'demo_requests_total{route="/a"}') == 5
+    assert _sample(body, 'demo_duration_seconds_bucket{le="0.1"}') == 1
+    assert _sample(body, 'demo_duration_seconds_bucket{le="+Inf"}') == 2
+    assert _sample(body, 'demo_duration_seconds_count') == 2
+    assert _sample(body, 'demo_pending') == 5
+    assert len(list(tmp_path.glob('*.json'))) == 2
+    # Остановка потока записи снимков
+    metrics.init_app(type('App', (), {'config': {}})())
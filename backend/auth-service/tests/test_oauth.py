@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from app import create_app, oauth_providers
+from app.config import TestingConfig
+from app.models.user import User
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Провайдер OAuth на локальном порту: ответы GitHub и Яндекса по путям"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        server = self.server
+        path = urlsplit(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        body = parse_qs(self.rfile.read(length).decode()) if length else {}
+        server.calls.append((path, self.client_address[1], body))
+        server.traceparents.append(self.headers.get('traceparent'))
+        time.sleep(server.delays.get(path, 0))
+        status, payload = server.routes.get(path, (404, {'message': 'Not Found'}))
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _reply
+
+
+@pytest.fixture
+def provider_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProviderHandler)
+    server.daemon_threads = True
+    server.calls, server.delays, server.traceparents = [], {}, []
+    server.routes = {
+        '/login/oauth/access_token': (200, {'access_token': 'gh-token', 'token_type': 'bearer'}),
+        '/user': (200, {'id': 101, 'login': 'octocat', 'name': 'The Octocat', 'email': None}),
+        '/user/emails': (200, [
+            {'email': 'old@example.com', 'primary': False, 'verified': True},
+            {'email': 'octocat@example.com', 'primary': True, 'verified': True},
+        ]),
+        '/token': (200, {'access_token': 'ya-token', 'token_type': 'bearer'}),
+        '/info': (200, {'id': '2002', 'login': 'yauser', 'default_email': 'yauser@yandex.ru',
+                        'real_name': 'Ya User'}),
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(provider_server):
+    """Приложение с провайдерами, указывающими на локальный сервер"""
+    url = f'http://127.0.0.1:{provider_server.server_address[1]}'
+
+    class OAuthTestingConfig(TestingConfig):
+        GITHUB_CLIENT_ID = YANDEX_CLIENT_ID = 'client-id'
+        GITHUB_CLIENT_SECRET = YANDEX_CLIENT_SECRET = 'client-secret'
+        GITHUB_OAUTH_URL = GITHUB_API_URL = YANDEX_OAUTH_URL = YANDEX_API_URL = url
+        OAUTH_READ_TIMEOUT = 0.5
+
+    return create_app(OAuthTestingConfig)
+
+
+@pytest.fixture
+def oauth_client(client, db_session):
+    """Тестовый клиент со схемой БД"""
+    return client
+
+
+def test_github_callback_fetches_profile_and_emails(oauth_client, provider_server):
+    """Тест: вход через GitHub берет основной подтвержденный email из /user/emails"""
+    response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.status_code == 200
+    assert 'access_token' in response.json
+
+    user = User.query.filter_by(email='octocat@example.com').one()
+    assert user.username == 'octocat'
+    paths = [path for path, _port, _body in provider_server.calls]
+    assert paths[0] == '/login/oauth/access_token'
+    assert sorted(paths[1:]) == ['/user', '/user/emails']
+    assert provider_server.calls[0][2]['code'] == ['abc']
+    # Все вызовы провайдера - участки одной трассы входящего запроса, в том числе из пула потоков
+    trace_id = response.headers['traceresponse'].split('-')[1]
+    assert {header.split('-')[1] for header in provider_server.traceparents} == {trace_id}
+    assert len(set(provider_server.traceparents)) == 3
+
+
+def test_yandex_callback(oauth_client, provider_server):
+    """Тест: вход через Яндекс"""
+    response = oauth_client.post('/auth/oauth/yandex/callback', json={'code': 'abc'})
+    assert response.status_code == 200
+    assert User.query.filter_by(email='yauser@yandex.ru').one().username == 'yauser'
+    assert provider_server.calls[0][2]['grant_type'] == ['authorization_code']
+
+
+def test_provider_errors(oauth_client, provider_server):
+    """Тест: неизвестный провайдер, отклоненный код и зависший провайдер"""
+    assert oauth_client.post('/auth/oauth/gitlab/callback', json={'code': 'abc'}).status_code == 404
+    assert oauth_client.post('/auth/oauth/github/callback', json={}).status_code == 400
+
+    provider_server.routes['/login/oauth/access_token'] = (200, {'error': 'bad_verification_code'})
+    assert oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'}).status_code == 400
+
+    # Профиль без id - ошибка провайдера, а не 500
+    provider_server.routes['/info'] = (200, {'login': 'yauser'})
+    response = oauth_client.post('/auth/oauth/yandex/callback', json={'code': 'abc'})
+    assert response.status_code == 502
+
+    provider_server.delays['/info'] = 2
+    started_at = time.monotonic()
+    response = oauth_client.post('/auth/oauth/yandex/callback', json={'code': 'abc'})
+    assert response.status_code == 504
+    assert time.monotonic() - started_at < 1.5
+
+
+def test_connections_are_reused(oauth_client, provider_server):
+    """Тест: повторные входы идут по уже открытым keep-alive соединениям"""
+    for _ in range(3):
+        assert oauth_client.post('/auth/oauth/yandex/callback', json={'code': 'abc'}).status_code == 200
+    # Запросы последовательные - хватает одного соединения
+    assert len({port for _path, port, _body in provider_server.calls}) == 1
+    assert oauth_providers.get('yandex') is not None
+
+
+def test_repeat_login_is_single_upsert(oauth_client, provider_server, db_session, count_queries):
+    """Тест: повторный вход находит пользователя по (provider, provider_user_id) одним запросом"""
+    assert oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'}).status_code == 200
+    provider_server.routes['/user'] = (200, {'id': 101, 'login': 'octocat-renamed', 'email': None,
+                                             'avatar_url': 'https://example.com/a.png'})
+    provider_server.routes['/user/emails'] = (200, [
+        {'email': 'new@example.com', 'primary': True, 'verified': True},
+    ])
+    db_session.expunge_all()
+
+    with count_queries() as queries:
+        response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.status_code == 200
+    # Upsert и загрузка пользователя с ролями
+    assert queries.count <= 3
+
+    user = User.query.filter_by(provider='github', provider_user_id='101').one()
+    assert User.query.count() == 1
+    assert user.email == 'octocat@example.com'
+    assert user.provider_data['avatar_url'] == 'https://example.com/a.png'
+    assert response.json['user']['id'] == user.id
+
+
+def test_links_existing_account_by_verified_email(oauth_client, provider_server, db_session):
+    """Тест: первый вход через провайдера привязывается к аккаунту с тем же подтвержденным email"""
+    oauth_client.post('/auth/register', json={
+        'username': 'octocat', 'email': 'OctoCat@example.com', 'password': 'testpass123'
+    })
+    User.query.one().email_verified = True
+    db_session.commit()
+    response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.status_code == 200
+
+    user = User.query.one()
+    assert response.json['user']['username'] == 'octocat'
+    assert (user.provider, user.provider_user_id) == ('github', '101')
+
+    # Аккаунт уже привязан к GitHub - вход через Яндекс с тем же email не перехватывает его
+    provider_server.routes['/info'] = (200, {'id': '2002', 'login': 'yauser',
+                                             'default_email': 'octocat@example.com'})
+    assert oauth_client.post('/auth/oauth/yandex/callback', json={'code': 'abc'}).status_code == 409
+
+
+def test_unverified_account_is_not_linked(oauth_client, provider_server):
+    """Тест: аккаунт, заранее зарегистрированный на чужой email, не получает вход через провайдера"""
+    oauth_client.post('/auth/register', json={
+        'username': 'squatter', 'email': 'octocat@example.com', 'password': 'testpass123'
+    })
+    response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.status_code == 409
+    assert response.json['error'] == 'User with this email already exists'
+
+    user = User.query.one()
+    assert user.provider is None and user.provider_user_id is None
+
+
+def test_hidden_email_and_taken_username(oauth_client, provider_server):
+    """Тест: GitHub без доступного email и с логином, занятым локальным пользователем"""
+    oauth_client.post('/auth/register', json={
+        'username': 'octocat', 'email': 'someone@example.com', 'password': 'testpass123'
+    })
+    provider_server.routes['/user/emails'] = (404, {'message': 'Not Found'})
+    response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.status_code == 200
+    assert response.json['user']['username'] == 'github_101'
+    assert response.json['user']['email'] == '101@github.oauth.invalid'
+    assert response.json['user']['email_verified'] is False
+
+    # Повторный вход находит того же пользователя
+    response = oauth_client.post('/auth/oauth/github/callback', json={'code': 'abc'})
+    assert response.json['user']['username'] == 'github_101'
+    assert User.query.count() == 2
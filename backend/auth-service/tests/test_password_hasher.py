@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import patch
+from app.services.password_hasher import PasswordHasher, HashingPoolBusy
+
+
+@pytest.fixture
+def hasher():
+    """Пул bcrypt с минимальной стоимостью хеширования"""
+    hasher = PasswordHasher()
+    hasher.log_rounds = 4
+    hasher.pool_size = 1
+    yield hasher
+    hasher.shutdown(wait=True)
+
+
+def test_hash_and_verify_in_process_pool(hasher):
+    """Тест хеширования и проверки пароля в пуле процессов"""
+    password_hash = hasher.hash('secret')
+    assert password_hash.startswith('$2b$04$')
+    assert hasher.verify('secret', password_hash) is True
+    assert hasher.verify('wrong', password_hash) is False
+    assert hasher.verify('secret', None) is False
+
+
+def test_full_queue_is_rejected(hasher):
+    """Тест отказа при переполненной очереди"""
+    hasher.queue_size = 0
+    hasher._get_executor()
+    hasher._slots.acquire()
+    with pytest.raises(HashingPoolBusy):
+        hasher.hash('secret')
+
+
+def test_register_returns_503_when_pool_busy(client, db_session):
+    """Тест ответа 503 при перегрузке пула bcrypt"""
+    with patch('app.password_hasher.hash', side_effect=HashingPoolBusy(retry_after=2)):
+        response = client.post('/auth/register', json={
+            'username': 'testuser',
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
@@ -0,0 +1,61 @@
+import time
+import pytest
+from app.services.profile_cache import ProfileCache, PROFILE_KEY
+
+
+@pytest.fixture
+def cache(app, mock_redis):
+    """Кеш профилей с включенным локальным уровнем"""
+    cache = ProfileCache()
+    cache.init_app(app, mock_redis)
+    cache.local_size = 100
+    cache._local_ready()
+    assert cache._ready.wait(5)
+    return cache
+
+
+def test_profile_is_loaded_once(cache, mock_redis):
+    """Тест повторного чтения профиля без обращения к загрузчику и Redis"""
+    calls = []
+
+    def loader(user_id):
+        calls.append(user_id)
+        return {'id': int(user_id), 'username': 'user'}
+
+    assert cache.get(1, loader) == {'id': 1, 'username': 'user'}
+    assert mock_redis.get(PROFILE_KEY.format(1)) is not None
+    mock_redis.delete(PROFILE_KEY.format(1))
+    assert cache.get(1, loader) == {'id': 1, 'username': 'user'}
+    assert calls == ['1']
+
+
+def test_invalidation_is_synced_between_workers(app, cache, mock_redis):
+    """Тест инвалидации локального уровня другого воркера через pub/sub"""
+    cache.get(1, lambda user_id: {'id': 1, 'roles': []})
+    assert '1' in cache._local
+
+    other_worker = ProfileCache()
+    other_worker.init_app(app, mock_redis)
+    other_worker.invalidate(1)
+
+    deadline = time.time() + 5
+    while time.time() < deadline and '1' in cache._local:
+        time.sleep(0.01)
+
+    assert mock_redis.get(PROFILE_KEY.format(1)) is None
+    assert cache.get(1, lambda user_id: {'id': 1, 'roles': ['admin']}) == {'id': 1, 'roles': ['admin']}
+
+
+def test_profile_loaded_before_invalidation_is_not_cached(cache, mock_redis):
+    """Тест: профиль, прочитанный до инвалидации, не записывается в Redis после нее"""
+    def loader(user_id):
+        # Роли меняются, пока загрузка уже прочитала старый профиль
+        cache.invalidate(user_id)
+        return {'id': 1, 'roles': []}
+
+    assert cache.get(1, loader) == {'id': 1, 'roles': []}
+    assert mock_redis.get(PROFILE_KEY.format(1)) is None
+    assert '1' not in cache._local
+
+    assert cache.get(1, lambda user_id: {'id': 1, 'roles': ['admin']}) == {'id': 1, 'roles': ['admin']}
+    assert mock_redis.get(PROFILE_KEY.format(1)) is not None
@@ -0,0 +1,63 @@
+import pytest
+from app.models.role import Role, Permission
+from app.models.user import User
+
+# Бюджет эндпоинтов: максимум SQL запросов и загруженных ORM объектов по моделям.
+# Роль admin имеет 5 прав, у пользователя 4 роли - лишние JOIN сразу видны по числу объектов.
+BUDGETS = {
+    'register': (1, {}),
+    'login': (3, {'User': 1, 'Role': 4}),
+    'login_failed': (1, {}),
+    'me': (2, {'User': 1, 'Role': 4}),
+    'refresh': (2, {'User': 1, 'Role': 4}),
+    'roles': (2, {'Role': 4, 'Permission': 5}),
+    'create_role': (4, {'Role': 1}),
+}
+
+
+@pytest.fixture
+def seeded(client, db_session):
+    """Админ с четырьмя ролями и правами у роли admin"""
+    admin_role = Role(name='admin')
+    admin_role.permissions = [Permission(name=f'permission_{i}') for i in range(5)]
+    roles = [admin_role] + [Role(name=f'role_{i}') for i in range(3)]
+    db_session.add_all(roles)
+    client.post('/auth/register', json={
+        'username': 'admin', 'email': 'admin@example.com', 'password': 'adminpass123'
+    })
+    User.query.filter_by(username='admin').first().roles = roles
+    db_session.commit()
+    tokens = client.post('/auth/login', json={'username': 'admin', 'password': 'adminpass123'}).json
+    return {'Authorization': f"Bearer {tokens['access_token']}"}, tokens['refresh_token']
+
+
+REQUESTS = {
+    'register': lambda client, headers, refresh_token: client.post('/auth/register', json={
+        'username': 'newuser', 'email': 'new@example.com', 'password': 'newpass123'}),
+    'login': lambda client, headers, refresh_token: client.post('/auth/login', json={
+        'username': 'admin', 'password': 'adminpass123'}),
+    'login_failed': lambda client, headers, refresh_token: client.post('/auth/login', json={
+        'username': 'admin', 'password': 'wrong'}),
+    'me': lambda client, headers, refresh_token: client.get('/auth/me', headers=headers),
+    'refresh': lambda client, headers, refresh_token: client.post('/auth/refresh', json={
+        'refresh_token': refresh_token}),
+    'roles': lambda client, headers, refresh_token: client.get('/auth/admin/roles', headers=headers),
+    'create_role': lambda client, headers, refresh_token: client.post('/auth/admin/roles', json={
+        'name': 'new_role'}, headers=headers),
+}
+
+
+@pytest.mark.parametrize('endpoint', sorted(BUDGETS))
+def test_endpoint_query_budget(client, db_session, seeded, count_queries, endpoint):
+    """Тест регрессии количества запросов и загружаемых строк по эндпоинтам"""
+    headers, refresh_token = seeded
+    max_statements, max_loaded = BUDGETS[endpoint]
+    db_session.expunge_all()
+
+    with count_queries() as queries:
+        response = REQUESTS[endpoint](client, headers, refresh_token)
+
+    assert response.status_code < 500
+    assert queries.count <= max_statements, '\n'.join(queries.statements)
+    for model, count in queries.loaded.items():
+        assert count <= max_loaded.get(model, 0), f'{model}: {count} loaded\n' + '\n'.join(queries.statements)
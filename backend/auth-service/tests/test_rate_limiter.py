@@ -0,0 +1,70 @@
+import pytest
+from unittest.mock import patch
+from app import rate_limiter, redis_client
+
+
+@pytest.fixture
+def limited(app, db_session):
+    """Приложение с включенным ограничением частоты и заданными лимитами"""
+    def configure(**limits):
+        app.config['RATE_LIMIT_ENABLED'] = True
+        app.config['RATE_LIMITS'] = limits
+        rate_limiter.init_app(app, redis_client)
+    yield configure
+    rate_limiter.enabled = False
+
+
+def _login(client, username):
+    return client.post('/auth/login', json={'username': username, 'password': 'wrongpass'})
+
+
+def test_login_limited_before_password_check(client, limited, count_queries):
+    """Тест отказа с 429 и Retry-After без обращения к БД и bcrypt"""
+    limited(login={'username': (2, 60)})
+    assert _login(client, 'victim').status_code == 401
+    assert _login(client, 'Victim').status_code == 401
+
+    with patch('app.services.auth_service.password_hasher.verify') as verify, count_queries() as queries:
+        response = _login(client, 'victim')
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 60
+    assert not verify.called
+    assert queries.count == 0
+
+    # Лимит по имени пользователя не затрагивает других пользователей
+    assert _login(client, 'someone').status_code == 401
+
+
+def test_rejected_request_does_not_consume_other_limits(client, limited):
+    """Тест: запрос, отклоненный одним лимитом, не расходует остальные"""
+    limited(login={'ip': (3, 60), 'username': (1, 60)})
+    assert _login(client, 'alice').status_code == 401
+    assert _login(client, 'alice').status_code == 429
+    assert _login(client, 'alice').status_code == 429
+    assert _login(client, 'bob').status_code == 401
+    assert _login(client, 'carol').status_code == 401
+
+    response = _login(client, 'dave')
+    assert response.status_code == 429
+
+
+def test_global_limit_applies_to_register(client, limited):
+    """Тест общего лимита эндпоинта регистрации"""
+    limited(register={'global': (1, 60)})
+    response = client.post('/auth/register', json={
+        'username': 'first', 'email': 'first@example.com', 'password': 'password123'
+    })
+    assert response.status_code == 201
+    response = client.post('/auth/register', json={
+        'username': 'second', 'email': 'second@example.com', 'password': 'password123'
+    })
+    assert response.status_code == 429
+    assert response.json['error'] == 'Too many requests, please retry later'
+
+
+def test_redis_failure_fails_open(client, limited):
+    """Тест: недоступность Redis не блокирует вход"""
+    limited(login={'ip': (1, 60)})
+    with patch.object(rate_limiter, '_script', side_effect=ConnectionError('redis is down')):
+        assert _login(client, 'alice').status_code == 401
+        assert _login(client, 'alice').status_code == 401
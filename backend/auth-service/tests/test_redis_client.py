@@ -0,0 +1,102 @@
+import redis
+from redis.crc import key_slot
+from redis.exceptions import RedisClusterException
+from app.services.metrics import registry
+from app.services.redis_client import create_redis_client, InstrumentedRedis
+
+
+def test_commands_and_pipelines_are_instrumented(mock_redis):
+    """Тест метрик задержки команд и конвейеров"""
+    latency = registry.histogram('auth_redis_command_duration_seconds')
+    get_count = latency.count(command='GET')
+    pipeline_count = latency.count(command='PIPELINE')
+
+    mock_redis.get('missing')
+    with mock_redis.pipeline(transaction=False) as pipe:
+        pipe.get('a').get('b').execute()
+
+    assert latency.count(command='GET') == get_count + 1
+    assert latency.count(command='PIPELINE') == pipeline_count + 1
+
+
+def test_pipeline_map_preserves_order_across_chunks(app):
+    """Тест пакетного конвейера с разбиением на части"""
+    from app import redis_client
+    redis_client.mset({f'key:{i}': i for i in range(10)})
+    values = redis_client.pipeline_map([f'key:{i}' for i in range(10)], lambda pipe, key: pipe.get(key),
+                                       chunk_size=3)
+    assert [int(value) for value in values] == list(range(10))
+
+
+def test_client_factory_uses_bounded_pool():
+    """Тест создания клиента с ограниченным пулом и таймаутами из конфигурации"""
+    client = create_redis_client({
+        'REDIS_HOST': 'redis.internal',
+        'REDIS_PORT': 6380,
+        'REDIS_MAX_CONNECTIONS': 7,
+        'REDIS_SOCKET_TIMEOUT': 0.25,
+        'REDIS_SOCKET_CONNECT_TIMEOUT': 0.1,
+    })
+    assert isinstance(client, InstrumentedRedis)
+    pool = client.connection_pool
+    assert isinstance(pool, redis.BlockingConnectionPool)
+    assert pool.max_connections == 7
+    assert pool.connection_kwargs['host'] == 'redis.internal'
+    assert pool.connection_kwargs['socket_timeout'] == 0.25
+
+
+class ClusterLikeRedis:
+    """
+    Обертка над fakeredis с ограничениями RedisCluster: конвейер без MULTI
+    и ключи одной команды или скрипта только в одном слоте
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    @staticmethod
+    def _check_slot(keys):
+        if len({key_slot(key.encode() if isinstance(key, str) else key) for key in keys}) > 1:
+            raise RedisClusterException(f"Keys in request don't hash to the same slot: {keys}")
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        if transaction:
+            raise RedisClusterException("method RedisCluster.pipeline() does not support transaction")
+        return self._client.pipeline(transaction=False)
+
+    def evalsha(self, sha, numkeys, *keys_and_args):
+        self._check_slot(keys_and_args[:numkeys])
+        return self._client.evalsha(sha, numkeys, *keys_and_args)
+
+    def delete(self, *keys):
+        self._check_slot(keys)
+        return self._client.delete(*keys)
+
+
+def test_auth_flow_in_cluster_mode(app, client, db_session, mock_redis):
+    """Тест входа, ротации, отзыва сессий и настроек с ограничениями Redis Cluster"""
+    from app import logger, profiler, redis_client
+    redis_client.init_app(app, client=ClusterLikeRedis(mock_redis))
+
+    client.post('/auth/register', json={'username': 'testuser', 'email': 'test@example.com',
+                                        'password': 'testpass123'})
+    login = lambda: client.post('/auth/login', json={'username': 'testuser', 'password': 'testpass123',
+                                                     'device_id': 'laptop'}).json
+    first, second = login(), login()
+    rotated = client.post('/auth/refresh', json={'refresh_token': second['refresh_token']})
+    assert rotated.status_code == 200
+    assert client.post('/auth/refresh', json={'refresh_token': first['refresh_token']}).status_code == 401
+
+    headers = {'Authorization': f"Bearer {rotated.json['access_token']}"}
+    assert client.delete('/auth/sessions/laptop', headers=headers).status_code == 200
+    third = login()
+    assert client.post('/auth/logout/all', headers=headers).status_code == 200
+    assert client.post('/auth/refresh', json={'refresh_token': third['refresh_token']}).status_code == 401
+    assert not mock_redis.zcard(f"refresh_tokens:{{{second['user']['id']}}}")
+
+    logger.update_settings(level='INFO', sampling={'validate_token': 0.5})
+    profiler.start(1)
+    profiler.stop()
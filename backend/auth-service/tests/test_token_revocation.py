@@ -0,0 +1,62 @@
+import time
+import pytest
+from unittest.mock import patch
+from app.services.bloom_filter import BloomFilter
+from app.services.token_revocation import TokenRevocation
+
+
+@pytest.fixture
+def revocation(app, mock_redis):
+    """Отзыв токенов с включенным фильтром Блума"""
+    revocation = TokenRevocation()
+    revocation.init_app(app, mock_redis)
+    revocation.use_filter = True
+    revocation._filter_ready()
+    assert revocation._ready.wait(5)
+    return revocation
+
+
+def make_claims(jti='jti-1', sub='1', epoch=0):
+    return {'jti': jti, 'sub': sub, 'epoch': epoch, 'exp': time.time() + 60}
+
+
+def test_bloom_filter_membership():
+    """Тест отсутствия ложноотрицательных ответов фильтра"""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f'jti:{i}')
+    assert all(f'jti:{i}' in bloom for i in range(1000))
+    false_positives = sum(f'other:{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_not_revoked_token_skips_redis(revocation, mock_redis):
+    """Тест проверки неотозванного токена без обращения к Redis"""
+    with patch.object(mock_redis, 'pipeline', side_effect=AssertionError("Redis called")):
+        assert revocation.is_revoked(make_claims()) is False
+
+
+def test_new_tokens_get_epoch_before_filter_sync(revocation, mock_redis):
+    """Тест: эпоха для новых токенов берется из Redis, даже если фильтр еще не знает об отзыве"""
+    # Другой воркер увеличил эпоху, сообщение pub/sub до этого воркера еще не дошло
+    mock_redis.incr('token_epoch:3')
+
+    epoch = revocation.current_epoch('3')
+    assert epoch == 1
+    assert revocation.is_revoked(make_claims(sub='3', epoch=epoch)) is False
+
+
+def test_revocations_are_synced_between_workers(app, revocation, mock_redis):
+    """Тест синхронизации отзыва между воркерами через pub/sub"""
+    other_worker = TokenRevocation()
+    other_worker.init_app(app, mock_redis)
+    other_worker.revoke(make_claims(jti='revoked'))
+    other_worker.revoke_user('2')
+
+    deadline = time.time() + 5
+    while time.time() < deadline and 'user:2' not in revocation._filter:
+        time.sleep(0.01)
+
+    assert revocation.is_revoked(make_claims(jti='revoked')) is True
+    assert revocation.is_revoked(make_claims(jti='other', sub='2', epoch=0)) is True
+    assert revocation.is_revoked(make_claims(jti='other', sub='2', epoch=1)) is False
@@ -0,0 +1,94 @@
+import pytest
+from unittest.mock import patch
+from app import logger, tracer
+from app.services.tracing import Tracer, current_span, parse_traceparent
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+@pytest.fixture
+def records():
+    """Элементы, которые клиент логов поставил бы в очередь отправки"""
+    entries = []
+    with patch.object(logger, '_enqueue', side_effect=entries.append):
+        yield entries
+
+
+def test_parse_traceparent():
+    """Тест разбора заголовка traceparent по W3C Trace Context"""
+    assert parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01') == (TRACE_ID, PARENT_ID, 1)
+    assert parse_traceparent(f'00-{TRACE_ID.upper()}-{PARENT_ID}-00') == (TRACE_ID, PARENT_ID, 0)
+    # Будущие версии могут дописывать поля после флагов
+    assert parse_traceparent(f'01-{TRACE_ID}-{PARENT_ID}-01-extra') == (TRACE_ID, PARENT_ID, 1)
+    for header in (None, '', 'garbage', f'00-{TRACE_ID}-{PARENT_ID}-01-extra',
+                   f'ff-{TRACE_ID}-{PARENT_ID}-01', f'00-{"0" * 32}-{PARENT_ID}-01',
+                   f'00-{TRACE_ID}-{"0" * 16}-01', f'00-{TRACE_ID[:-1]}-{PARENT_ID}-01'):
+        assert parse_traceparent(header) is None
+
+
+def test_incoming_trace_is_continued(client, records):
+    """Тест продолжения трассы клиента и записи участка запроса с таймингом"""
+    response = client.get('/auth/ping', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01',
+                                                 'tracestate': 'vendor=value'})
+    assert response.status_code == 200
+    _, trace_id, span_id, flags = response.headers['traceresponse'].split('-')
+    assert (trace_id, flags) == (TRACE_ID, '01')
+    assert span_id != PARENT_ID
+    assert current_span() is None
+
+    spans = [logger._serialize(entry) for entry in records if entry[4] == 'span']
+    assert len(spans) == 1
+    record = spans[0]
+    assert record['trace_id'] == TRACE_ID
+    assert record['span_id'] == span_id
+    assert record['parent_span_id'] == PARENT_ID
+    assert record['span_name'] == 'GET /auth/ping'
+    assert record['span_start_us'] > 0
+    assert record['span_duration_us'] >= 0
+
+
+def test_new_trace_and_unsampled_trace(client, records):
+    """Тест новой трассы для некорректного заголовка и отказа от записи участков без флага sampled"""
+    # По умолчанию записывается малая доля новых трасс
+    assert client.application.config['TRACE_SAMPLE_RATE'] == 0.01
+    with patch.object(tracer, 'sample_rate', 1.0):
+        response = client.get('/auth/ping', headers={'traceparent': f'00-{"0" * 32}-{PARENT_ID}-01'})
+    _, trace_id, _, flags = response.headers['traceresponse'].split('-')
+    assert trace_id != '0' * 32 and flags == '01'
+
+    records.clear()
+    with patch.object(tracer, 'sample_rate', 0.0):
+        response = client.get('/auth/ping')
+    assert response.headers['traceresponse'].endswith('-00')
+    assert not [entry for entry in records if entry[4] == 'span']
+
+    records.clear()
+    response = client.get('/auth/ping', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+    assert response.headers['traceresponse'].startswith(f'00-{TRACE_ID}-')
+    assert response.headers['traceresponse'].endswith('-00')
+    assert not [entry for entry in records if entry[4] == 'span']
+
+
+def test_outbound_span_and_log_records():
+    """Тест дочернего участка исходящего вызова и контекста трассировки в записях лога"""
+    tracer = Tracer()
+    tracer.logger = logger
+    tracer.sample_rate = 1.0
+    entries = []
+    with patch.object(logger, '_enqueue', side_effect=entries.append):
+        with tracer.span('request') as root:
+            with tracer.span('github token') as child:
+                headers = child.headers()
+                logger.info("calling provider", action='oauth')
+            assert current_span() is root
+        assert current_span() is None
+
+    assert headers['traceparent'] == f'00-{root.trace_id}-{child.span_id}-01'
+    log_record, child_record, root_record = [logger._serialize(entry) for entry in entries]
+    assert (log_record['trace_id'], log_record['span_id']) == (root.trace_id, child.span_id)
+    assert 'span_duration_us' not in log_record
+    assert child_record['parent_span_id'] == root.span_id
+    assert child_record['span_name'] == 'github token'
+    assert 'parent_span_id' not in root_record
+    assert root_record['span_duration_us'] >= child_record['span_duration_us']
@@ -0,0 +1,4 @@
+from app import create_app
+
+# WSGI режим: gunicorn -c gunicorn.conf.py
+app = create_app()
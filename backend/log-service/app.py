@@ -1,30 +1,54 @@
 from datetime import datetime
 import json
+import os
 from grpclib.server import Server
 from grpclib.utils import graceful_exit
 from proto.log_service_grpc import LogServiceBase, LogServiceStub
+from metrics import records_received, start_metrics_server, timed
+
+# Поля контекста трассировки, которые выводятся, только если заданы
+_TRACE_FIELDS = ('trace_id', 'span_id', 'parent_span_id', 'span_name', 'span_start_us', 'span_duration_us')
+
+
+def _log_to_dict(message):
+    """Преобразование LogMessage в словарь для вывода"""
+    return {
+        'timestamp': datetime.fromtimestamp(message.timestamp).isoformat(),
+        'service_name': message.service_name,
+        'level': message.level.name,
+        'message': message.message,
+        'metadata': json.loads(message.metadata) if message.metadata else {},
+        'user_id': message.user_id if message.HasField('user_id') else None,
+        'action': message.action if message.HasField('action') else None,
+        **{field: getattr(message, field) for field in _TRACE_FIELDS if message.HasField(field)}
+    }
 
 class LogService(LogServiceBase):
+    @timed('send_log')
     async def send_log(self, message):
         """
         Временная заглушка для приема логов.
         В будущем будет сохранять в ClickHouse.
         """
-        log_data = {
-            'timestamp': datetime.fromtimestamp(message.timestamp).isoformat(),
-            'service_name': message.service_name,
-            'level': message.level.name,
-            'message': message.message,
-            'metadata': json.loads(message.metadata) if message.metadata else {},
-            'user_id': message.user_id if message.HasField('user_id') else None,
-            'action': message.action if message.HasField('action') else None
-        }
-        
+        records_received.inc(service_name=message.service_name)
         # Пока просто выводим в консоль
-        print(f"[LOG] {json.dumps(log_data, indent=2)}")
+        print(f"[LOG] {json.dumps(_log_to_dict(message), indent=2)}")
         
         return {'success': True}
 
+    @timed('send_logs')
+    async def send_logs(self, batch):
+        """
+        Временная заглушка для приема пакета логов.
+        В будущем будет сохранять пакет в ClickHouse одной вставкой.
+        """
+        for message in batch.logs:
+            records_received.inc(service_name=message.service_name)
+            print(f"[LOG] {json.dumps(_log_to_dict(message))}")
+
+        return {'success': True}
+
+    @timed('get_logs')
     async def get_logs(self, request):
         """
         Временная заглушка для получения логов.
@@ -37,11 +61,15 @@ class LogService(LogServiceBase):
             'page_size': request.page_size
         }
 
-async def main(host='0.0.0.0', port=50051):
+async def main(host='0.0.0.0', port=50051, metrics_port=int(os.getenv('METRICS_PORT', 9102))):
     server = Server([LogService()])
     with graceful_exit([server]):
         await server.start(host, port)
         print(f'Serving on {host}:{port}')
+        # GET /metrics на отдельном порту; 0 отключает
+        if metrics_port:
+            await start_metrics_server(host, metrics_port)
+            print(f'Metrics on {host}:{metrics_port}/metrics')
         await server.wait_closed()
 
 if __name__ == '__main__':
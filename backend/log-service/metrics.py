@@ -0,0 +1,128 @@
+import asyncio
+import bisect
+import functools
+import time
+
+# Свои минимальные счетчик и гистограмма: сервис собирается отдельно и не тянет
+# зависимости frame-auth (PyJWT, cryptography) ради двух метрик; в процессе один
+# цикл событий, поэтому блокировки, нужные name-service и auth-service, не используются
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    """Монотонно растущий счетчик"""
+    type_name = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name, self.description, self.labelnames = name, description, tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        # Сервис однопоточный (asyncio), блокировки не нужны
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+                for key, value in self._values.items()]
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами"""
+    type_name = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.description, self.labelnames = name, description, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: [счетчики по бакетам + inf, сумма, количество]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        state = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                running += bucket_count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), key + (le,))} {running}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+rpc_duration = Histogram('log_rpc_duration_seconds', 'Время обработки gRPC вызова', ('method',))
+rpc_requests = Counter('log_rpc_requests_total', 'gRPC вызовы по результату', ('method', 'status'))
+records_received = Counter('log_records_received_total', 'Принятые записи логов', ('service_name',))
+METRICS = (rpc_duration, rpc_requests, records_received)
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.type_name}')
+        lines.extend(metric.render())
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def timed(method):
+    """Учет времени и результата gRPC метода"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            status = 'error'
+            try:
+                result = await handler(*args, **kwargs)
+                status = 'ok'
+                return result
+            finally:
+                rpc_duration.observe(time.perf_counter() - started_at, method=method)
+                rpc_requests.inc(method=method, status=status)
+        return wrapper
+    return decorator
+
+
+async def _handle(reader, writer):
+    """Минимальный HTTP/1.0 ответ: GET /metrics, остальное - 404"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, content_type, body = '200 OK', CONTENT_TYPE, render().encode()
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain', b'Not Found\n'
+        writer.write(f'HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host, port):
+    """HTTP сервер метрик в том же цикле событий, что и gRPC сервер"""
+    return await asyncio.start_server(_handle, host, port)
@@ -0,0 +1,20 @@
+import os
+
+
+class Config:
+    """Service configuration read from environment variables"""
+
+    # Production server (gunicorn.conf.py): pre-forked uvicorn workers, one event loop per CPU
+    SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5001')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 0)) or os.cpu_count() or 1
+    # Workers are recycled after this many requests (plus random jitter) to bound memory growth
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 10000))
+    SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 1000))
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))
+
+    # Share of new traces (requests without a sampled traceparent) whose spans are logged
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))
+    # Level of the name_service.trace logger; spans are written at INFO, WARNING turns them off
+    TRACE_LOG_LEVEL = os.getenv('TRACE_LOG_LEVEL', 'INFO').upper()
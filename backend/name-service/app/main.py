@@ -1,14 +1,20 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import random
 from typing import Optional
+from .config import Config
 from .generator import NameGenerator
+from . import metrics, tracing
 
 app = FastAPI(
     title="Name Generator Service",
     description="Service for generating unique usernames",
     version="1.0.0"
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(tracing.TraceMiddleware, sample_rate=Config.TRACE_SAMPLE_RATE)
+tracing.configure_logging(Config.TRACE_LOG_LEVEL)
 
 class GenerateNameRequest(BaseModel):
     prefix: Optional[str] = None
@@ -17,10 +23,16 @@ class GenerateNameRequest(BaseModel):
 class GenerateNameResponse(BaseModel):
     username: str
     
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Request latency and status counters of this worker in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/generate", response_model=GenerateNameResponse)
 async def generate_name(request: GenerateNameRequest):
     try:
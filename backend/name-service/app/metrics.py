@@ -0,0 +1,136 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+from starlette.routing import Match
+
+# Minimal Prometheus primitives kept local on purpose: the service is built and tested on its own
+# (Python 3.9+, see .github/workflows/name-service.yml) and must not pull in the auth SDK's
+# JWT dependencies just for two metrics. log-service and auth-service keep their own variants.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+        self.name, self.description, self.labelnames = name, description, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+                    for key, value in self._values.items()]
+
+
+class Histogram:
+    """Histogram with fixed cumulative buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.description, self.labelnames = name, description, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts + inf, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                running = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    running += bucket_count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), key + (le,))} {running}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+request_duration = Histogram(
+    'name_http_request_duration_seconds', 'HTTP request latency', ('route', 'method'))
+requests_total = Counter(
+    'name_http_requests_total', 'HTTP requests by status code', ('route', 'method', 'status'))
+METRICS = (request_duration, requests_total)
+
+
+def render() -> str:
+    """All metrics of this worker process in the Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.type_name}')
+        lines.extend(metric.render())
+    lines.append('')
+    return '\n'.join(lines)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency and status per route template rather
+    than raw path, so label cardinality does not depend on request parameters.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = _route_template(scope)
+            request_duration.observe(time.perf_counter() - started_at, route=route, method=scope['method'])
+            requests_total.inc(route=route, method=scope['method'], status=status)
+
+
+def _route_template(scope) -> str:
+    for route in scope['app'].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', 'unmatched')
+    return 'unmatched'
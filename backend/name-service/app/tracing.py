@@ -0,0 +1,106 @@
+import contextvars
+import json
+import logging
+import random
+import re
+import secrets
+import sys
+import time
+from typing import Optional, Tuple, Union
+
+from .metrics import _route_template
+
+SERVICE_NAME = 'name-service'
+SAMPLED = 0x01
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(?:-.*)?$')
+
+logger = logging.getLogger('name_service.trace')
+
+# (trace_id, span_id, flags) of the request being served by the current task
+current_trace: contextvars.ContextVar[Optional[Tuple[str, str, int]]] = \
+    contextvars.ContextVar('current_trace', default=None)
+
+
+def configure_logging(level: Union[int, str] = logging.INFO) -> None:
+    """Write span records to stdout as bare JSON lines; safe to call more than once"""
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, int]]:
+    """(trace_id, parent span_id, flags) of a W3C traceparent header, None if absent or invalid"""
+    if not header:
+        return None
+    header = header.strip().lower()
+    match = _TRACEPARENT.match(header)
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == 'ff' or (version == '00' and len(header) != 55):
+        return None
+    if trace_id == '0' * 32 or span_id == '0' * 16:
+        return None
+    return trace_id, span_id, int(flags, 16)
+
+
+class TraceMiddleware:
+    """
+    Pure ASGI middleware continuing the caller's W3C trace (or starting one) for
+    every request. The span ids are exposed through `current_trace`, returned in
+    the `traceresponse` header, and the finished span is logged as one JSON line
+    with the same fields the log-service LogMessage carries, so the request shows
+    up in the latency breakdown of the caller's trace.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.01):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        parent = parse_traceparent(headers.get(b'traceparent', b'').decode('latin-1'))
+        if parent is not None:
+            trace_id, parent_span_id, flags = parent
+        else:
+            trace_id, parent_span_id = secrets.token_hex(16), None
+            flags = SAMPLED if random.random() < self.sample_rate else 0
+        span_id = secrets.token_hex(8)
+        traceresponse = f'00-{trace_id}-{span_id}-{flags:02x}'.encode()
+        start_us = time.time_ns() // 1000
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message = dict(message, headers=list(message.get('headers', [])) + [(b'traceresponse', traceresponse)])
+            await send(message)
+
+        token = current_trace.set((trace_id, span_id, flags))
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            current_trace.reset(token)
+            if flags & SAMPLED and logger.isEnabledFor(logging.INFO):
+                record = {
+                    'service_name': SERVICE_NAME,
+                    'action': 'span',
+                    'trace_id': trace_id,
+                    'span_id': span_id,
+                    'span_name': f"{scope['method']} {_route_template(scope)}",
+                    'span_start_us': start_us,
+                    'span_duration_us': int((time.perf_counter() - started_at) * 1_000_000),
+                    'metadata': {'status': status},
+                }
+                if parent_span_id is not None:
+                    record['parent_span_id'] = parent_span_id
+                logger.info(json.dumps(record))
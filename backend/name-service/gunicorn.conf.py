@@ -0,0 +1,31 @@
+"""
+Production launch: gunicorn -c gunicorn.conf.py
+
+Settings come from app.config.Config (SERVER_* environment variables).
+The app and its word lists are loaded in the master before forking, so workers
+share them copy-on-write.
+
+Zero-downtime reload: kill -HUP <master> restarts workers gracefully with the
+same code (preloaded code is not re-imported). To deploy new code send
+kill -USR2 <master> to start a new master, then kill -QUIT <old master>.
+"""
+import gc
+
+from app.config import Config
+
+wsgi_app = 'app.main:app'
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+worker_class = 'uvicorn_worker.UvicornWorker'
+preload_app = True
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+keepalive = Config.SERVER_KEEPALIVE
+
+
+def pre_fork(server, worker):
+    # Objects created while loading the app are excluded from the workers' GC passes,
+    # so collections do not touch (and copy) the shared pages
+    gc.freeze()
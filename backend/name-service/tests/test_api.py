@@ -1,3 +1,4 @@
+import json
 from fastapi.testclient import TestClient
 import pytest
 from app.main import app
@@ -54,3 +55,37 @@ def test_generate_name_with_prefix_and_style(client):
     assert "username" in response.json()
     username = response.json()["username"]
     assert username.startswith("test")
+
+def test_metrics(client):
+    """Test metrics endpoint exports per-route latency and status counters"""
+    client.post("/generate", json={})
+    client.get("/unknown/path")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE name_http_request_duration_seconds histogram" in body
+    assert 'name_http_request_duration_seconds_count{route="/generate",method="POST"}' in body
+    assert 'name_http_requests_total{route="/generate",method="POST",status="200"}' in body
+    assert 'name_http_requests_total{route="unmatched",method="GET",status="404"}' in body
+    assert "/unknown/path" not in body
+
+def test_trace_context(client, caplog):
+    """Test the caller's traceparent is continued and the request span is logged"""
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    # The service configures the trace logger itself; spans reach INFO without test setup
+    response = client.post("/generate", json={}, headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert response.status_code == 200
+    _, response_trace_id, span_id, flags = response.headers["traceresponse"].split("-")
+    assert (response_trace_id, flags) == (trace_id, "01")
+
+    span = json.loads(caplog.records[-1].getMessage())
+    assert span["trace_id"] == trace_id
+    assert span["span_id"] == span_id
+    assert span["parent_span_id"] == parent_id
+    assert span["span_name"] == "POST /generate"
+    assert span["span_duration_us"] >= 0
+
+    response = client.get("/health", headers={"traceparent": "invalid"})
+    assert response.headers["traceresponse"].split("-")[1] != trace_id